@@ -0,0 +1,108 @@
+# app/api/v1/endpoints/analytics.py
+# - /analytics/lux/percentiles
+# - /analytics/lux/histogram
+
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Tuple
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services.lux_sketches import lux_sketches, night_of, SKETCH_DIMENSIONS, CITY_KEY
+
+router = APIRouter()
+
+DEFAULT_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+DEFAULT_EDGES = "0,10,20,50,100"
+DEFAULT_NIGHTS = 7
+
+
+
+def resolve_window(dimension: str, key: Optional[str], start: Optional[date],
+                   end: Optional[date]) -> Tuple[str, date, date]:
+    """Validate the sketch selection; defaults to the last DEFAULT_NIGHTS nights"""
+    if dimension not in SKETCH_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {list(SKETCH_DIMENSIONS)}")
+    if dimension == "city":
+        key = CITY_KEY
+    elif not key:
+        raise HTTPException(status_code=400, detail=f"key is required for dimension '{dimension}'")
+
+    end = end or night_of(datetime.now())
+    start = start or end - timedelta(days=DEFAULT_NIGHTS - 1)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return key, start, end
+
+
+
+
+@router.get("/analytics/lux/percentiles")
+async def get_lux_percentiles(
+    dimension: str = Query("city", description="city, barangay or segment"),
+    key: Optional[str] = Query(None, description="Barangay name or street segment id"),
+    start: Optional[date] = Query(None, description="First night (inclusive)"),
+    end: Optional[date] = Query(None, description="Last night (inclusive)"),
+    q: Optional[List[float]] = Query(None, description="Quantiles between 0 and 1, repeatable")
+):
+    """
+    Lux percentiles over a window of nights from the merged streaming sketches.
+    Every percentile is within the sketch's relative accuracy of the exact value.
+    """
+    key, start, end = resolve_window(dimension, key, start, end)
+    quantiles = q or DEFAULT_QUANTILES
+    if any(not 0 <= value <= 1 for value in quantiles):
+        raise HTTPException(status_code=400, detail="q must be between 0 and 1")
+
+    sketch = await lux_sketches.query(dimension, key, start, end)
+    return {
+        "dimension": dimension,
+        "key": key,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "relative_accuracy": sketch.relative_accuracy,
+        "count": sketch.count,
+        "mean": round(sketch.mean, 2) if sketch.count else None,
+        "min": round(sketch.min, 2) if sketch.count else None,
+        "max": round(sketch.max, 2) if sketch.count else None,
+        "percentiles": {f"p{value * 100:g}": round(sketch.quantile(value), 2) if sketch.count else None
+                        for value in quantiles}
+    }
+
+
+
+
+@router.get("/analytics/lux/histogram")
+async def get_lux_histogram(
+    dimension: str = Query("city", description="city, barangay or segment"),
+    key: Optional[str] = Query(None, description="Barangay name or street segment id"),
+    start: Optional[date] = Query(None, description="First night (inclusive)"),
+    end: Optional[date] = Query(None, description="Last night (inclusive)"),
+    edges: str = Query(DEFAULT_EDGES, description="Ascending lux bucket edges, comma-separated")
+):
+    """
+    Approximate lux histogram over a window of nights; the last bucket is open-ended
+    and readings under the first edge are counted in "below" rather than in a bucket
+    """
+    key, start, end = resolve_window(dimension, key, start, end)
+    try:
+        bounds = [float(value) for value in edges.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="edges must be comma-separated numbers")
+    if not bounds or bounds != sorted(bounds):
+        raise HTTPException(status_code=400, detail="edges must be ascending")
+
+    sketch = await lux_sketches.query(dimension, key, start, end)
+    below, counts = sketch.histogram(bounds)
+    return {
+        "dimension": dimension,
+        "key": key,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "relative_accuracy": sketch.relative_accuracy,
+        "count": sketch.count,
+        "below": below,
+        "buckets": [
+            {"min": low, "max": bounds[i + 1] if i + 1 < len(bounds) else None, "count": count}
+            for i, (low, count) in enumerate(zip(bounds, counts))
+        ]
+    }
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, HTTPException
-from app.core.database import supabase
+from app.core.database import supabase, run_query
 
 router = APIRouter()
 
 @router.get("/check-supabase")
 async def check_supabase():
     try:
-        data = supabase.table('sensor_data').select("*").execute()
+        data = await run_query(supabase.table('sensor_data').select("*"))
         print("MY LOG:", data)
         return {"data": data.data, "count": data.count}
     except Exception as e:
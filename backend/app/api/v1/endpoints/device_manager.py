@@ -3,11 +3,10 @@
 # - /device-status/{device_id}
 # - /check-offline-devices
 
-from datetime import datetime, timedelta    
+from datetime import datetime
 from fastapi import APIRouter, HTTPException
 
-from app.core.database import supabase
-from app.models.sensor_device import DeviceStatus
+from app.services.device_registry import device_registry
 
 router = APIRouter()
 
@@ -17,26 +16,14 @@ router = APIRouter()
 async def get_all_devices():
     """
     Get list of all devices with their current status.
+    Served from the in-memory device registry.
     """
     try:
-        devices = supabase.table("sensor_devices").select("*").execute()
+        if not device_registry.is_loaded:
+            await device_registry.load()
         
-        device_list = []
         current_time = datetime.now()
-        
-        for device in devices.data:
-            last_seen = datetime.fromisoformat(device["last_seen"])
-            time_since_last_seen = current_time - last_seen
-            
-            device_list.append({
-                "device_id": device["device_id"],
-                "name": device["name"],
-                "status": device["status"],
-                "last_seen": device["last_seen"],
-                "minutes_since_last_seen": int(time_since_last_seen.total_seconds() / 60),
-                "battery_level": device.get("battery_level"),
-                "data_points_collected": device.get("data_points_collected", 0)
-            })
+        device_list = [record.to_status(current_time) for record in device_registry.all()]
         
         # Sort by device_id
         device_list.sort(key=lambda x: x["device_id"])
@@ -61,26 +48,18 @@ async def get_all_devices():
 async def get_device_status(device_id: int):
     """
     Get current status of a specific device.
+    Served from the in-memory device registry.
     """
     try:
-        device = supabase.table("sensor_devices").select("*").eq("device_id", device_id).execute()
+        if not device_registry.is_loaded:
+            await device_registry.load()
         
-        if not device.data:
-            raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
+        record = device_registry.get(device_id)
         
-        device_info = device.data[0]
-        last_seen = datetime.fromisoformat(device_info["last_seen"])
-        time_since_last_seen = datetime.now() - last_seen
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
         
-        return {
-            "device_id": device_info["device_id"],
-            "name": device_info["name"],
-            "status": device_info["status"],
-            "last_seen": device_info["last_seen"],
-            "minutes_since_last_seen": int(time_since_last_seen.total_seconds() / 60),
-            "battery_level": device_info.get("battery_level"),
-            "data_points_collected": device_info.get("data_points_collected", 0)
-        }
+        return record.to_status(datetime.now())
         
     except HTTPException:
         raise
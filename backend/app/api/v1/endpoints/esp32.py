@@ -1,53 +1,187 @@
 # app/api/v1/endpoints/esp32.py
 # - /sensor-data
+# - /sensor-data/bulk
 # - /device-online
 # - /device-offline
 
+import json
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from typing import Optional, List, Dict, Any, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import ValidationError
 
-from app.core.database import supabase
+from app.core.config import settings
+from app.core.database import supabase, run_query, run_blocking
 from app.models.sensor_data import SensorData
-from app.models.sensor_device import DeviceOfflinePayload, SensorDevice, DeviceOnlinePayload, DeviceStatus
+from app.services.sensor_data_store import prepare_sensor_record, enrich_sensor_records, insert_sensor_records
+from app.services.ingestion_buffer import ingestion_buffer
+from app.services.ingestion_spool import ingestion_spool
+from app.services.device_registry import device_registry, DeviceRecord
+from app.services.event_bus import event_bus
+from app.models.sensor_device import DeviceOfflinePayload, DeviceOnlinePayload, DeviceStatus
 
 router = APIRouter()
 
 
+def publish_if_changed(record: DeviceRecord, previous_status: Optional[str]):
+    """Push a device status event to live subscribers when the status actually changed"""
+    if record.status != previous_status:
+        event_bus.publish_device_status(record.device_id, record.name, record.status, record.last_seen)
+
+
 
 @router.post("/sensor-data")
 async def receive_sensor_data(data: SensorData):
     """
     Receives data from an ESP32 sensor unit.
-    Stores the data in Supabase database.
+    The reading is acknowledged right after validation and queued in the
+    ingestion buffer, which writes it to Supabase in micro-batches.
+    Responds with 503 when the buffer is full so the device retries later.
     """
-    try: 
-        print(f"RECEIVED DATA: {data}")
+    print(f"RECEIVED DATA: {data}")
 
-        # prepare the data for supabase insertion
-        record = data.model_dump()
-        record["timestamp"] = record["timestamp"].isoformat()
-        record["uploaded_at"] = datetime.now().isoformat()
+    # prepare the data for supabase insertion, snapping and tagging it off the event loop
+    record = prepare_sensor_record(data)
+    await run_blocking(enrich_sensor_records, [record])
 
-        # insert into supabase
-        response = supabase.table("sensor_data").insert(record).execute()
+    # queue for write-behind insertion
+    if not ingestion_buffer.submit(record):
+        print(f"INGESTION BUFFER FULL ({ingestion_buffer.depth} queued), REJECTING READING")
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue is full, retry later",
+            headers={"Retry-After": str(settings.INGEST_RETRY_AFTER_SECONDS)}
+        )
 
-        # check if insert was successful
-        if response.data:
-            print("DATA INSERTED TO SUPABASE SUCCESSFULLY")
-            return {
-                "status": "success",
-                "message": "Data stored in Supabase",
-                "inserted_data": response.data
-            }
+    # the aggregates are fed by the buffer once the reading is stored or spooled
+    event_bus.publish_readings([record])
+
+    return {
+        "status": "accepted",
+        "message": "Data queued for storage in Supabase",
+        "queued": ingestion_buffer.depth
+    }
+
+
+
+
+async def read_ndjson_records(request: Request, max_records: int) -> List[Any]:
+    """
+    Parse an NDJSON request body line by line as it streams in, without
+    buffering the whole body. Raises 413 once it holds more than max_records.
+    """
+    raw_records = []
+    pending = b""
+
+    def parse(line: bytes):
+        if not line.strip():
+            return
+        if len(raw_records) >= max_records:
+            raise HTTPException(status_code=413, detail=f"Too many records: more than {max_records}")
+        raw_records.append(json.loads(line))
+
+    async for chunk in request.stream():
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            parse(line)
+    parse(pending)
+    return raw_records
+
+
+def prepare_bulk_records(raw_records: List[Any]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]], List[int]]:
+    """
+    Validate raw bulk records and prepare the valid ones, snapped to street
+    segments and tagged with barangays as one batch.
+    Returns the per-record results (filled for rejected records only), the
+    prepared rows and the index of each prepared row in the payload.
+    """
+    results = [None] * len(raw_records)
+    valid_records = []
+    valid_indexes = []
+    for index, raw in enumerate(raw_records):
+        try:
+            data = SensorData.model_validate(raw)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors())
+            results[index] = {"index": index, "status": "rejected", "error": error}
+            continue
+        valid_records.append(prepare_sensor_record(data))
+        valid_indexes.append(index)
+
+    enrich_sensor_records(valid_records)
+    return results, valid_records, valid_indexes
+
+
+@router.post("/sensor-data/bulk")
+async def receive_sensor_data_bulk(request: Request):
+    """
+    Receives a batch of buffered readings from an ESP32 sensor unit.
+    Accepts a JSON array of SensorData records, or NDJSON (one record per line)
+    when sent with Content-Type: application/x-ndjson. NDJSON is parsed line by
+    line as the body streams in and rejected with 413 as soon as it goes over
+    INGEST_BULK_MAX_RECORDS; a JSON array is read whole before parsing.
+    Every record is validated first, then valid records are stored with
+    chunked multi-row inserts. Chunks that fail transiently are spooled locally
+    and replayed later; records the database refuses are rejected with its error.
+    Returns accepted/spooled/rejected status per record.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    # parse the payload into a list of raw records
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            raw_records = await read_ndjson_records(request, settings.INGEST_BULK_MAX_RECORDS)
         else:
-            raise Exception("Insert failed: No data returned from Supabase")
-    
-    except Exception as e:
-        import traceback
-        error_traceback = traceback.format_exc()
-        print("FULL ERROR TRACEBACK:\n", error_traceback)
-        
-        raise HTTPException(status_code=500, detail=str(e))
+            raw_records = json.loads(await request.body())
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed payload: {str(e)}")
+
+    if not isinstance(raw_records, list):
+        raise HTTPException(status_code=400, detail="Payload must be a JSON array or NDJSON stream of readings")
+
+    if len(raw_records) > settings.INGEST_BULK_MAX_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many records: {len(raw_records)} (max {settings.INGEST_BULK_MAX_RECORDS})"
+        )
+
+    # validate, snap and tag the whole batch in one pass off the event loop
+    results, valid_records, valid_indexes = await run_blocking(prepare_bulk_records, raw_records)
+
+    # insert valid records in chunks, spooling chunks the database could not take right now;
+    # rows it refuses outright (constraint or type errors) are rejected, never spooled
+    stored_records = []
+    for chunk in await run_blocking(insert_sensor_records, valid_records):
+        if chunk["ok"] or not chunk["permanent"]:
+            stored_records.extend(valid_records[chunk["start"]:chunk["end"]])
+        if not chunk["ok"] and not chunk["permanent"]:
+            await run_blocking(ingestion_spool.append, valid_records[chunk["start"]:chunk["end"]])
+        for position in range(chunk["start"], chunk["end"]):
+            index = valid_indexes[position]
+            if chunk["ok"]:
+                results[index] = {"index": index, "status": "accepted"}
+            elif chunk["permanent"]:
+                results[index] = {"index": index, "status": "rejected", "error": chunk["error"]}
+            else:
+                results[index] = {"index": index, "status": "spooled"}
+
+    event_bus.publish_readings(stored_records)
+    ingestion_buffer.publish_stored(stored_records)
+
+    rejected = sum(1 for r in results if r["status"] == "rejected")
+    spooled = sum(1 for r in results if r["status"] == "spooled")
+    accepted = len(results) - rejected
+    print(f"BULK DATA: {accepted}/{len(results)} record(s) accepted ({spooled} spooled)")
+
+    return {
+        "status": "success" if not rejected else "partial" if accepted else "failed",
+        "received": len(results),
+        "accepted": accepted,
+        "spooled": spooled,
+        "rejected": rejected,
+        "results": results
+    }
 
 
 
@@ -66,24 +200,40 @@ async def device_online(payload: DeviceOnlinePayload):
         raise HTTPException(status_code=400, detail="Device ID is required")
     
     try:
-        # Check if device already exists in Supabase
-        existing_device = supabase.table("sensor_devices").select("*").eq("device_id", payload.device_id).execute()
-        
         current_time = datetime.now()
+        known = device_registry.get(payload.device_id)
+        previous_status = known.status if known else None
         
-        if existing_device.data:
-            # Device exists - update status to online, last_seen, and optionally battery_level
-            update_data = {
-                "status": DeviceStatus.ONLINE,
+        # Known device - update the in-memory registry, written to the database on the next flush
+        record = device_registry.record_heartbeat(payload.device_id, DeviceStatus.ONLINE.value, current_time, payload.battery_level)
+        if record:
+            publish_if_changed(record, previous_status)
+            print(f"Device {payload.device_id} status updated to online")
+            return {
+                "status": "success", 
+                "message": f"Device {payload.device_id} status updated to online",
+                "action": "updated",
+                "device_id": payload.device_id,
                 "last_seen": current_time.isoformat()
             }
-            
-            # Update battery level if provided
-            if payload.battery_level is not None:
-                update_data["battery_level"] = payload.battery_level
-            
-            response = supabase.table("sensor_devices").update(update_data).eq("device_id", payload.device_id).execute()
-            
+        
+        # Unknown device - insert or update it in one round trip (see sql/device_heartbeat.sql)
+        response = await run_query(supabase.rpc("device_heartbeat", {
+            "p_device_id": payload.device_id,
+            "p_name": payload.name,
+            "p_status": DeviceStatus.ONLINE.value,
+            "p_last_seen": current_time.isoformat(),
+            "p_battery_level": payload.battery_level
+        }))
+        device = response.data
+        
+        if not device:
+            raise Exception("Upsert failed: No data returned from Supabase")
+        
+        created = device.pop("created", False)
+        publish_if_changed(device_registry.apply_row(device), previous_status)
+        
+        if not created:
             print(f"Device {payload.device_id} status updated to online")
             return {
                 "status": "success", 
@@ -93,32 +243,14 @@ async def device_online(payload: DeviceOnlinePayload):
                 "last_seen": current_time.isoformat()
             }
         else:
-            # Device doesn't exist - create new SensorDevice and add to database
-            new_device = SensorDevice(
-                device_id=payload.device_id,
-                name=payload.name,
-                status=DeviceStatus.ONLINE,
-                last_seen=current_time,
-                installed_at=current_time,
-                battery_level=payload.battery_level,
-                data_points_collected=0
-            )
-            
-            # Convert to dict for Supabase insertion with proper serialization
-            device_dict = new_device.model_dump()
-            device_dict["last_seen"] = device_dict["last_seen"].isoformat()
-            device_dict["installed_at"] = device_dict["installed_at"].isoformat()
-            
-            response = supabase.table("sensor_devices").insert(device_dict).execute()
-            
             print(f"New device {payload.device_id} added to database")
             return {
                 "status": "success", 
                 "message": f"Device {payload.device_id} added to database and set online",
                 "action": "created",
                 "device_id": payload.device_id,
-                "installed_at": current_time.isoformat(),
-                "device_data": response.data[0] if response.data else None
+                "installed_at": device.get("installed_at", current_time.isoformat()),
+                "device_data": device
             }
             
     except Exception as e:
@@ -140,13 +272,21 @@ async def device_offline(payload: DeviceOfflinePayload):
         raise HTTPException(status_code=400, detail="Device ID is required")
     
     try:
-        # Check if device exists
-        existing_device = supabase.table("sensor_devices").select("*").eq("device_id", payload.device_id).execute()
-        
-        if not existing_device.data:
-            raise HTTPException(status_code=404, detail=f"Device {payload.device_id} not found")
-        
         current_time = datetime.now()
+        known = device_registry.get(payload.device_id)
+        previous_status = known.status if known else None
+        
+        # Known device - update the in-memory registry, written to the database on the next flush
+        record = device_registry.record_heartbeat(payload.device_id, DeviceStatus.OFFLINE.value, current_time, payload.battery_level)
+        if record:
+            publish_if_changed(record, previous_status)
+            print(f"Device {payload.device_id} set to offline")
+            return {
+                "status": "success",
+                "message": f"Device {payload.device_id} marked as offline",
+                "device_id": payload.device_id,
+                "last_seen": current_time.isoformat()
+            }
         
         # Update device to offline status
         update_data = {
@@ -158,7 +298,13 @@ async def device_offline(payload: DeviceOfflinePayload):
         if payload.battery_level is not None:
             update_data["battery_level"] = payload.battery_level
         
-        response = supabase.table("sensor_devices").update(update_data).eq("device_id", payload.device_id).execute()
+        # Single update; no returned row means the device does not exist
+        response = await run_query(supabase.table("sensor_devices").update(update_data).eq("device_id", payload.device_id))
+        
+        if not response.data:
+            raise HTTPException(status_code=404, detail=f"Device {payload.device_id} not found")
+        
+        publish_if_changed(device_registry.apply_row(response.data[0]), previous_status)
         
         print(f"Device {payload.device_id} set to offline")
         return {
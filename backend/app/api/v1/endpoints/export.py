@@ -0,0 +1,107 @@
+# app/api/v1/endpoints/export.py
+# - /sensor-data/export
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Optional, AsyncIterator, List, Dict, Any
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.core.database import supabase, run_query
+
+router = APIRouter()
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+
+async def iter_sensor_data_pages(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sensor_name: Optional[str] = None,
+    barangay: Optional[str] = None,
+    page_size: int = 1000
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Page through sensor_data in (timestamp, id) order using keyset pagination,
+    so every page is an index range scan no matter how deep the export goes.
+    """
+    cursor = None
+    while True:
+        query = supabase.table("sensor_data").select("*")
+        if start:
+            query = query.gte("timestamp", start.isoformat())
+        if end:
+            query = query.lt("timestamp", end.isoformat())
+        if sensor_name:
+            query = query.eq("sensor_name", sensor_name)
+        if barangay:
+            query = query.eq("barangay", barangay)
+        if cursor:
+            last_timestamp, last_id = cursor
+            query = query.or_(f'timestamp.gt."{last_timestamp}",and(timestamp.eq."{last_timestamp}",id.gt.{last_id})')
+
+        response = await run_query(query.order("timestamp").order("id").limit(page_size))
+        rows = response.data
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1]["timestamp"], rows[-1]["id"])
+
+
+async def _ndjson_stream(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for rows in pages:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+
+async def _csv_stream(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    writer = None
+    buffer = io.StringIO()
+    async for rows in pages:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+
+
+@router.get("/sensor-data/export")
+async def export_sensor_data(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    start: Optional[datetime] = Query(None, description="Include readings at or after this time"),
+    end: Optional[datetime] = Query(None, description="Include readings before this time"),
+    sensor_name: Optional[str] = Query(None, description="Only readings from this device"),
+    barangay: Optional[str] = Query(None, description="Only readings in this barangay"),
+    page_size: int = Query(1000, ge=1, le=10000)
+):
+    """
+    Stream sensor_data rows matching the filters as NDJSON or CSV.
+    Rows are fetched and sent one page at a time, so memory use stays flat
+    regardless of how many rows match.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}', use ndjson or csv")
+
+    pages = iter_sensor_data_pages(start, end, sensor_name, barangay, page_size)
+    stream = _csv_stream(pages) if format == "csv" else _ndjson_stream(pages)
+    filename = f"sensor_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
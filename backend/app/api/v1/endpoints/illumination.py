@@ -0,0 +1,52 @@
+# app/api/v1/endpoints/illumination.py
+# - /illumination/cells
+# - /illumination/viewport
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.core.params import parse_bbox
+from app.services.cell_aggregates import cell_aggregates
+
+router = APIRouter()
+
+
+
+@router.get("/illumination/cells")
+async def get_illumination_cells(
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    precision: Optional[int] = Query(None, description="Pyramid level, finest by default")
+):
+    """
+    Latest illumination per geohash cell, maintained incrementally as readings arrive.
+    Each cell has its latest reading plus the count, mean, min and max lux of all readings in it.
+    """
+    if precision is not None and precision not in cell_aggregates.precisions:
+        raise HTTPException(status_code=400, detail=f"precision must be one of {cell_aggregates.precisions}")
+
+    precision = precision or cell_aggregates.precision
+    cells = cell_aggregates.cells(parse_bbox(bbox), precision)
+    return {
+        "precision": precision,
+        "count": len(cells),
+        "cells": [cell.to_dict(precision) for cell in cells]
+    }
+
+
+
+
+@router.get("/illumination/viewport")
+async def get_illumination_viewport(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    zoom: float = Query(..., ge=0, le=24, description="Map zoom level")
+):
+    """Cells intersecting a map viewport, from the pyramid level for the zoom"""
+    precision = cell_aggregates.precision_for_zoom(zoom)
+    cells = cell_aggregates.cells(parse_bbox(bbox), precision)
+    return {
+        "zoom": zoom,
+        "precision": precision,
+        "count": len(cells),
+        "cells": [cell.to_dict(precision) for cell in cells]
+    }
@@ -0,0 +1,86 @@
+# app/api/v1/endpoints/live.py
+# - /live/ws      (WebSocket)
+# - /live/events  (Server-Sent Events)
+
+import asyncio
+import json
+from typing import Optional, List, Set
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.params import parse_bbox
+from app.services.event_bus import event_bus
+
+router = APIRouter()
+
+
+
+def _as_set(values: Optional[List]) -> Optional[Set]:
+    return set(values) if values else None
+
+
+
+
+@router.websocket("/live/ws")
+async def live_websocket(
+    websocket: WebSocket,
+    device_id: Optional[List[int]] = Query(None),
+    sensor_name: Optional[List[str]] = Query(None),
+    bbox: Optional[str] = Query(None)
+):
+    """
+    Push device online/offline transitions and new readings over a WebSocket.
+    Filters: device_id (repeatable) for status events, sensor_name (repeatable)
+    and bbox=min_lon,min_lat,max_lon,max_lat for readings.
+    """
+    try:
+        box = parse_bbox(bbox)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+
+    await websocket.accept()
+    subscription = event_bus.subscribe(_as_set(device_id), _as_set(sensor_name), box)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=settings.LIVE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            await websocket.send_json(event)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+
+
+@router.get("/live/events")
+async def live_events(
+    request: Request,
+    device_id: Optional[List[int]] = Query(None),
+    sensor_name: Optional[List[str]] = Query(None),
+    bbox: Optional[str] = Query(None)
+):
+    """
+    Server-Sent Events stream of device online/offline transitions and new readings.
+    Takes the same filters as /live/ws.
+    """
+    subscription = event_bus.subscribe(_as_set(device_id), _as_set(sensor_name), parse_bbox(bbox))
+
+    async def stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=settings.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
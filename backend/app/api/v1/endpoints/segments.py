@@ -0,0 +1,58 @@
+# app/api/v1/endpoints/segments.py
+# - /segments/illumination
+# - /segments/{segment_id}/illumination
+# - /streets/{street_id}/illumination
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.services.segment_rollups import segment_rollups, combine_rollups
+
+router = APIRouter()
+
+
+
+@router.get("/segments/illumination")
+async def get_segments_illumination(
+    street_id: Optional[int] = Query(None, description="original_street_id of the segments"),
+    barangay_id: Optional[int] = Query(None),
+    min_readings: int = Query(1, ge=1, description="Skip segments with fewer readings")
+):
+    """
+    Precomputed illumination statistics of every street segment with readings:
+    count, mean and min lux, coverage of the segment's length and the share
+    of readings under 10 and 20 lux.
+    """
+    rollups = [r for r in segment_rollups.rollups(street_id, barangay_id) if r.count >= min_readings]
+    return {
+        "count": len(rollups),
+        "summary": combine_rollups(rollups, segment_rollups.total_bins(street_id, barangay_id)),
+        "segments": [r.to_dict() for r in sorted(rollups, key=lambda r: r.segment_id)]
+    }
+
+
+
+
+@router.get("/segments/{segment_id}/illumination")
+async def get_segment_illumination(segment_id: int):
+    """Illumination statistics of one street segment"""
+    rollup = segment_rollups.get(segment_id)
+    if rollup is None:
+        raise HTTPException(status_code=404, detail=f"No readings for segment {segment_id}")
+    return rollup.to_dict()
+
+
+
+
+@router.get("/streets/{street_id}/illumination")
+async def get_street_illumination(street_id: int):
+    """Illumination statistics of a street (original_street_id) across its segments"""
+    rollups = segment_rollups.rollups(street_id=street_id)
+    if not rollups:
+        raise HTTPException(status_code=404, detail=f"No readings for street {street_id}")
+    return {
+        "street_id": street_id,
+        **combine_rollups(rollups, segment_rollups.total_bins(street_id=street_id)),
+        "segment_stats": [r.to_dict() for r in sorted(rollups, key=lambda r: r.segment_id)]
+    }
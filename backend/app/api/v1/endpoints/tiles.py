@@ -0,0 +1,35 @@
+# app/api/v1/endpoints/tiles.py
+# - /tiles/{z}/{x}/{y}
+
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Response
+
+from app.geo.tiles import is_valid_tile
+from app.services.vector_tiles import vector_tiles
+
+router = APIRouter()
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_tile(z: int, x: int, y: int, if_none_match: Optional[str] = Header(None)):
+    """
+    Mapbox Vector Tile with a "segments" layer (street segments with mean_lux)
+    and an "illumination" layer (geohash cells at the level for the zoom).
+    Tiles carry an ETag that only changes when data inside the tile changes.
+    """
+    if not vector_tiles.min_zoom <= z <= vector_tiles.max_zoom:
+        raise HTTPException(status_code=404,
+                            detail=f"Tiles are served for zoom {vector_tiles.min_zoom}-{vector_tiles.max_zoom}")
+    if not is_valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    digest, data = await vector_tiles.get_tile(z, x, y)
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=MVT_MEDIA_TYPE, headers=headers)
@@ -1,10 +1,22 @@
 from fastapi import APIRouter
+from .endpoints import analytics
 from .endpoints import check_supabase
 from .endpoints import device_manager
 from .endpoints import esp32
+from .endpoints import export
+from .endpoints import illumination
+from .endpoints import live
+from .endpoints import segments
+from .endpoints import tiles
 
 api_router = APIRouter()
 
 api_router.include_router(check_supabase.router, tags=["Database"])
 api_router.include_router(esp32.router, tags=["ESP32 Connections"])
 api_router.include_router(device_manager.router, tags=["Device Management"])
+api_router.include_router(export.router, tags=["Data Export"])
+api_router.include_router(live.router, tags=["Live Feed"])
+api_router.include_router(illumination.router, tags=["Illumination Map"])
+api_router.include_router(tiles.router, tags=["Illumination Map"])
+api_router.include_router(segments.router, tags=["Street Illumination"])
+api_router.include_router(analytics.router, tags=["Analytics"])
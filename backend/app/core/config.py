@@ -1,9 +1,13 @@
 import os
+from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# backend/ directory
+BASE_DIR = Path(__file__).resolve().parents[2]
+
 
 class Settings:
     """Application settings and configuration."""
@@ -11,6 +15,7 @@ class Settings:
     # Supabase Configuration
     SUPABASE_URL: Optional[str] = os.environ.get("SUPABASE_URL")
     SUPABASE_KEY: Optional[str] = os.environ.get("SUPABASE_KEY")
+    DB_MAX_WORKERS: int = int(os.environ.get("DB_MAX_WORKERS", 16))
     
     # API Configuration
     API_V1_PREFIX: str = "/api/v1"
@@ -23,6 +28,80 @@ class Settings:
     # Device Scheduler Configuration
     SCHEDULER_CHECK_INTERVAL_MINUTES: float = 0.5  
     SCHEDULER_TIMEOUT_MINUTES: int = 5 
+    INGEST_SNAP_TO_STREET: bool = os.environ.get("INGEST_SNAP_TO_STREET", "true").lower() == "true"
+    INGEST_ASSIGN_BARANGAY: bool = os.environ.get("INGEST_ASSIGN_BARANGAY", "true").lower() == "true"
+    # store snapped_lat/snapped_lon/segment_id/snap_distance_m (needs sql/sensor_data_snapping.sql)
+    INGEST_STORE_SNAP_COLUMNS: bool = os.environ.get("INGEST_STORE_SNAP_COLUMNS", "false").lower() == "true"
+    
+    # Geodata Configuration
+    STREET_SEGMENTS_PATH: str = os.environ.get(
+        "STREET_SEGMENTS_PATH", str(BASE_DIR / "scripts" / "seed_illumination_data" / "street_segments.json")
+    )
+    BARANGAYS_PATH: str = os.environ.get(
+        "BARANGAYS_PATH", str(BASE_DIR / "scripts" / "seed_illumination_data" / "barangays.json")
+    )
+    # columnar copy of both files, built by scripts/seed_illumination_data/build_segment_store.py
+    SEGMENT_STORE_PATH: str = os.environ.get("SEGMENT_STORE_PATH", str(BASE_DIR / "data" / "segment_store"))
+    SNAP_MAX_DISTANCE_METERS: float = float(os.environ.get("SNAP_MAX_DISTANCE_METERS", 30))
+    # built by scripts/seed_illumination_data/build_geohash_index.py
+    GEOHASH_INDEX_PATH: str = os.environ.get("GEOHASH_INDEX_PATH", str(BASE_DIR / "data" / "segment_cells.lwgh"))
+    GEOHASH_INDEX_PRECISION: int = 8
+    
+    # Live Feed Configuration
+    LIVE_SUBSCRIBER_QUEUE_SIZE: int = int(os.environ.get("LIVE_SUBSCRIBER_QUEUE_SIZE", 256))
+    LIVE_KEEPALIVE_SECONDS: float = 15
+    # relays events between API workers/replicas ("supabase" Realtime broadcast or "none");
+    # opt-in, set it to "supabase" when running more than one worker
+    LIVE_RELAY_BACKEND: str = os.environ.get("LIVE_RELAY_BACKEND", "none")
+    LIVE_RELAY_CHANNEL: str = os.environ.get("LIVE_RELAY_CHANNEL", "live_events")
+    
+    # Leader Election Configuration ("file", "lease" or "none")
+    LEADER_ELECTION_BACKEND: str = os.environ.get("LEADER_ELECTION_BACKEND", "file")
+    LEADER_LOCK_PATH: str = os.environ.get("LEADER_LOCK_PATH", str(BASE_DIR / "data" / "scheduler.lock"))
+    LEADER_LEASE_TTL_SECONDS: float = float(os.environ.get("LEADER_LEASE_TTL_SECONDS", 15))
+    LEADER_RENEW_INTERVAL_SECONDS: float = float(os.environ.get("LEADER_RENEW_INTERVAL_SECONDS", 5))
+    
+    # Device Registry Configuration
+    REGISTRY_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get("REGISTRY_FLUSH_INTERVAL_SECONDS", 5))
+    REGISTRY_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("REGISTRY_REFRESH_INTERVAL_SECONDS", 30))
+    
+    # Sensor Data Ingestion Configuration
+    INGEST_INSERT_CHUNK_SIZE: int = int(os.environ.get("INGEST_INSERT_CHUNK_SIZE", 500))
+    INGEST_BULK_MAX_RECORDS: int = int(os.environ.get("INGEST_BULK_MAX_RECORDS", 20000))
+    INGEST_QUEUE_MAX_DEPTH: int = int(os.environ.get("INGEST_QUEUE_MAX_DEPTH", 10000))
+    INGEST_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get("INGEST_FLUSH_INTERVAL_SECONDS", 1.0))
+    INGEST_DRAIN_TIMEOUT_SECONDS: float = float(os.environ.get("INGEST_DRAIN_TIMEOUT_SECONDS", 30))
+    INGEST_RETRY_AFTER_SECONDS: int = 2
+    INGEST_LATENCY_BUDGET_SECONDS: float = float(os.environ.get("INGEST_LATENCY_BUDGET_SECONDS", 2.0))
+    INGEST_SLOW_COOLDOWN_SECONDS: float = float(os.environ.get("INGEST_SLOW_COOLDOWN_SECONDS", 30))
+    INGEST_SPOOL_PATH: str = os.environ.get("INGEST_SPOOL_PATH", str(BASE_DIR / "data" / "ingest_spool.db"))
+    INGEST_SPOOL_REPLAY_INTERVAL_SECONDS: float = float(os.environ.get("INGEST_SPOOL_REPLAY_INTERVAL_SECONDS", 5))
+    
+    # Illumination Map Configuration (sql/cell_aggregates.sql)
+    # geohash pyramid levels as "min_zoom:precision"; precision 5 cells are ~5km, 8 are ~38m x 19m
+    CELL_PYRAMID_LEVELS: str = os.environ.get("CELL_PYRAMID_LEVELS", "0:5,13:6,15:7,17:8")
+    CELL_AGGREGATE_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get("CELL_AGGREGATE_FLUSH_INTERVAL_SECONDS", 10))
+    CELL_AGGREGATE_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("CELL_AGGREGATE_REFRESH_INTERVAL_SECONDS", 60))
+    
+    # Segment Rollup Configuration (sql/segment_rollups.sql)
+    COVERAGE_BIN_METERS: float = float(os.environ.get("COVERAGE_BIN_METERS", 10))
+    SEGMENT_ROLLUP_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get("SEGMENT_ROLLUP_FLUSH_INTERVAL_SECONDS", 10))
+    SEGMENT_ROLLUP_REFRESH_INTERVAL_SECONDS: float = float(os.environ.get("SEGMENT_ROLLUP_REFRESH_INTERVAL_SECONDS", 60))
+    
+    # Lux Analytics Configuration (sql/lux_sketches.sql)
+    SKETCH_RELATIVE_ACCURACY: float = float(os.environ.get("SKETCH_RELATIVE_ACCURACY", 0.01))
+    SKETCH_MAX_BINS: int = int(os.environ.get("SKETCH_MAX_BINS", 2048))
+    SKETCH_FLUSH_INTERVAL_SECONDS: float = float(os.environ.get("SKETCH_FLUSH_INTERVAL_SECONDS", 30))
+    SKETCH_MEMORY_NIGHTS: int = int(os.environ.get("SKETCH_MEMORY_NIGHTS", 2))
+    # rows of restarted workers for older nights are merged into one row per key
+    SKETCH_COMPACT_AFTER_NIGHTS: int = int(os.environ.get("SKETCH_COMPACT_AFTER_NIGHTS", 7))
+    SKETCH_COMPACT_INTERVAL_SECONDS: float = float(os.environ.get("SKETCH_COMPACT_INTERVAL_SECONDS", 3600))
+    
+    # Vector Tile Configuration
+    TILE_CACHE_PATH: str = os.environ.get("TILE_CACHE_PATH", str(BASE_DIR / "data" / "tiles"))
+    TILE_CACHE_MAX_TILES: int = int(os.environ.get("TILE_CACHE_MAX_TILES", 2048))
+    TILE_MIN_ZOOM: int = int(os.environ.get("TILE_MIN_ZOOM", 10))
+    TILE_MAX_ZOOM: int = int(os.environ.get("TILE_MAX_ZOOM", 20))
 
 
 # Global settings instance
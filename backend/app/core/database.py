@@ -1,3 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from supabase import create_client, Client
 from .config import settings
 
@@ -12,3 +16,23 @@ def get_supabase_client() -> Client:
 
 # Global client instance
 supabase: Client = get_supabase_client()
+
+# Bounded pool for blocking Supabase calls, so database round trips
+# overlap with each other instead of blocking the event loop
+_db_executor = ThreadPoolExecutor(max_workers=settings.DB_MAX_WORKERS, thread_name_prefix="supabase")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking database function on the Supabase thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, partial(func, *args, **kwargs))
+
+
+async def run_query(query):
+    """Execute a Supabase query builder without blocking the event loop."""
+    return await run_blocking(query.execute)
+
+
+def shutdown_db_executor():
+    """Wait for in-flight database calls and release the thread pool."""
+    _db_executor.shutdown(wait=True)
@@ -0,0 +1,14 @@
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse a 'min_lon,min_lat,max_lon,max_lat' query parameter into a tuple"""
+    if not bbox:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be 'min_lon,min_lat,max_lon,max_lat'")
+    return min_lon, min_lat, max_lon, max_lat
@@ -0,0 +1,124 @@
+# app/geo/barangay_index.py
+# Point-in-polygon assignment of barangays from their boundary polygons.
+# Points outside the extent of all barangays are dropped first; the rest are
+# matched to candidate polygons by bounding box through an STRtree, and only
+# those pairs are tested exactly against the prepared polygons
+# (shapely.intersects_xy), all vectorized over a batch of points.
+
+import json
+import threading
+import time
+from typing import Optional, List, Dict, Any, Sequence
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from app.core.config import settings
+from app.geo.segment_store import SegmentStore, get_segment_store
+
+
+class BarangayIndex:
+    """Barangay lookup over prepared boundary polygons"""
+
+    def __init__(self, geometries: Sequence, barangay_ids: Sequence[int], names: Sequence[str]):
+        """geometries are lon/lat shapely (Multi)Polygons, None for barangays without a boundary"""
+        keep = [i for i, geometry in enumerate(geometries) if geometry is not None and not geometry.is_empty]
+        if not keep:
+            raise ValueError("No barangay boundaries to assign points to")
+
+        self.geometries = np.array([geometries[i] for i in keep], dtype=object)
+        self.barangay_ids = np.array([barangay_ids[i] for i in keep])
+        self.names = [names[i] for i in keep]
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+        self.bounds = shapely.total_bounds(self.geometries)
+
+    @classmethod
+    def from_barangays(cls, barangays: List[Dict[str, Any]]) -> "BarangayIndex":
+        """Build from barangays.json rows"""
+        return cls(
+            geometries=[shapely.geometry.shape(b["boundary"]) if b.get("boundary") else None for b in barangays],
+            barangay_ids=[b["id"] for b in barangays],
+            names=[b.get("name") or "" for b in barangays]
+        )
+
+    @classmethod
+    def from_store(cls, store: SegmentStore) -> "BarangayIndex":
+        """Build from the boundaries in a memory-mapped SegmentStore"""
+        return cls(
+            geometries=store.barangay_geometries(),
+            barangay_ids=store.barangay_table_ids.tolist(),
+            names=store.barangay_names.tolist()
+        )
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def assign(self, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+        """
+        Position (into barangay_ids / names) of the barangay containing each point, -1 for none.
+        Points on a shared boundary go to the barangay listed first.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        positions = np.full(len(lats), -1, dtype=np.int64)
+
+        min_lon, min_lat, max_lon, max_lat = self.bounds
+        inside = np.flatnonzero((lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat))
+        if not len(inside):
+            return positions
+
+        point_idx, polygon_idx = self.tree.query(shapely.points(lons[inside], lats[inside]))
+        hits = shapely.intersects_xy(self.geometries[polygon_idx], lons[inside][point_idx], lats[inside][point_idx])
+        point_idx, polygon_idx = point_idx[hits], polygon_idx[hits]
+
+        # each point's polygons highest first, so the lowest is written last and wins
+        order = np.lexsort((-polygon_idx, point_idx))
+        positions[inside[point_idx[order]]] = polygon_idx[order]
+        return positions
+
+    def assign_names(self, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[str]]:
+        """Barangay name of each point, None when it is in no barangay"""
+        return [self.names[p] if p >= 0 else None for p in self.assign(lats, lons).tolist()]
+
+
+# a failed load is retried on use once this many seconds have passed
+LOAD_RETRY_SECONDS = 60
+
+_barangay_index: Optional[BarangayIndex] = None
+_barangay_index_failed_at: Optional[float] = None
+_barangay_index_lock = threading.Lock()
+
+
+def get_barangay_index() -> Optional[BarangayIndex]:
+    """
+    Shared BarangayIndex built on first use from the segment store, or from
+    BARANGAYS_PATH when there is no up-to-date store.
+    The build runs once under a lock, since executor threads call this too.
+    Returns None (and logs) when the boundaries cannot be loaded; the load is
+    retried after LOAD_RETRY_SECONDS.
+    """
+    global _barangay_index, _barangay_index_failed_at
+    if _barangay_index is not None:
+        return _barangay_index
+    with _barangay_index_lock:
+        if _barangay_index is not None:
+            return _barangay_index
+        if _barangay_index_failed_at is not None and time.monotonic() - _barangay_index_failed_at < LOAD_RETRY_SECONDS:
+            return None
+        try:
+            store = get_segment_store()
+            if store is not None and len(store.barangay_table_ids):
+                index = BarangayIndex.from_store(store)
+            else:
+                with open(settings.BARANGAYS_PATH, "r", encoding="utf-8") as f:
+                    index = BarangayIndex.from_barangays(json.load(f))
+        except Exception as e:
+            print(f"❌ Could not load barangay boundaries (retrying in {LOAD_RETRY_SECONDS}s): {e}")
+            _barangay_index_failed_at = time.monotonic()
+            return None
+        print(f"🗺️  Barangay index loaded {len(index)} boundary polygon(s)")
+        _barangay_index = index
+        _barangay_index_failed_at = None
+        return _barangay_index
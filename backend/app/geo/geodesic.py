@@ -0,0 +1,110 @@
+# app/geo/geodesic.py
+# Vectorised great-circle distances for GeoJSON coordinates.
+# Coordinates are [lon, lat] pairs as stored in street_segments.json; a
+# LineString is an (n, 2) list, a MultiLineString a list of those. All
+# batch functions stack every geometry into one coordinate array plus part
+# offsets and measure all edges in a single NumPy call; line_length measures
+# one geometry in plain Python, where array setup would cost more than the math.
+
+import math
+from itertools import chain
+from typing import List, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distance in meters between points (scalars or arrays, degrees)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def is_multi(coordinates) -> bool:
+    """True for MultiLineString coordinates"""
+    return len(coordinates) > 0 and isinstance(coordinates[0][0], (list, tuple, np.ndarray))
+
+
+def line_length(coordinates) -> float:
+    """
+    Total length in meters of one LineString or MultiLineString.
+    Use line_lengths to measure many geometries at once.
+    """
+    if not len(coordinates):
+        return 0.0
+    total = 0.0
+    for part in (coordinates if is_multi(coordinates) else (coordinates,)):
+        # convert every vertex once instead of twice per edge
+        previous = None
+        for lon, lat in part:
+            phi, lam = math.radians(lat), math.radians(lon)
+            cos_phi = math.cos(phi)
+            if previous is not None:
+                a = (math.sin((phi - previous[0]) / 2) ** 2
+                     + previous[2] * cos_phi * math.sin((lam - previous[1]) / 2) ** 2)
+                total += math.asin(math.sqrt(min(a, 1.0)))
+            previous = (phi, lam, cos_phi)
+    return 2 * EARTH_RADIUS_M * total
+
+
+def stack_lines(geometries: Sequence):
+    """
+    Stack the vertices of many geometries into one (n, 2) array.
+    Returns (coords, part_of_vertex, geometry_of_part, part_sizes); part k
+    spans the rows from the sum of the sizes before it.
+    """
+    parts, geometry_of_part = [], []
+    for i, coordinates in enumerate(geometries):
+        if not len(coordinates):
+            continue
+        if is_multi(coordinates):
+            parts.extend(coordinates)
+            geometry_of_part.extend([i] * len(coordinates))
+        else:
+            parts.append(coordinates)
+            geometry_of_part.append(i)
+    part_sizes = np.fromiter(map(len, parts), dtype=np.intp, count=len(parts))
+    # flatten the nested lists straight into a float buffer, far cheaper than np.asarray on them
+    flat = chain.from_iterable(chain.from_iterable(parts))
+    coords = np.fromiter(flat, dtype=float, count=2 * int(part_sizes.sum())).reshape(-1, 2)
+    part_of_vertex = np.repeat(np.arange(len(parts)), part_sizes)
+    return coords, part_of_vertex, np.asarray(geometry_of_part, dtype=np.intp), part_sizes
+
+
+def _stacked_edges(coords: np.ndarray, part_of_vertex: np.ndarray) -> np.ndarray:
+    """Edge lengths between consecutive stacked vertices, 0 where an edge would join two parts"""
+    if len(coords) < 2:
+        return np.zeros(0)
+    edges = haversine(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+    edges[part_of_vertex[:-1] != part_of_vertex[1:]] = 0.0
+    return edges
+
+
+def line_lengths(geometries: Sequence) -> np.ndarray:
+    """
+    Lengths in meters of many LineString/MultiLineString coordinate lists in one pass.
+    All vertices are stacked into one array; edges that would join two parts or
+    two geometries are masked out before summing per geometry.
+    """
+    coords, part_of_vertex, geometry_of_part, _ = stack_lines(geometries)
+    edges = _stacked_edges(coords, part_of_vertex)
+    if not len(edges):
+        return np.zeros(len(geometries))
+    return np.bincount(geometry_of_part[part_of_vertex[:-1]], weights=edges, minlength=len(geometries))
+
+
+def edge_lengths(geometries: Sequence) -> List[List[np.ndarray]]:
+    """
+    Edge lengths in meters of many geometries in one pass:
+    one list per geometry holding one (n - 1,) array per line part.
+    """
+    coords, part_of_vertex, geometry_of_part, part_sizes = stack_lines(geometries)
+    edges = np.append(_stacked_edges(coords, part_of_vertex), 0.0)
+    # part k's edges start at its first vertex and there is one fewer than its vertices
+    starts = np.concatenate(([0], np.cumsum(part_sizes)[:-1])) if len(part_sizes) else part_sizes
+    result: List[List[np.ndarray]] = [[] for _ in geometries]
+    for geometry, start, size in zip(geometry_of_part.tolist(), starts.tolist(), part_sizes.tolist()):
+        result[geometry].append(edges[start:start + max(size - 1, 0)])
+    return result
@@ -0,0 +1,149 @@
+# app/geo/geohash.py
+# Integer geohash helpers.
+# A geohash of precision p has 5p bits: ceil(5p/2) longitude bits and floor(5p/2)
+# latitude bits, interleaved starting with longitude. Working with the
+# (lat_idx, lon_idx) grid position makes neighbours and bbox coverage simple
+# integer ranges. String output matches geohash2.encode().
+
+import math
+from typing import Tuple, List
+
+import numpy as np
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(BASE32)}
+
+
+def bit_counts(precision: int) -> Tuple[int, int]:
+    """(lat_bits, lon_bits) for a precision"""
+    total = 5 * precision
+    return total // 2, total - total // 2
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """(lat_height, lon_width) of one cell in degrees"""
+    lat_bits, lon_bits = bit_counts(precision)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def cell_size_meters(precision: int, lat: float = 0.0) -> Tuple[float, float]:
+    """Approximate (height, width) of one cell in meters at a latitude"""
+    lat_deg, lon_deg = cell_size_degrees(precision)
+    return lat_deg * 111320.0, lon_deg * 111320.0 * math.cos(math.radians(lat))
+
+
+def grid_index(lat: float, lon: float, precision: int) -> Tuple[int, int]:
+    """(lat_idx, lon_idx) of the cell containing a point"""
+    lat_bits, lon_bits = bit_counts(precision)
+    lat_idx = min(int((lat + 90.0) / 180.0 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    lon_idx = min(int((lon + 180.0) / 360.0 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    return lat_idx, lon_idx
+
+
+def _spread_bits(value: int) -> int:
+    """Move bit i of a 32-bit value to bit 2i"""
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def interleave(lat_idx: int, lon_idx: int, precision: int) -> int:
+    """Combine grid indexes into the integer geohash"""
+    lat_bits, lon_bits = bit_counts(precision)
+    if precision <= 12:
+        # the last bit is a longitude bit when the total bit count is odd
+        lat_idx &= (1 << lat_bits) - 1
+        lon_idx &= (1 << lon_bits) - 1
+        if lon_bits > lat_bits:
+            return _spread_bits(lon_idx) | (_spread_bits(lat_idx) << 1)
+        return (_spread_bits(lon_idx) << 1) | _spread_bits(lat_idx)
+
+    code = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lon_bits -= 1
+            code = (code << 1) | ((lon_idx >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            code = (code << 1) | ((lat_idx >> lat_bits) & 1)
+    return code
+
+
+def deinterleave(code: int, precision: int) -> Tuple[int, int]:
+    """Split an integer geohash into (lat_idx, lon_idx)"""
+    lat_idx = lon_idx = 0
+    for i in range(5 * precision):
+        bit = (code >> (5 * precision - 1 - i)) & 1
+        if i % 2 == 0:
+            lon_idx = (lon_idx << 1) | bit
+        else:
+            lat_idx = (lat_idx << 1) | bit
+    return lat_idx, lon_idx
+
+
+def encode_int(lat: float, lon: float, precision: int) -> int:
+    """Integer geohash of a point"""
+    lat_idx, lon_idx = grid_index(lat, lon, precision)
+    return interleave(lat_idx, lon_idx, precision)
+
+
+def encode_int_array(lats, lons, precision: int) -> np.ndarray:
+    """Vectorized integer geohash for arrays of points (precision <= 12)"""
+    lat_bits, lon_bits = bit_counts(precision)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    lat_idx = np.minimum(((lats + 90.0) / 180.0 * (1 << lat_bits)).astype(np.uint64), (1 << lat_bits) - 1)
+    lon_idx = np.minimum(((lons + 180.0) / 360.0 * (1 << lon_bits)).astype(np.uint64), (1 << lon_bits) - 1)
+
+    codes = np.zeros(lats.shape, dtype=np.uint64)
+    one = np.uint64(1)
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lon_bits -= 1
+            bit = (lon_idx >> np.uint64(lon_bits)) & one
+        else:
+            lat_bits -= 1
+            bit = (lat_idx >> np.uint64(lat_bits)) & one
+        codes = (codes << one) | bit
+    return codes
+
+
+def to_string(code: int, precision: int) -> str:
+    """Integer geohash -> base32 string"""
+    return "".join(BASE32[(code >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def from_string(geohash: str) -> int:
+    """Base32 string -> integer geohash"""
+    code = 0
+    for c in geohash:
+        code = (code << 5) | _BASE32_INDEX[c]
+    return code
+
+
+def cell_bounds(code: int, precision: int) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a cell"""
+    lat_idx, lon_idx = deinterleave(code, precision)
+    lat_deg, lon_deg = cell_size_degrees(precision)
+    min_lat = lat_idx * lat_deg - 90.0
+    min_lon = lon_idx * lon_deg - 180.0
+    return min_lat, min_lon, min_lat + lat_deg, min_lon + lon_deg
+
+
+def cell_center(code: int, precision: int) -> Tuple[float, float]:
+    """(lat, lon) of a cell's center"""
+    min_lat, min_lon, max_lat, max_lon = cell_bounds(code, precision)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cells_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, precision: int) -> List[int]:
+    """Integer geohashes of every cell intersecting a bounding box"""
+    lat_lo, lon_lo = grid_index(min_lat, min_lon, precision)
+    lat_hi, lon_hi = grid_index(max_lat, max_lon, precision)
+    return [
+        interleave(lat_idx, lon_idx, precision)
+        for lat_idx in range(lat_lo, lat_hi + 1)
+        for lon_idx in range(lon_lo, lon_hi + 1)
+    ]
@@ -0,0 +1,130 @@
+# app/geo/geohash_index.py
+# Precomputed geohash cell -> candidate street segment ids table.
+#
+# Every segment is rasterized (with a buffer) into the geohash cells it may be
+# nearest to, and the result is written as an open-addressing hash table so a
+# reading can be matched to its few candidate segments with one hash probe on a
+# memory-mapped file, followed by an exact distance check.
+#
+# File layout (little-endian):
+#   header  "LWGH" | version u16 | precision u16 | capacity u32 | id_count u32 | buffer_m f32
+#   slots   capacity x (key u64, start u32, count u32)   key = geohash + 1, 0 = empty
+#   ids     id_count x i32 segment ids
+
+import math
+import mmap
+import struct
+from collections import defaultdict
+from typing import Tuple, Dict, Set
+
+import numpy as np
+import shapely
+
+from app.geo.geohash import bit_counts, cell_size_meters, interleave
+
+MAGIC = b"LWGH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIf")
+SLOT = struct.Struct("<QII")
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+def _slot_for(code: int, capacity_bits: int) -> int:
+    """Fibonacci hashing of a geohash into a table of 2**capacity_bits slots"""
+    return ((code * _HASH_MULTIPLIER) & _MASK64) >> (64 - capacity_bits)
+
+
+def rasterize_segments(snapper, precision: int, buffer_m: float) -> Dict[int, Set[int]]:
+    """
+    Map every geohash cell within buffer_m of a segment to the ids of those segments.
+    Uses the snapper's projected geometries, densified to half a cell.
+    """
+    ref_lat = snapper.projection.ref_lat
+    cell_h, cell_w = cell_size_meters(precision, ref_lat)
+    step = min(cell_h, cell_w) / 2
+    lat_ring = math.ceil(buffer_m / cell_h)
+    lon_ring = math.ceil(buffer_m / cell_w)
+    lat_bits, lon_bits = bit_counts(precision)
+
+    cells: Dict[int, Set[int]] = defaultdict(set)
+    for geometry, segment_id in zip(snapper.geometries, snapper.segment_ids.tolist()):
+        coords = shapely.get_coordinates(shapely.segmentize(geometry, step))
+        lons, lats = snapper.projection.inverse(coords[:, 0], coords[:, 1])
+        lat_idx = ((lats + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+        lon_idx = ((lons + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+
+        touched = set(zip(lat_idx.tolist(), lon_idx.tolist()))
+        for base_lat, base_lon in touched:
+            for d_lat in range(-lat_ring, lat_ring + 1):
+                for d_lon in range(-lon_ring, lon_ring + 1):
+                    cells[interleave(base_lat + d_lat, base_lon + d_lon, precision)].add(segment_id)
+    return cells
+
+
+def write_geohash_index(cells: Dict[int, Set[int]], precision: int, buffer_m: float, path: str):
+    """Write the cell table as an open-addressing hash table"""
+    capacity_bits = max(4, math.ceil(math.log2(max(len(cells), 1) * 2)))
+    capacity = 1 << capacity_bits
+
+    slots = [(0, 0, 0)] * capacity
+    ids = []
+    for code, segment_ids in cells.items():
+        slot = _slot_for(code, capacity_bits)
+        while slots[slot][0] != 0:
+            slot = (slot + 1) & (capacity - 1)
+        slots[slot] = (code + 1, len(ids), len(segment_ids))
+        ids.extend(sorted(segment_ids))
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, precision, capacity, len(ids), buffer_m))
+        f.write(b"".join(SLOT.pack(*slot) for slot in slots))
+        f.write(np.asarray(ids, dtype="<i4").tobytes())
+
+
+class GeohashSegmentIndex:
+    """Read-only, memory-mapped geohash cell -> candidate segment ids table"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.precision, self.capacity, self.id_count, self.buffer_m = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a geohash segment index (version {VERSION})")
+
+        lat_bits, lon_bits = bit_counts(self.precision)
+        self._lat_cells = 1 << lat_bits
+        self._lon_cells = 1 << lon_bits
+        self._capacity_bits = self.capacity.bit_length() - 1
+        self._slots_offset = HEADER.size
+        self._ids = np.frombuffer(self._mm, dtype="<i4", count=self.id_count,
+                                  offset=self._slots_offset + self.capacity * SLOT.size)
+
+    def candidates_for_cell(self, code: int) -> Tuple[int, ...]:
+        """Segment ids whose buffer touches a cell"""
+        key = code + 1
+        slot = _slot_for(code, self._capacity_bits)
+        while True:
+            slot_key, start, count = SLOT.unpack_from(self._mm, self._slots_offset + slot * SLOT.size)
+            if slot_key == key:
+                return tuple(self._ids[start:start + count].tolist())
+            if slot_key == 0:
+                return ()
+            slot = (slot + 1) & (self.capacity - 1)
+
+    def cell_of(self, lat: float, lon: float) -> int:
+        """Integer geohash of the cell containing a point (encode_int with the grid size precomputed)"""
+        lat_idx = min(int((lat + 90.0) / 180.0 * self._lat_cells), self._lat_cells - 1)
+        lon_idx = min(int((lon + 180.0) / 360.0 * self._lon_cells), self._lon_cells - 1)
+        return interleave(lat_idx, lon_idx, self.precision)
+
+    def candidates(self, lat: float, lon: float) -> Tuple[int, ...]:
+        """Segment ids that may be nearest to a point"""
+        return self.candidates_for_cell(self.cell_of(lat, lon))
+
+    def close(self):
+        self._ids = None
+        self._mm.close()
+        self._file.close()
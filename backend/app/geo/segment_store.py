@@ -0,0 +1,253 @@
+# app/geo/segment_store.py
+# Columnar, memory-mapped cache of street_segments.json and barangays.json.
+# The store is a directory of .npy files written once by
+# scripts/seed_illumination_data/build_segment_store.py. Opening it maps the
+# arrays read-only (np.load mmap_mode="r"), so it takes milliseconds and
+# worker processes share the same pages instead of each parsing the JSON.
+# Each build goes into its own subdirectory and the CURRENT file names the
+# live one; replacing CURRENT is atomic, so readers never see a partial or
+# missing store while it is rebuilt.
+#
+# Geometries are kept as flat [lon, lat] coordinate arrays plus offset arrays:
+#   segments:  segment_part_offsets -> part_offsets -> coords
+#   barangays: barangay_polygon_offsets -> polygon_ring_offsets -> ring_offsets -> ring_coords
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+import shapely
+
+from app.core.config import settings
+from app.geo.geodesic import line_lengths, is_multi
+
+STORE_VERSION = 2
+
+SEGMENT_ARRAYS = ("segment_ids", "street_ids", "barangay_ids", "street_names", "segment_lengths", "lengths_m",
+                  "bboxes", "coords", "part_offsets", "segment_part_offsets")
+BARANGAY_ARRAYS = ("barangay_table_ids", "barangay_names", "barangay_bboxes", "ring_coords", "ring_offsets",
+                   "polygon_ring_offsets", "barangay_polygon_offsets")
+
+
+def _offsets(sizes) -> np.ndarray:
+    """Offsets array (len n + 1) for consecutive runs of the given sizes"""
+    return np.concatenate(([0], np.cumsum(sizes, dtype=np.int64))).astype(np.int64)
+
+
+def _bboxes(coords: np.ndarray, vertex_offsets: np.ndarray) -> np.ndarray:
+    """(n, 4) [min_lon, min_lat, max_lon, max_lat] of each run of vertices"""
+    bboxes = np.full((len(vertex_offsets) - 1, 4), np.nan)
+    nonempty = vertex_offsets[1:] > vertex_offsets[:-1]
+    if len(coords) and nonempty.any():
+        starts = vertex_offsets[:-1][nonempty]
+        bboxes[nonempty, :2] = np.minimum.reduceat(coords, starts)
+        bboxes[nonempty, 2:] = np.maximum.reduceat(coords, starts)
+    return bboxes
+
+
+def resolve_store_dir(path: str) -> Path:
+    """Directory of the live build under a store path (the path itself for stores built before CURRENT)"""
+    current = Path(path) / "CURRENT"
+    if current.exists():
+        return Path(path) / current.read_text(encoding="utf-8").strip()
+    return Path(path)
+
+
+def build_segment_store(segments: List[Dict[str, Any]], barangays: List[Dict[str, Any]], path: str):
+    """Convert street_segments.json and barangays.json records into a store directory"""
+    arrays: Dict[str, np.ndarray] = {}
+
+    segments = [s for s in segments if s.get("segment_geom") and s["segment_geom"].get("coordinates")]
+    parts, parts_per_segment = [], []
+    for segment in segments:
+        coordinates = segment["segment_geom"]["coordinates"]
+        segment_parts = coordinates if is_multi(coordinates) else [coordinates]
+        parts.extend(segment_parts)
+        parts_per_segment.append(len(segment_parts))
+
+    arrays["coords"] = np.array([xy for part in parts for xy in part], dtype=np.float64).reshape(-1, 2)
+    arrays["part_offsets"] = _offsets([len(part) for part in parts])
+    arrays["segment_part_offsets"] = _offsets(parts_per_segment)
+    arrays["segment_ids"] = np.array([s["id"] for s in segments], dtype=np.int32)
+    arrays["street_ids"] = np.array([s.get("original_street_id") or 0 for s in segments], dtype=np.int32)
+    arrays["barangay_ids"] = np.array([s.get("barangay_id") or 0 for s in segments], dtype=np.int32)
+    arrays["street_names"] = np.array([s.get("street_name") or "" for s in segments], dtype=str)
+    # segment_length as fetched from the database (its units, NaN when missing); lengths_m is geodesic
+    arrays["segment_lengths"] = np.array([s["segment_length"] if s.get("segment_length") is not None else np.nan
+                                          for s in segments], dtype=np.float64)
+    arrays["lengths_m"] = line_lengths([s["segment_geom"]["coordinates"] for s in segments])
+    arrays["bboxes"] = _bboxes(arrays["coords"], arrays["part_offsets"][arrays["segment_part_offsets"]])
+
+    rings, rings_per_polygon, polygons_per_barangay = [], [], []
+    for barangay in barangays:
+        boundary = barangay.get("boundary") or {}
+        coordinates = boundary.get("coordinates") or []
+        polygons = coordinates if boundary.get("type") == "MultiPolygon" else ([coordinates] if coordinates else [])
+        for polygon in polygons:
+            rings.extend(polygon)
+            rings_per_polygon.append(len(polygon))
+        polygons_per_barangay.append(len(polygons))
+
+    arrays["ring_coords"] = np.array([xy for ring in rings for xy in ring], dtype=np.float64).reshape(-1, 2)
+    arrays["ring_offsets"] = _offsets([len(ring) for ring in rings])
+    arrays["polygon_ring_offsets"] = _offsets(rings_per_polygon)
+    arrays["barangay_polygon_offsets"] = _offsets(polygons_per_barangay)
+    arrays["barangay_table_ids"] = np.array([b["id"] for b in barangays], dtype=np.int32)
+    arrays["barangay_names"] = np.array([b.get("name") or "" for b in barangays], dtype=str)
+    barangay_vertex_offsets = arrays["ring_offsets"][arrays["polygon_ring_offsets"][arrays["barangay_polygon_offsets"]]]
+    arrays["barangay_bboxes"] = _bboxes(arrays["ring_coords"], barangay_vertex_offsets)
+
+    # write a new build next to the live one, then point CURRENT at it in one atomic replace
+    root = Path(path)
+    build = f"build-{time.time_ns()}"
+    (root / build).mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(root / build / f"{name}.npy", np.ascontiguousarray(array))
+    with open(root / build / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"version": STORE_VERSION, "segments": len(segments), "barangays": len(barangays)}, f)
+
+    pointer = root / "CURRENT.tmp"
+    pointer.write_text(build, encoding="utf-8")
+    os.replace(pointer, root / "CURRENT")
+
+    # drop older builds and a pre-CURRENT flat store; processes that still map
+    # them keep their pages, and files that cannot be removed yet (Windows) are
+    # left for the next build
+    for entry in root.iterdir():
+        if entry.name in (build, "CURRENT"):
+            continue
+        try:
+            if entry.is_dir() and entry.name.startswith("build-"):
+                shutil.rmtree(entry)
+            elif entry.name == "meta.json" or entry.suffix == ".npy":
+                entry.unlink()
+        except OSError:
+            pass
+
+
+class SegmentStore:
+    """Read-only view of a store directory; every array is memory-mapped"""
+
+    def __init__(self, path: str):
+        """path is the store path; the live build under it is opened"""
+        self.path = str(resolve_store_dir(path))
+        with open(Path(self.path) / "meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Segment store {path} has version {self.meta.get('version')}, "
+                             f"expected {STORE_VERSION}, rebuild it")
+
+        for name in SEGMENT_ARRAYS + BARANGAY_ARRAYS:
+            setattr(self, name, np.load(Path(self.path) / f"{name}.npy", mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return len(self.segment_ids)
+
+    @property
+    def modified_at(self) -> float:
+        """When the store was built (mtime of its metadata)"""
+        return os.path.getmtime(Path(self.path) / "meta.json")
+
+    def segment_parts(self, i: int) -> List[np.ndarray]:
+        """(n, 2) [lon, lat] arrays, one per line part of segment i"""
+        first, last = self.segment_part_offsets[i], self.segment_part_offsets[i + 1]
+        return [self.coords[self.part_offsets[k]:self.part_offsets[k + 1]] for k in range(first, last)]
+
+    def segment_coordinates(self, i: int):
+        """GeoJSON coordinates of segment i (LineString, or MultiLineString when it has several parts)"""
+        parts = [part.tolist() for part in self.segment_parts(i)]
+        return parts[0] if len(parts) == 1 else parts
+
+    def to_segments(self) -> List[Dict[str, Any]]:
+        """Records shaped like street_segments.json rows, for code that works on dicts"""
+        segments = []
+        for i in range(len(self)):
+            coordinates = self.segment_coordinates(i)
+            segments.append({
+                "id": int(self.segment_ids[i]),
+                "original_street_id": int(self.street_ids[i]) or None,
+                "street_name": str(self.street_names[i]) or None,
+                "barangay_id": int(self.barangay_ids[i]) or None,
+                "segment_geom": {
+                    "type": "MultiLineString" if is_multi(coordinates) else "LineString",
+                    "coordinates": coordinates
+                },
+                "segment_length": None if np.isnan(self.segment_lengths[i]) else float(self.segment_lengths[i])
+            })
+        return segments
+
+    def to_barangays(self) -> List[Dict[str, Any]]:
+        """Records shaped like barangays.json rows"""
+        barangays = []
+        for i, geometry in enumerate(self.barangay_geometries()):
+            barangays.append({
+                "id": int(self.barangay_table_ids[i]),
+                "name": str(self.barangay_names[i]),
+                "boundary": shapely.geometry.mapping(geometry) if geometry is not None else None
+            })
+        return barangays
+
+    def segment_geometries(self) -> np.ndarray:
+        """Shapely LineString/MultiLineString per segment, built straight from the arrays"""
+        part_sizes = np.diff(self.part_offsets)
+        lines = shapely.linestrings(np.asarray(self.coords), indices=np.repeat(np.arange(len(part_sizes)), part_sizes))
+        parts_per_segment = np.diff(self.segment_part_offsets)
+        geometries = np.empty(len(self), dtype=object)
+        single = parts_per_segment == 1
+        geometries[single] = lines[self.segment_part_offsets[:-1][single]]
+        multi = np.flatnonzero(~single & (parts_per_segment > 0))
+        for i in multi.tolist():
+            geometries[i] = shapely.MultiLineString(list(lines[self.segment_part_offsets[i]:self.segment_part_offsets[i + 1]]))
+        return geometries
+
+    def barangay_geometries(self) -> np.ndarray:
+        """Shapely Polygon/MultiPolygon per barangay (None when it has no boundary)"""
+        ring_sizes = np.diff(self.ring_offsets)
+        rings = shapely.linearrings(np.asarray(self.ring_coords),
+                                    indices=np.repeat(np.arange(len(ring_sizes)), ring_sizes))
+        polygons = [shapely.Polygon(rings[first], list(rings[first + 1:last]))
+                    for first, last in zip(self.polygon_ring_offsets[:-1].tolist(), self.polygon_ring_offsets[1:].tolist())]
+        geometries = np.empty(len(self.barangay_table_ids), dtype=object)
+        for i, (first, last) in enumerate(zip(self.barangay_polygon_offsets[:-1].tolist(),
+                                              self.barangay_polygon_offsets[1:].tolist())):
+            if last - first == 1:
+                geometries[i] = polygons[first]
+            elif last > first:
+                geometries[i] = shapely.MultiPolygon(polygons[first:last])
+        return geometries
+
+
+_segment_store: Optional[SegmentStore] = None
+_segment_store_lock = threading.Lock()
+
+
+def get_segment_store() -> Optional[SegmentStore]:
+    """
+    Shared SegmentStore opened from SEGMENT_STORE_PATH on first use.
+    Returns None when there is no store, or when it is older than
+    STREET_SEGMENTS_PATH or BARANGAYS_PATH (both are baked into it).
+    """
+    global _segment_store
+    if _segment_store is not None:
+        return _segment_store or None
+    with _segment_store_lock:
+        if _segment_store is not None:
+            return _segment_store or None
+        _segment_store = False
+        if (resolve_store_dir(settings.SEGMENT_STORE_PATH) / "meta.json").exists():
+            try:
+                store = SegmentStore(settings.SEGMENT_STORE_PATH)
+                sources = [p for p in (settings.STREET_SEGMENTS_PATH, settings.BARANGAYS_PATH) if os.path.exists(p)]
+                if any(os.path.getmtime(p) > store.modified_at for p in sources):
+                    print(f"⚠️  Segment store {settings.SEGMENT_STORE_PATH} is older than the street segments "
+                          f"or barangays, ignoring it")
+                else:
+                    _segment_store = store
+            except Exception as e:
+                print(f"❌ Could not open segment store: {e}")
+    return _segment_store or None
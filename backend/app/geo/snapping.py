@@ -0,0 +1,314 @@
+# app/geo/snapping.py
+# Snaps GPS readings to the nearest street segment.
+# Segment geometries are loaded once, projected to meters and kept in an STRtree,
+# so each point is only compared against nearby candidate segments.
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Optional, List, Dict, Any, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from app.core.config import settings
+from app.geo.geodesic import EARTH_RADIUS_M, line_lengths
+from app.geo.geohash_index import GeohashSegmentIndex
+from app.geo.segment_store import SegmentStore, get_segment_store
+
+
+class LocalProjection:
+    """
+    Equirectangular projection to meters around a reference latitude.
+    Accurate to well under a meter across a city-sized area.
+    """
+
+    def __init__(self, ref_lat: float):
+        self.ref_lat = ref_lat
+        self._x_scale = EARTH_RADIUS_M * math.cos(math.radians(ref_lat)) * math.pi / 180.0
+        self._y_scale = EARTH_RADIUS_M * math.pi / 180.0
+
+    def forward(self, lons, lats):
+        """(lon, lat) degrees -> (x, y) meters"""
+        return np.asarray(lons, dtype=float) * self._x_scale, np.asarray(lats, dtype=float) * self._y_scale
+
+    def inverse(self, xs, ys):
+        """(x, y) meters -> (lon, lat) degrees"""
+        return np.asarray(xs, dtype=float) / self._x_scale, np.asarray(ys, dtype=float) / self._y_scale
+
+    def forward_point(self, lon: float, lat: float) -> Tuple[float, float]:
+        """forward() for a single point, without numpy overhead"""
+        return lon * self._x_scale, lat * self._y_scale
+
+    def inverse_point(self, x: float, y: float) -> Tuple[float, float]:
+        """inverse() for a single point, without numpy overhead"""
+        return x / self._x_scale, y / self._y_scale
+
+    def project_geometry(self, geometry):
+        """Project a lon/lat shapely geometry to meters"""
+        return shapely.transform(geometry, lambda coords: np.column_stack(self.forward(coords[:, 0], coords[:, 1])))
+
+
+class SnapResult:
+    """Position of a reading on its nearest street segment"""
+
+    __slots__ = ("lat", "lon", "distance_m", "offset_m", "segment_id", "street_id", "street_name", "barangay_id")
+
+    def __init__(self, lat: float, lon: float, distance_m: float, offset_m: float, segment_id: int,
+                 street_id: Optional[int], street_name: Optional[str], barangay_id: Optional[int]):
+        self.lat = lat
+        self.lon = lon
+        self.distance_m = distance_m
+        self.offset_m = offset_m
+        self.segment_id = segment_id
+        self.street_id = street_id
+        self.street_name = street_name
+        self.barangay_id = barangay_id
+
+
+class RoadSnapper:
+    """Nearest-segment lookup backed by an STRtree over projected street segments"""
+
+    def __init__(self, geometries: Sequence, segment_ids: Sequence[int], street_ids: Sequence[Optional[int]],
+                 street_names: Sequence[Optional[str]], barangay_ids: Sequence[Optional[int]],
+                 lengths_m: Sequence[float], max_distance_m: float = 30.0):
+        """geometries are lon/lat shapely lines, one per segment"""
+        self.max_distance_m = max_distance_m
+        if not len(geometries):
+            raise ValueError("No street segments with geometry to snap to")
+
+        # project around the center of the data
+        center = shapely.GeometryCollection(list(geometries)).envelope.centroid
+        self.projection = LocalProjection(center.y)
+        self.geometries = np.array([self.projection.project_geometry(g) for g in geometries], dtype=object)
+        self.tree = STRtree(self.geometries)
+
+        self.segment_ids = np.asarray(segment_ids)
+        # geodesic length of each segment in meters, for per-segment statistics
+        self.lengths_m = np.asarray(lengths_m, dtype=float)
+        self.cell_index = None
+        self.street_ids = list(street_ids)
+        self.street_names = list(street_names)
+        self.barangay_ids = list(barangay_ids)
+
+    @classmethod
+    def from_segments(cls, segments: List[Dict[str, Any]], max_distance_m: float = 30.0) -> "RoadSnapper":
+        """Build from street_segments.json rows"""
+        kept = [s for s in segments if s.get("segment_geom") and s["segment_geom"].get("coordinates")]
+        return cls(
+            geometries=[shapely.geometry.shape(s["segment_geom"]) for s in kept],
+            segment_ids=[s["id"] for s in kept],
+            street_ids=[s.get("original_street_id") for s in kept],
+            street_names=[s.get("street_name") for s in kept],
+            barangay_ids=[s.get("barangay_id") for s in kept],
+            lengths_m=line_lengths([s["segment_geom"]["coordinates"] for s in kept]),
+            max_distance_m=max_distance_m
+        )
+
+    @classmethod
+    def from_store(cls, store: SegmentStore, max_distance_m: float = 30.0) -> "RoadSnapper":
+        """Build from a memory-mapped SegmentStore without parsing any JSON"""
+        return cls(
+            geometries=store.segment_geometries(),
+            segment_ids=store.segment_ids,
+            street_ids=[street_id or None for street_id in store.street_ids.tolist()],
+            street_names=[name or None for name in store.street_names.tolist()],
+            barangay_ids=[barangay_id or None for barangay_id in store.barangay_ids.tolist()],
+            lengths_m=store.lengths_m,
+            max_distance_m=max_distance_m
+        )
+
+    def __len__(self) -> int:
+        return len(self.segment_ids)
+
+    def snap_batch(self, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[SnapResult]]:
+        """
+        Snap many points at once. Returns one SnapResult per point,
+        or None where no segment is within max_distance_m.
+        """
+        results: List[Optional[SnapResult]] = [None] * len(lats)
+        if not len(lats):
+            return results
+
+        xs, ys = self.projection.forward(lons, lats)
+        points = shapely.points(xs, ys)
+        (point_idx, tree_idx), distances = self.tree.query_nearest(
+            points, max_distance=self.max_distance_m, return_distance=True, all_matches=False
+        )
+        if not len(point_idx):
+            return results
+
+        lines = self.geometries[tree_idx]
+        offsets = shapely.line_locate_point(lines, points[point_idx])
+        snapped = shapely.line_interpolate_point(lines, offsets)
+        snapped_lons, snapped_lats = self.projection.inverse(shapely.get_x(snapped), shapely.get_y(snapped))
+
+        for k, (i, j) in enumerate(zip(point_idx.tolist(), tree_idx.tolist())):
+            results[i] = self._make_result(j, float(snapped_lats[k]), float(snapped_lons[k]),
+                                           float(distances[k]), float(offsets[k]))
+        return results
+
+    def attach_cell_index(self, cell_index):
+        """
+        Use a precomputed GeohashSegmentIndex for single-point snapping.
+        The index must have been built with a buffer of at least max_distance_m.
+        """
+        if cell_index.buffer_m + 1e-3 < self.max_distance_m:
+            raise ValueError(f"Cell index buffer {cell_index.buffer_m}m is smaller than the "
+                             f"snap distance {self.max_distance_m}m, rebuild it")
+
+        # every edge of every line part as a plain tuple, with the distance along
+        # its segment at which it starts; cells share these tuples
+        parts, part_segment = shapely.get_parts(self.geometries, return_index=True)
+        coords, coord_part = shapely.get_coordinates(parts, return_index=True)
+        same_part = coord_part[:-1] == coord_part[1:]
+        starts, ends = coords[:-1][same_part], coords[1:][same_part]
+        edge_segment = part_segment[coord_part[:-1][same_part]]
+        vectors = ends - starts
+        lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        before = np.cumsum(lengths) - lengths
+        first_edge = np.searchsorted(edge_segment, np.arange(len(self.geometries)))
+
+        self._edges = list(zip(
+            starts[:, 0].tolist(), starts[:, 1].tolist(), vectors[:, 0].tolist(), vectors[:, 1].tolist(),
+            (1.0 / np.maximum(lengths ** 2, 1e-12)).tolist(), lengths.tolist(),
+            (before - before[first_edge[edge_segment]]).tolist(), edge_segment.tolist()
+        ))
+        self._edge_ranges = list(zip(first_edge.tolist(), first_edge[1:].tolist() + [len(self._edges)]))
+        self._position_by_id = {segment_id: i for i, segment_id in enumerate(self.segment_ids.tolist())}
+        self._cell_edges = {}
+        self.cell_index = cell_index
+
+    def _edges_for_cell(self, code: int) -> List[tuple]:
+        """Edges of a cell's candidate segments, gathered once per cell"""
+        edges = self._cell_edges.get(code)
+        if edges is None:
+            edges = []
+            for segment_id in self.cell_index.candidates_for_cell(code):
+                position = self._position_by_id.get(segment_id)
+                if position is not None:
+                    edges.extend(self._edges[slice(*self._edge_ranges[position])])
+            if edges:
+                self._cell_edges[code] = edges
+        return edges
+
+    def snap(self, lat: float, lon: float) -> Optional[SnapResult]:
+        """
+        Snap a single point. With a cell index this is one hash lookup plus an
+        exact distance check against the edges of the cell's few candidate segments,
+        in plain Python since a cell holds too few edges to amortize numpy calls.
+        """
+        if self.cell_index is None:
+            return self.snap_batch([lat], [lon])[0]
+
+        x, y = self.projection.forward_point(lon, lat)
+        best = None
+        best_distance_sq = self.max_distance_m ** 2
+        for edge_x, edge_y, dx, dy, inv_length_sq, length, offset, position in self._edges_for_cell(
+                self.cell_index.cell_of(lat, lon)):
+            rx = x - edge_x
+            ry = y - edge_y
+            t = min(max((rx * dx + ry * dy) * inv_length_sq, 0.0), 1.0)
+            gap_x = rx - t * dx
+            gap_y = ry - t * dy
+            distance_sq = gap_x * gap_x + gap_y * gap_y
+            if distance_sq <= best_distance_sq:
+                best = (position, x - gap_x, y - gap_y, offset + t * length)
+                best_distance_sq = distance_sq
+        if best is None:
+            return None
+
+        position, snapped_x, snapped_y, offset = best
+        snapped_lon, snapped_lat = self.projection.inverse_point(snapped_x, snapped_y)
+        return self._make_result(position, snapped_lat, snapped_lon,
+                                 math.sqrt(best_distance_sq), offset)
+
+    def _make_result(self, position: int, lat: float, lon: float, distance_m: float, offset_m: float) -> SnapResult:
+        return SnapResult(
+            lat=round(lat, 7),
+            lon=round(lon, 7),
+            distance_m=round(distance_m, 2),
+            offset_m=round(offset_m, 2),
+            segment_id=int(self.segment_ids[position]),
+            street_id=self.street_ids[position],
+            street_name=self.street_names[position],
+            barangay_id=self.barangay_ids[position]
+        )
+
+
+# a failed load is retried on use once this many seconds have passed
+LOAD_RETRY_SECONDS = 60
+
+_road_snapper: Optional[RoadSnapper] = None
+_road_snapper_failed_at: Optional[float] = None
+_road_snapper_lock = threading.Lock()
+
+
+def load_road_snapper() -> RoadSnapper:
+    """
+    New RoadSnapper (without a cell index) from the segment store, or from
+    STREET_SEGMENTS_PATH when there is no up-to-date store.
+    """
+    store = get_segment_store()
+    if store is not None:
+        return RoadSnapper.from_store(store, max_distance_m=settings.SNAP_MAX_DISTANCE_METERS)
+    with open(settings.STREET_SEGMENTS_PATH, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    return RoadSnapper.from_segments(segments, max_distance_m=settings.SNAP_MAX_DISTANCE_METERS)
+
+
+def attach_geohash_index(snapper: RoadSnapper):
+    """
+    Attach the geohash cell index at GEOHASH_INDEX_PATH when it exists and is
+    usable. A missing, outdated or incompatible index only logs a warning;
+    snap() then keeps using the STRtree.
+    """
+    path = settings.GEOHASH_INDEX_PATH
+    if not os.path.exists(path):
+        return
+    if (os.path.exists(settings.STREET_SEGMENTS_PATH)
+            and os.path.getmtime(settings.STREET_SEGMENTS_PATH) > os.path.getmtime(path)):
+        print(f"⚠️  Geohash cell index {path} is older than the street segments, ignoring it")
+        return
+
+    index = None
+    try:
+        index = GeohashSegmentIndex(path)
+        snapper.attach_cell_index(index)
+        print(f"🛣️  Using geohash cell index {path}")
+    except Exception as e:
+        if index is not None:
+            index.close()
+        print(f"⚠️  Not using geohash cell index {path}: {e}")
+
+
+def get_road_snapper() -> Optional[RoadSnapper]:
+    """
+    Shared RoadSnapper built on first use (see load_road_snapper), with the
+    geohash cell index attached when there is an up-to-date one.
+    The build runs once under a lock, since executor threads call this too.
+    Returns None (and logs) when the segments cannot be loaded; the load is
+    retried after LOAD_RETRY_SECONDS.
+    """
+    global _road_snapper, _road_snapper_failed_at
+    if _road_snapper is not None:
+        return _road_snapper
+    with _road_snapper_lock:
+        if _road_snapper is not None:
+            return _road_snapper
+        if _road_snapper_failed_at is not None and time.monotonic() - _road_snapper_failed_at < LOAD_RETRY_SECONDS:
+            return None
+        try:
+            snapper = load_road_snapper()
+        except Exception as e:
+            print(f"❌ Could not load street segments for snapping (retrying in {LOAD_RETRY_SECONDS}s): {e}")
+            _road_snapper_failed_at = time.monotonic()
+            return None
+        print(f"🛣️  Road snapper loaded {len(snapper)} street segment(s)")
+        attach_geohash_index(snapper)
+        _road_snapper = snapper
+        _road_snapper_failed_at = None
+        return _road_snapper
@@ -0,0 +1,63 @@
+# app/geo/tiles.py
+# Web Mercator (EPSG:3857) tile math for the vector tile endpoint.
+# Tiles use the XYZ scheme of Leaflet and OSM: x grows east, y grows south.
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+# spherical Mercator uses the WGS84 semi-major axis, not the mean radius of geodesic.py
+MERCATOR_RADIUS_M = 6378137.0
+MERCATOR_HALF_WORLD_M = math.pi * MERCATOR_RADIUS_M
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def lonlat_to_mercator(lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+    """Arrays of lon/lat degrees -> Web Mercator meters"""
+    lons = np.asarray(lons, dtype=float)
+    lats = np.clip(np.asarray(lats, dtype=float), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    xs = np.radians(lons) * MERCATOR_RADIUS_M
+    ys = np.log(np.tan(np.pi / 4 + np.radians(lats) / 2)) * MERCATOR_RADIUS_M
+    return xs, ys
+
+
+def mercator_to_lonlat(xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+    """Arrays of Web Mercator meters -> lon/lat degrees"""
+    lons = np.degrees(np.asarray(xs, dtype=float) / MERCATOR_RADIUS_M)
+    lats = np.degrees(2 * np.arctan(np.exp(np.asarray(ys, dtype=float) / MERCATOR_RADIUS_M)) - np.pi / 2)
+    return lons, lats
+
+
+def tile_size_meters(z: int) -> float:
+    """Width (= height) of a tile at zoom z in Mercator meters"""
+    return 2 * MERCATOR_HALF_WORLD_M / (1 << z)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_x, min_y, max_x, max_y) of a tile in Mercator meters"""
+    size = tile_size_meters(z)
+    min_x = -MERCATOR_HALF_WORLD_M + x * size
+    max_y = MERCATOR_HALF_WORLD_M - y * size
+    return min_x, max_y - size, min_x + size, max_y
+
+
+def tile_bounds_lonlat(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lon, min_lat, max_lon, max_lat) of a tile"""
+    min_x, min_y, max_x, max_y = tile_bounds(z, x, y)
+    lons, lats = mercator_to_lonlat([min_x, max_x], [min_y, max_y])
+    return float(lons[0]), float(lats[0]), float(lons[1]), float(lats[1])
+
+
+def tile_range(min_lon: float, min_lat: float, max_lon: float, max_lat: float, z: int) -> Tuple[int, int, int, int]:
+    """(min_x, min_y, max_x, max_y) of the tiles at zoom z intersecting a lon/lat box, inclusive"""
+    xs, ys = lonlat_to_mercator([min_lon, max_lon], [max_lat, min_lat])
+    size = tile_size_meters(z)
+    last = (1 << z) - 1
+    min_x, max_x = (min(max(int((v + MERCATOR_HALF_WORLD_M) // size), 0), last) for v in xs)
+    min_y, max_y = (min(max(int((MERCATOR_HALF_WORLD_M - v) // size), 0), last) for v in ys)
+    return min_x, min_y, max_x, max_y
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return z >= 0 and 0 <= x < (1 << z) and 0 <= y < (1 << z)
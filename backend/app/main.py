@@ -5,8 +5,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
+from app.core.database import run_blocking, shutdown_db_executor
 from app.api.v1.routes import api_router
 from app.services.device_scheduler import device_scheduler
+from app.services.device_registry import device_registry
+from app.services.leader_election import leader_elector
+from app.services.ingestion_buffer import ingestion_buffer
+from app.services.ingestion_spool import ingestion_spool
+from app.services.event_bus import event_bus
+from app.services.cell_aggregates import cell_aggregates
+from app.services.vector_tiles import vector_tiles
+from app.services.segment_rollups import segment_rollups
+from app.services.lux_sketches import lux_sketches
+from app.geo.snapping import get_road_snapper
+from app.geo.barangay_index import get_barangay_index
 
 
 @asynccontextmanager
@@ -14,14 +26,49 @@ async def lifespan(app: FastAPI):
     """Manage application lifespan events"""
     # Startup
     print("🚀 Starting LIWANAG API...")
-    print("📡 Initializing device scheduler...")
-    await device_scheduler.start()
+    print("📋 Loading device registry...")
+    await device_registry.start()
+    print("📡 Electing device scheduler leader...")
+    leader_elector.on_elected(device_scheduler.start)
+    leader_elector.on_demoted(device_scheduler.stop)
+    await leader_elector.start()
+    # build the street snapper and barangay index before readings arrive, not on the first request
+    if settings.INGEST_SNAP_TO_STREET:
+        print("🛣️  Loading road snapper...")
+        await run_blocking(get_road_snapper)
+    if settings.INGEST_ASSIGN_BARANGAY:
+        print("🗺️  Loading barangay boundaries...")
+        await run_blocking(get_barangay_index)
+    print("📥 Initializing ingestion buffer...")
+    # aggregates only count readings that were stored or spooled, not dead-lettered ones
+    ingestion_buffer.add_listener(cell_aggregates.add_readings)
+    ingestion_buffer.add_listener(segment_rollups.add_readings)
+    ingestion_buffer.add_listener(lux_sketches.add_readings)
+    await ingestion_spool.start()
+    await ingestion_buffer.start()
+    print("📣 Starting live event relay...")
+    await event_bus.start()
+    print("🗺️  Loading illumination cell aggregates...")
+    cell_aggregates.add_listener(vector_tiles.invalidate_positions)
+    await cell_aggregates.start()
+    print("🛣️  Loading segment rollups...")
+    await segment_rollups.start()
+    print("📈 Starting lux sketches...")
+    await lux_sketches.start()
     
     yield
     
     # Shutdown
     print("🛑 Shutting down LIWANAG API...")
-    await device_scheduler.stop()
+    await leader_elector.stop()
+    await device_registry.stop()
+    await ingestion_buffer.stop(drain_timeout_seconds=settings.INGEST_DRAIN_TIMEOUT_SECONDS)
+    await ingestion_spool.stop()
+    await event_bus.stop()
+    await cell_aggregates.stop()
+    await segment_rollups.stop()
+    await lux_sketches.stop()
+    shutdown_db_executor()
 
 
 # create FastAPI application with lifespan management
@@ -54,6 +101,15 @@ def read_root():
             "device_status": "GET /api/v1/device-status/{id}",
             "devices": "GET /api/v1/devices",
             "sensor_data": "POST /api/v1/receive-sensor-data",
+            "sensor_data_bulk": "POST /api/v1/sensor-data/bulk",
+            "sensor_data_export": "GET /api/v1/sensor-data/export",
+            "live_feed": "WS /api/v1/live/ws, GET /api/v1/live/events",
+            "illumination_cells": "GET /api/v1/illumination/cells",
+            "illumination_viewport": "GET /api/v1/illumination/viewport",
+            "vector_tiles": "GET /api/v1/tiles/{z}/{x}/{y}",
+            "segment_illumination": "GET /api/v1/segments/illumination, GET /api/v1/segments/{id}/illumination",
+            "street_illumination": "GET /api/v1/streets/{id}/illumination",
+            "lux_analytics": "GET /api/v1/analytics/lux/percentiles, GET /api/v1/analytics/lux/histogram",
             "health": "GET /health"
         }
     }
@@ -65,8 +121,56 @@ def health_check():
     return {
         "status": "healthy",
         "scheduler_running": device_scheduler.is_running,
+        "leader": {
+            "backend": leader_elector.backend,
+            "instance_id": leader_elector.instance_id,
+            "is_leader": leader_elector.is_leader,
+            "leader_id": leader_elector.leader_id
+        },
         "check_interval": f"{device_scheduler.check_interval_minutes} minute(s)",
-        "timeout_threshold": f"{device_scheduler.timeout_minutes} minute(s)"
+        "timeout_threshold": f"{device_scheduler.timeout_minutes} minute(s)",
+        "ingestion": {
+            "buffer_running": ingestion_buffer.is_running,
+            "queue_depth": ingestion_buffer.depth,
+            "queue_capacity": ingestion_buffer.max_depth,
+            "flushed": ingestion_buffer.flushed_count,
+            "spooled": ingestion_buffer.spooled_count,
+            "spool_depth": ingestion_spool.depth,
+            "spool_replay_lag_seconds": ingestion_spool.replay_lag_seconds,
+            "spool_replayed": ingestion_spool.replayed_count,
+            "spool_last_error": ingestion_spool.last_error,
+            "dead_lettered": ingestion_spool.dead_letter_count
+        },
+        "live": {
+            "subscribers": event_bus.subscriber_count,
+            "relay_backend": event_bus.relay_backend,
+            "relay_connected": event_bus.relay_connected,
+            "relayed": event_bus.relayed_count,
+            "received": event_bus.received_count,
+            "relay_dropped": event_bus.relay_dropped
+        },
+        "cell_aggregates": {
+            "loaded": cell_aggregates.is_loaded,
+            "cells": cell_aggregates.cell_count,
+            "cells_per_precision": cell_aggregates.level_counts(),
+            "pending": cell_aggregates.pending_count
+        },
+        "segment_rollups": {
+            "loaded": segment_rollups.is_loaded,
+            "segments": segment_rollups.segment_count,
+            "pending": segment_rollups.pending_count
+        },
+        "lux_sketches": {
+            "sketches": lux_sketches.sketch_count,
+            "pending": lux_sketches.pending_count,
+            "compacted": lux_sketches.compacted_count
+        },
+        "vector_tiles": {
+            "cached": vector_tiles.cached_tiles,
+            "memory_hits": vector_tiles.memory_hits,
+            "disk_hits": vector_tiles.disk_hits,
+            "renders": vector_tiles.renders
+        }
     }
 
 
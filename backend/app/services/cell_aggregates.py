@@ -0,0 +1,372 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterable, Tuple, Callable
+
+from app.core.config import settings
+from app.core.database import supabase, run_query
+from app.geo.geohash import encode_int, to_string, cell_center, cells_in_bbox, grid_index
+from app.services.device_registry import parse_timestamp, to_timestamptz
+
+LOAD_PAGE_SIZE = 1000
+
+
+class CellAggregate:
+    """Illumination summary of one geohash cell: the latest reading plus count, mean and min lux"""
+
+    __slots__ = ("cell", "lat", "lon", "latest_lux", "latest_at", "count", "lux_sum", "min_lux", "max_lux")
+
+    def __init__(self, cell: int, lat: float, lon: float, latest_lux: float, latest_at: datetime,
+                 count: int = 0, lux_sum: float = 0.0, min_lux: Optional[float] = None,
+                 max_lux: Optional[float] = None):
+        self.cell = cell
+        self.lat = lat
+        self.lon = lon
+        self.latest_lux = latest_lux
+        self.latest_at = latest_at
+        self.count = count
+        self.lux_sum = lux_sum
+        self.min_lux = latest_lux if min_lux is None else min_lux
+        self.max_lux = latest_lux if max_lux is None else max_lux
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "CellAggregate":
+        """Build from a cell_aggregates row"""
+        return cls(
+            cell=row["cell"],
+            lat=row["lat"],
+            lon=row["lon"],
+            latest_lux=row["latest_lux"],
+            latest_at=parse_timestamp(row["latest_at"]),
+            count=row["reading_count"],
+            lux_sum=row["lux_sum"],
+            min_lux=row["min_lux"],
+            max_lux=row.get("max_lux")
+        )
+
+    @property
+    def mean_lux(self) -> float:
+        return self.lux_sum / self.count if self.count else 0.0
+
+    def add(self, lux: float, at: datetime):
+        """Fold one reading in; the newest reading becomes latest"""
+        self.count += 1
+        self.lux_sum += lux
+        if lux < self.min_lux:
+            self.min_lux = lux
+        if lux > self.max_lux:
+            self.max_lux = lux
+        if at >= self.latest_at:
+            self.latest_lux = lux
+            self.latest_at = at
+
+    def merge(self, other: "CellAggregate"):
+        """Fold another aggregate of the same cell in"""
+        self.count += other.count
+        self.lux_sum += other.lux_sum
+        self.min_lux = min(self.min_lux, other.min_lux)
+        self.max_lux = max(self.max_lux, other.max_lux)
+        if other.latest_at >= self.latest_at:
+            self.latest_lux = other.latest_lux
+            self.latest_at = other.latest_at
+
+    def copy(self) -> "CellAggregate":
+        return CellAggregate(self.cell, self.lat, self.lon, self.latest_lux, self.latest_at,
+                             self.count, self.lux_sum, self.min_lux, self.max_lux)
+
+    def to_dict(self, precision: int) -> Dict[str, Any]:
+        """Cell as returned by the illumination map endpoints"""
+        return {
+            "geohash": to_string(self.cell, precision),
+            "lat": self.lat,
+            "lon": self.lon,
+            "latest_lux": self.latest_lux,
+            "latest_at": self.latest_at.isoformat(),
+            "count": self.count,
+            "mean_lux": round(self.mean_lux, 2),
+            "min_lux": self.min_lux,
+            "max_lux": self.max_lux
+        }
+
+    def to_merge_row(self, precision: int) -> Dict[str, Any]:
+        """Delta sent to merge_cell_aggregates"""
+        return {
+            "cell": self.cell,
+            "geohash": to_string(self.cell, precision),
+            "lat": self.lat,
+            "lon": self.lon,
+            "latest_lux": self.latest_lux,
+            "latest_at": to_timestamptz(self.latest_at),
+            "reading_count": self.count,
+            "lux_sum": self.lux_sum,
+            "min_lux": self.min_lux,
+            "max_lux": self.max_lux
+        }
+
+
+def parse_pyramid_levels(spec: str) -> List[Tuple[int, int]]:
+    """Parse 'min_zoom:precision,...' (e.g. '0:5,13:6') into sorted (min_zoom, precision) pairs"""
+    levels = []
+    for item in spec.split(","):
+        zoom, precision = item.split(":")
+        levels.append((int(zoom), int(precision)))
+    return sorted(levels)
+
+
+class CellPyramid:
+    """
+    CellAggregates for the same readings at several geohash precisions.
+    A reading is encoded once at the finest precision; its coarser cells are
+    prefixes of that geohash (a right shift of 5 bits per level).
+    """
+
+    def __init__(self, precisions: Iterable[int]):
+        self.precisions = sorted(set(precisions))
+        self.finest = self.precisions[-1]
+        self.levels: Dict[int, Dict[int, CellAggregate]] = {p: {} for p in self.precisions}
+
+    def __len__(self) -> int:
+        return sum(len(cells) for cells in self.levels.values())
+
+    def add_reading(self, lat: float, lon: float, lux: float, at: datetime):
+        """Fold one reading into its cell at every level"""
+        code = encode_int(lat, lon, self.finest)
+        for precision, cells in self.levels.items():
+            cell = code >> (5 * (self.finest - precision))
+            aggregate = cells.get(cell)
+            if aggregate is None:
+                center_lat, center_lon = cell_center(cell, precision)
+                cells[cell] = CellAggregate(cell, center_lat, center_lon, lux, at, 1, lux, lux, lux)
+            else:
+                aggregate.add(lux, at)
+
+    def add_records(self, records: Iterable[Dict[str, Any]]) -> List[Tuple[float, float]]:
+        """Fold sensor_data rows in, at their snapped position when they have one; returns the positions"""
+        positions = []
+        for record in records:
+            if record.get("snapped_lat") is not None:
+                lat, lon = record["snapped_lat"], record["snapped_lon"]
+            else:
+                lat, lon = record["lat"], record["lon"]
+            self.add_reading(lat, lon, record["lux"], parse_timestamp(record["timestamp"]))
+            positions.append((lat, lon))
+        return positions
+
+    def merge(self, other: "CellPyramid"):
+        """Fold another pyramid's levels in (copies, so other stays independent)"""
+        for precision, cells in other.levels.items():
+            level = self.levels.setdefault(precision, {})
+            for cell, aggregate in cells.items():
+                if cell in level:
+                    level[cell].merge(aggregate)
+                else:
+                    level[cell] = aggregate.copy()
+
+    def cells(self, precision: int, bbox: Optional[Tuple[float, float, float, float]] = None) -> List[CellAggregate]:
+        """
+        Cells of one level, or those intersecting bbox=(min_lon, min_lat, max_lon, max_lat).
+        Small viewports look up the cells covering the bbox; larger ones scan the level.
+        """
+        level = self.levels.get(precision, {})
+        if bbox is None:
+            return list(level.values())
+        min_lon, min_lat, max_lon, max_lat = bbox
+        lat_lo, lon_lo = grid_index(min_lat, min_lon, precision)
+        lat_hi, lon_hi = grid_index(max_lat, max_lon, precision)
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) <= len(level):
+            candidates = cells_in_bbox(min_lat, min_lon, max_lat, max_lon, precision)
+            return [level[cell] for cell in candidates if cell in level]
+        matches = []
+        for aggregate in level.values():
+            lat_idx, lon_idx = grid_index(aggregate.lat, aggregate.lon, precision)
+            if lat_lo <= lat_idx <= lat_hi and lon_lo <= lon_idx <= lon_hi:
+                matches.append(aggregate)
+        return matches
+
+
+class CellAggregateStore:
+    """
+    Incremental geohash pyramid of ingested readings: one level per zoom band
+    (CELL_PYRAMID_LEVELS), each cell holding the latest reading and count,
+    mean, min and max lux.
+    Each reading updates its cell on every level in memory. The changes since
+    the last flush are kept as a pyramid of deltas and merged into the
+    cell_aggregates table (sql/cell_aggregates.sql) by RPC every flush
+    interval, so several workers can feed the same cells. The totals are
+    refreshed from the table periodically to include other workers' readings.
+    """
+
+    def __init__(self, levels: List[Tuple[int, int]], flush_interval_seconds: float = 10.0,
+                 refresh_interval_seconds: float = 60.0):
+        self.zoom_levels = sorted(levels)
+        self.precisions = sorted({precision for _, precision in self.zoom_levels})
+        self.flush_interval_seconds = flush_interval_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.is_running = False
+        self.is_loaded = False
+        self._cells = CellPyramid(self.precisions)
+        self._pending = CellPyramid(self.precisions)
+        self._task: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+        self._listeners: List[Callable[[List[Tuple[float, float]]], None]] = []
+
+    @property
+    def precision(self) -> int:
+        """Finest level"""
+        return self.precisions[-1]
+
+    @property
+    def cell_count(self) -> int:
+        return len(self._cells)
+
+    @property
+    def pending_count(self) -> int:
+        """Cells with readings not yet written to the database"""
+        return len(self._pending)
+
+    def level_counts(self) -> Dict[int, int]:
+        """Cells per precision"""
+        return {precision: len(cells) for precision, cells in self._cells.levels.items()}
+
+    def precision_for_zoom(self, zoom: float) -> int:
+        """Level used for a map zoom: the last band whose min zoom is at or below it"""
+        precision = self.zoom_levels[0][1]
+        for min_zoom, level_precision in self.zoom_levels:
+            if zoom >= min_zoom:
+                precision = level_precision
+        return precision
+
+    def get(self, cell: int, precision: Optional[int] = None) -> Optional[CellAggregate]:
+        return self._cells.levels.get(precision or self.precision, {}).get(cell)
+
+    def add_listener(self, callback: Callable[[List[Tuple[float, float]]], None]):
+        """Call callback with (lat, lon) positions whose cells changed, locally or in a refresh"""
+        self._listeners.append(callback)
+
+    def _notify(self, positions: List[Tuple[float, float]]):
+        if not positions:
+            return
+        for callback in self._listeners:
+            try:
+                callback(positions)
+            except Exception as e:
+                print(f"❌ Cell aggregate listener error: {e}")
+
+    def add_reading(self, lat: float, lon: float, lux: float, at: datetime):
+        """Fold one reading into its cells"""
+        self._cells.add_reading(lat, lon, lux, at)
+        self._pending.add_reading(lat, lon, lux, at)
+        self._notify([(lat, lon)])
+
+    def add_readings(self, records: Iterable[Dict[str, Any]]):
+        """Fold prepared sensor_data rows in, at their snapped position when they have one"""
+        records = list(records)
+        positions = self._cells.add_records(records)
+        self._pending.add_records(records)
+        self._notify(positions)
+
+    def cells(self, bbox: Optional[Tuple[float, float, float, float]] = None,
+              precision: Optional[int] = None) -> List[CellAggregate]:
+        """Cells of a level (finest by default), optionally only those intersecting bbox"""
+        return self._cells.cells(precision or self.precision, bbox)
+
+    async def load(self):
+        """Load the stored totals, keeping local changes that have not been flushed"""
+        cells = CellPyramid(self.precisions)
+        start = 0
+        while True:
+            response = await run_query(
+                supabase.table("cell_aggregates").select("*").in_("precision", self.precisions)
+                .order("precision").order("cell").range(start, start + LOAD_PAGE_SIZE - 1)
+            )
+            for row in response.data:
+                aggregate = CellAggregate.from_row(row)
+                cells.levels[row["precision"]][aggregate.cell] = aggregate
+            if len(response.data) < LOAD_PAGE_SIZE:
+                break
+            start += LOAD_PAGE_SIZE
+
+        cells.merge(self._pending)
+        old, new = self._cells.levels[self.precision], cells.levels[self.precision]
+        changed = [a for cell, a in new.items()
+                   if cell not in old or old[cell].count != a.count or old[cell].latest_at != a.latest_at]
+        changed.extend(a for cell, a in old.items() if cell not in new)
+        self._cells = cells
+        self.is_loaded = True
+        self._last_refresh = asyncio.get_running_loop().time()
+        # finest cells changed by other workers; their coarser cells are at the same positions
+        self._notify([(a.lat, a.lon) for a in changed])
+
+    async def flush(self):
+        """Merge the pending deltas into cell_aggregates, one call per level"""
+        if not len(self._pending):
+            return
+
+        pending, self._pending = self._pending, CellPyramid(self.precisions)
+        for precision in self.precisions:
+            deltas = pending.levels[precision]
+            if not deltas:
+                continue
+            try:
+                await run_query(supabase.rpc("merge_cell_aggregates", {
+                    "p_precision": precision,
+                    "p_cells": [delta.to_merge_row(precision) for delta in deltas.values()]
+                }))
+            except Exception:
+                # keep this and the remaining levels, plus anything that arrived meanwhile
+                for done in self.precisions:
+                    if done >= precision:
+                        break
+                    pending.levels[done] = {}
+                pending.merge(self._pending)
+                self._pending = pending
+                raise
+
+    async def start(self):
+        """Load the stored aggregates and start the background flusher"""
+        if self.is_running:
+            return
+
+        try:
+            await self.load()
+            print(f"✅ Cell aggregates loaded {len(self._cells)} cell(s) at precision(s) {self.precisions}")
+        except Exception as e:
+            print(f"❌ Could not load cell aggregates, will retry: {e}")
+
+        self.is_running = True
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and write any pending changes"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Final cell aggregate flush failed: {e}")
+        print("🛑 Cell aggregates stopped")
+
+    async def _flush_loop(self):
+        """Flush pending deltas and periodically refresh from the database"""
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+                if not self.is_loaded or loop.time() - self._last_refresh >= self.refresh_interval_seconds:
+                    await self.load()
+            except Exception as e:
+                print(f"❌ Cell aggregate error: {e}")
+
+
+# Global cell aggregate store instance
+cell_aggregates = CellAggregateStore(
+    levels=parse_pyramid_levels(settings.CELL_PYRAMID_LEVELS),
+    flush_interval_seconds=settings.CELL_AGGREGATE_FLUSH_INTERVAL_SECONDS,
+    refresh_interval_seconds=settings.CELL_AGGREGATE_REFRESH_INTERVAL_SECONDS
+)
@@ -0,0 +1,222 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Callable
+
+from app.core.config import settings
+from app.core.database import supabase, run_query
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """
+    Parse a timestamp from Supabase or a device into a naive local datetime.
+    Naive local time is the backend's convention (datetime.now() everywhere),
+    so values with an offset are converted to local time first; naive values
+    are already local and kept as is.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def to_timestamptz(value: datetime) -> str:
+    """ISO string with the local offset for a naive local datetime, for timestamptz columns"""
+    return value.astimezone().isoformat()
+
+
+class DeviceRecord:
+    """Current state of one sensor device"""
+
+    __slots__ = ("device_id", "name", "status", "last_seen", "installed_at",
+                 "battery_level", "data_points_collected", "dirty")
+
+    def __init__(self, device_id: int, name: str, status: str, last_seen: datetime,
+                 installed_at: Optional[datetime] = None, battery_level: Optional[int] = None,
+                 data_points_collected: int = 0):
+        self.device_id = device_id
+        self.name = name
+        self.status = status
+        self.last_seen = last_seen
+        self.installed_at = installed_at
+        self.battery_level = battery_level
+        self.data_points_collected = data_points_collected
+        self.dirty = False
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "DeviceRecord":
+        """Build a record from a sensor_devices row"""
+        return cls(
+            device_id=row["device_id"],
+            name=row["name"],
+            status=row["status"],
+            last_seen=parse_timestamp(row["last_seen"]),
+            installed_at=parse_timestamp(row.get("installed_at")),
+            battery_level=row.get("battery_level"),
+            data_points_collected=row.get("data_points_collected") or 0
+        )
+
+    def to_status(self, current_time: datetime) -> Dict[str, Any]:
+        """Device status as returned by the device management endpoints"""
+        return {
+            "device_id": self.device_id,
+            "name": self.name,
+            "status": self.status,
+            "last_seen": self.last_seen.isoformat(),
+            "minutes_since_last_seen": int((current_time - self.last_seen).total_seconds() / 60),
+            "battery_level": self.battery_level,
+            "data_points_collected": self.data_points_collected
+        }
+
+    def to_update_row(self) -> Dict[str, Any]:
+        """Columns written back to sensor_devices on flush"""
+        return {
+            "device_id": self.device_id,
+            "name": self.name,
+            "status": self.status,
+            "last_seen": self.last_seen.isoformat(),
+            "battery_level": self.battery_level
+        }
+
+
+class DeviceRegistry:
+    """
+    In-process registry of sensor devices keyed by device_id.
+    Heartbeats update memory only; dirty records are written to sensor_devices
+    in one batched upsert every flush interval, and the registry is refreshed
+    from the table periodically to pick up changes made by other workers.
+    """
+
+    def __init__(self, flush_interval_seconds: float = 5.0, refresh_interval_seconds: float = 30.0):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.is_running = False
+        self.is_loaded = False
+        self._devices: Dict[int, DeviceRecord] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+        self._listeners: List[Callable[[DeviceRecord], None]] = []
+
+    def add_listener(self, callback: Callable[[DeviceRecord], None]):
+        """Register a callback invoked whenever a device's last_seen or status changes"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _notify(self, record: DeviceRecord):
+        for callback in self._listeners:
+            callback(record)
+
+    def get(self, device_id: int) -> Optional[DeviceRecord]:
+        """Get a device record, or None if the device is not known"""
+        return self._devices.get(device_id)
+
+    def all(self) -> List[DeviceRecord]:
+        """All known device records"""
+        return list(self._devices.values())
+
+    def record_heartbeat(self, device_id: int, status: str, seen_at: datetime,
+                         battery_level: Optional[int] = None) -> Optional[DeviceRecord]:
+        """
+        Apply a heartbeat to a known device in memory.
+        Returns None when the device is not in the registry, so the caller can create it.
+        """
+        record = self._devices.get(device_id)
+        if record is None:
+            return None
+
+        record.status = status
+        record.last_seen = seen_at
+        if battery_level is not None:
+            record.battery_level = battery_level
+        record.dirty = True
+        self._notify(record)
+        return record
+
+    def apply_row(self, row: Dict[str, Any]) -> DeviceRecord:
+        """Insert or replace a record from a sensor_devices row already written to the database"""
+        record = DeviceRecord.from_row(row)
+        existing = self._devices.get(record.device_id)
+        self._devices[record.device_id] = record
+        if existing is None or existing.last_seen != record.last_seen or existing.status != record.status:
+            self._notify(record)
+        return record
+
+    async def load(self):
+        """Load all devices from sensor_devices"""
+        devices = await run_query(supabase.table("sensor_devices").select("*"))
+        for row in devices.data:
+            existing = self._devices.get(row["device_id"])
+            # keep local heartbeats that have not been flushed yet
+            if existing is not None and existing.dirty:
+                continue
+            self.apply_row(row)
+        self.is_loaded = True
+        self._last_refresh = asyncio.get_running_loop().time()
+
+    async def flush(self):
+        """Write all dirty records to sensor_devices in one batched upsert"""
+        dirty = [record for record in self._devices.values() if record.dirty]
+        if not dirty:
+            return
+
+        rows = [record.to_update_row() for record in dirty]
+        for record in dirty:
+            record.dirty = False
+        try:
+            await run_query(supabase.table("sensor_devices").upsert(rows, on_conflict="device_id"))
+        except Exception:
+            # keep the records dirty so the next flush retries them
+            for record in dirty:
+                record.dirty = True
+            raise
+
+    async def start(self):
+        """Load the registry and start the background flusher"""
+        if self.is_running:
+            return
+
+        try:
+            await self.load()
+            print(f"✅ Device registry loaded {len(self._devices)} device(s)")
+        except Exception as e:
+            print(f"❌ Could not load device registry, will retry: {e}")
+
+        self.is_running = True
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and write any pending heartbeats"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Final device registry flush failed: {e}")
+        print("🛑 Device registry stopped")
+
+    async def _flush_loop(self):
+        """Flush dirty records and periodically refresh from the database"""
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+                if not self.is_loaded or loop.time() - self._last_refresh >= self.refresh_interval_seconds:
+                    await self.load()
+            except Exception as e:
+                print(f"❌ Device registry error: {e}")
+
+
+# Global device registry instance
+device_registry = DeviceRegistry(
+    flush_interval_seconds=settings.REGISTRY_FLUSH_INTERVAL_SECONDS,
+    refresh_interval_seconds=settings.REGISTRY_REFRESH_INTERVAL_SECONDS
+)
@@ -1,20 +1,59 @@
 import asyncio
+import heapq
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, List, Tuple
 
-from app.core.database import supabase
+from app.core.database import supabase, run_query
 from app.core.config import settings
 from app.models.sensor_device import DeviceStatus
+from app.services.device_registry import device_registry, DeviceRecord
+from app.services.event_bus import event_bus
 
 
 class DeviceScheduler:
-    """Background scheduler for device management tasks"""
+    """
+    Background scheduler for device management tasks.
+    Keeps each online device's expiry (last_seen + timeout) in a min-heap that is
+    refreshed on every heartbeat, sleeps until the earliest expiry and marks all
+    expired devices offline with one bulk update.
+    """
     
     def __init__(self, check_interval_minutes: int = 1, timeout_minutes: int = 1):
+        # check_interval_minutes is the longest the scheduler sleeps without a deadline due
         self.check_interval_minutes = check_interval_minutes
         self.timeout_minutes = timeout_minutes
         self.is_running = False
         self._task: Optional[asyncio.Task] = None
+        self._deadlines: List[Tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+    
+    @property
+    def timeout(self) -> timedelta:
+        return timedelta(minutes=self.timeout_minutes)
+    
+    def touch(self, record: DeviceRecord):
+        """Refresh a device's expiry after a heartbeat (registry listener)"""
+        if record.status != DeviceStatus.ONLINE.value or record.last_seen is None:
+            return
+        
+        deadline = record.last_seen + self.timeout
+        # older entries for this device are discarded lazily when they come due
+        heapq.heappush(self._deadlines, (deadline, record.device_id))
+        if self._deadlines[0][1] == record.device_id and self._deadlines[0][0] == deadline:
+            self._wakeup.set()
+        
+        # drop stale entries once the heap grows well past the fleet size
+        if len(self._deadlines) > 4 * max(len(device_registry.all()), 64):
+            self._rebuild_deadlines()
+    
+    def _rebuild_deadlines(self):
+        """Rebuild the heap with one entry per online device"""
+        self._deadlines = [
+            (record.last_seen + self.timeout, record.device_id)
+            for record in device_registry.all()
+            if record.status == DeviceStatus.ONLINE.value and record.last_seen is not None
+        ]
+        heapq.heapify(self._deadlines)
     
     async def start(self):
         """Start the background scheduler"""
@@ -22,8 +61,11 @@ class DeviceScheduler:
             return
         
         self.is_running = True
+        device_registry.add_listener(self.touch)
+        self._rebuild_deadlines()
         self._task = asyncio.create_task(self._scheduler_loop())
-        print(f"✅ Device scheduler started - checking every {self.check_interval_minutes} minute(s)")
+        print(f"✅ Device scheduler started - tracking {len(self._deadlines)} online device(s), "
+              f"timeout {self.timeout_minutes} minute(s)")
     
     async def stop(self):
         """Stop the background scheduler"""
@@ -37,107 +79,77 @@ class DeviceScheduler:
         print("🛑 Device scheduler stopped")
     
     async def _scheduler_loop(self):
-        """Main scheduler loop"""
+        """Main scheduler loop, wakes when the earliest device deadline passes"""
         while self.is_running:
             try:
                 await self._check_offline_devices()
-                # wait for next check
-                await asyncio.sleep(self.check_interval_minutes * 60)
+                
+                # sleep until the next deadline or until a heartbeat moves it earlier
+                sleep_seconds = self.check_interval_minutes * 60
+                if self._deadlines:
+                    until_next = (self._deadlines[0][0] - datetime.now()).total_seconds()
+                    sleep_seconds = max(0.0, min(sleep_seconds, until_next))
+                
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_seconds)
+                except asyncio.TimeoutError:
+                    pass
             except Exception as e:
                 print(f"❌ Scheduler error: {e}")
                 await asyncio.sleep(30)  # wait 30 seconds before retry
     
+    def _pop_expired(self, now: datetime) -> List[DeviceRecord]:
+        """Pop all due deadlines and return the devices that are really expired"""
+        expired = {}
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, device_id = heapq.heappop(self._deadlines)
+            record = device_registry.get(device_id)
+            # skip entries superseded by a later heartbeat or a status change
+            if record is None or record.status != DeviceStatus.ONLINE.value:
+                continue
+            if record.last_seen + self.timeout != deadline:
+                continue
+            expired[device_id] = record
+        return list(expired.values())
+    
     async def _check_offline_devices(self):
-        """Check for devices that should be marked offline"""
+        """Mark every device whose deadline has passed offline"""
+        now = datetime.now()
+        expired = self._pop_expired(now)
+        if not expired:
+            return
+        
+        for record in expired:
+            minutes_stale = (now - record.last_seen).total_seconds() / 60
+            print(f"⚠️  Device {record.device_id} ({record.name}) is STALE - no heartbeat for {minutes_stale:.1f} minutes")
+        
+        # one conditional bulk update; devices that heartbeated through
+        # another worker in the meantime are left untouched
+        cutoff_time = now - self.timeout
         try:
-            cutoff_time = datetime.now() - timedelta(minutes=self.timeout_minutes)
-            
-            # get all online devices
-            all_online = supabase.table("sensor_devices").select("*").eq("status", DeviceStatus.ONLINE.value).execute()
-            
-            print(f"📡 Scheduler: Checking {len(all_online.data)} online device(s) for stale activity")
-            
-            # log all online devices with their last seen times and remaining time before timeout
-            for device in all_online.data:
-                device_last_seen = device['last_seen']
-                try:
-                    if isinstance(device_last_seen, str):
-                        device_time = datetime.fromisoformat(device_last_seen.replace('Z', '+00:00'))
-                        device_time = device_time.replace(tzinfo=None)
-                    else:
-                        device_time = device_last_seen
-                    
-                    time_diff = datetime.now() - device_time
-                    minutes_ago = time_diff.total_seconds() / 60
-                    
-                    # calculate remaining time before timeout for this device
-                    remaining_minutes = self.timeout_minutes - minutes_ago
-                    
-                    if remaining_minutes > 0:
-                        print(f"🟢 Device {device['device_id']} ({device['name']}) - last seen {minutes_ago:.1f}min ago, {remaining_minutes:.1f}min until timeout")
-                    else:
-                        print(f"⚠️  Device {device['device_id']} ({device['name']}) - last seen {minutes_ago:.1f}min ago, OVERDUE by {abs(remaining_minutes):.1f}min")
-                    
-                except Exception as parse_error:
-                    print(f"❌ Could not parse timestamp for device {device['device_id']}: {parse_error}")
-            
-            # check for stale devices
-            stale_devices = []
-            for device in all_online.data:
-                device_last_seen = device['last_seen']
-                try:
-                    # parse the timestamp from database
-                    if isinstance(device_last_seen, str):
-                        # handle different timestamp formats from Supabase
-                        device_time = datetime.fromisoformat(device_last_seen.replace('Z', '+00:00'))
-                        device_time = device_time.replace(tzinfo=None)
-                    else:
-                        device_time = device_last_seen
-                    
-                    # calculate how long it's been stale
-                    time_diff = datetime.now() - device_time
-                    minutes_stale = time_diff.total_seconds() / 60
-                    
-                    # check if device is stale
-                    if device_time < cutoff_time:
-                        device['minutes_stale'] = minutes_stale
-                        stale_devices.append(device)
-                        print(f"⚠️  Device {device['device_id']} ({device['name']}) is STALE - no heartbeat for {minutes_stale:.1f} minutes")
-                
-                except Exception as parse_error:
-                    print(f"❌ Could not parse timestamp for device {device['device_id']}: {parse_error}")
-            
-            # log the number of stale devices
-            if len(stale_devices) > 0:
-                print(f"🔴 Found {len(stale_devices)} stale device(s) to mark offline")
-            
-            # mark the stale devices as offline
-            offline_count = 0
-            for device in stale_devices:
-                supabase.table("sensor_devices").update({
-                    "status": DeviceStatus.OFFLINE.value,
-                }).eq("device_id", device["device_id"]).execute()
-                
-                minutes_stale = device.get('minutes_stale', 0)
-                print(f"🔴 Device {device['device_id']} ({device['name']}) marked OFFLINE - was stale for {minutes_stale:.1f} minutes")
-                offline_count += 1
-            
-            # log the number of marked offline devices
-            if offline_count > 0:
-                print(f"📊 Scheduler: {offline_count} device(s) marked offline")
-            else:
-                if len(all_online.data) > 0:
-                    print(f"✅ Scheduler: All {len(all_online.data)} online device(s) are responding (timeout: {self.timeout_minutes}min)")
-                else:
-                    # Only log this periodically to avoid spam when no devices
-                    current_minute = datetime.now().minute
-                    if current_minute % 5 == 0:  # Log every 5 minutes
-                        print(f"📭 Scheduler: No online devices found (timeout: {self.timeout_minutes}min)")
-                    
-        except Exception as e:
-            print(f"❌ Error checking offline devices: {e}")
-            import traceback
-            traceback.print_exc()
+            response = await run_query(
+                supabase.table("sensor_devices")
+                .update({"status": DeviceStatus.OFFLINE.value})
+                .in_("device_id", [record.device_id for record in expired])
+                .lt("last_seen", cutoff_time.isoformat())
+            )
+        except Exception:
+            # put the deadlines back so the next check retries them
+            for record in expired:
+                heapq.heappush(self._deadlines, (record.last_seen + self.timeout, record.device_id))
+            raise
+        
+        marked = {row["device_id"] for row in response.data}
+        for record in expired:
+            if record.device_id in marked:
+                record.status = DeviceStatus.OFFLINE.value
+                event_bus.publish_device_status(record.device_id, record.name, record.status, record.last_seen)
+                print(f"🔴 Device {record.device_id} ({record.name}) marked OFFLINE")
+        
+        print(f"📊 Scheduler: {len(marked)} device(s) marked offline")
+        if len(marked) < len(expired):
+            print(f"🟢 Scheduler: {len(expired) - len(marked)} device(s) were seen by another worker, left online")
 
 
 # Global scheduler instance
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import socket
+from collections import deque
+from typing import Optional, Set, Tuple, Dict, Any, List
+
+from app.core.config import settings
+
+try:
+    from realtime import AsyncRealtimeClient
+except ImportError:
+    AsyncRealtimeClient = None
+
+RELAY_EVENT = "live_events"
+RELAY_RETRY_SECONDS = 5
+
+
+class Subscription:
+    """One live-feed subscriber with its own bounded queue and filters"""
+
+    __slots__ = ("queue", "device_ids", "sensor_names", "bbox", "dropped")
+
+    def __init__(self, max_queue: int, device_ids: Optional[Set[int]] = None, sensor_names: Optional[Set[str]] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.device_ids = device_ids
+        self.sensor_names = sensor_names
+        self.bbox = bbox
+        self.dropped = 0
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """device_ids filters device status events; sensor_names and bbox filter readings"""
+        if event["type"] == "device_status":
+            return not self.device_ids or event["device_id"] in self.device_ids
+
+        if self.sensor_names and event.get("sensor_name") not in self.sensor_names:
+            return False
+        if self.bbox:
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            return min_lon <= event["lon"] <= max_lon and min_lat <= event["lat"] <= max_lat
+        return True
+
+    def offer(self, event: Dict[str, Any]):
+        """Queue an event without blocking; a full queue drops its oldest event"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBus:
+    """
+    Fan-out of device status transitions and newly ingested readings to
+    live-feed subscribers (WebSocket / Server-Sent Events).
+    Publishing never waits on subscribers, so a slow client only loses its own oldest events.
+
+    Relay backends, so subscribers see events published by every API worker/replica:
+    - "supabase": batches of events are broadcast on a Supabase Realtime channel
+                  and delivered to the subscribers of every other instance.
+    - "none":     events stay in this process (the default); only correct with a single worker.
+    """
+
+    def __init__(self, subscriber_queue_size: int = 256, relay_backend: str = "none",
+                 relay_channel: str = "live_events", relay_interval_seconds: float = 0.25,
+                 relay_batch_size: int = 200):
+        self.subscriber_queue_size = subscriber_queue_size
+        self.relay_backend = relay_backend
+        self.relay_channel = relay_channel
+        self.relay_interval_seconds = relay_interval_seconds
+        self.relay_batch_size = relay_batch_size
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.relayed_count = 0
+        self.received_count = 0
+        self.relay_dropped = 0
+        self.is_running = False
+        self._subscriptions: List[Subscription] = []
+        # events waiting to be relayed; while the relay is down the oldest are dropped
+        self._outbox: deque = deque()
+        self._client = None
+        self._channel = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    @property
+    def relay_connected(self) -> bool:
+        return self._channel is not None and self._channel.is_joined
+
+    async def start(self):
+        """Start relaying events between instances"""
+        if self.is_running or self.relay_backend == "none":
+            return
+        if self.relay_backend != "supabase":
+            raise ValueError(f"Unknown live event relay backend: {self.relay_backend}")
+        if AsyncRealtimeClient is None or not settings.SUPABASE_URL:
+            print("⚠️  Live event relay unavailable, live feeds only carry this worker's events")
+            return
+
+        self.is_running = True
+        self._task = asyncio.create_task(self._relay_loop())
+        print(f"✅ Live event relay started (channel '{self.relay_channel}')")
+
+    async def stop(self):
+        """Send what is left in the outbox and leave the channel"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._client is not None:
+            try:
+                if self.relay_connected:
+                    await self._send_outbox()
+                await self._client.close()
+            except Exception as e:
+                print(f"❌ Error closing live event relay: {e}")
+            self._client = None
+            self._channel = None
+
+    async def _connect(self):
+        if self._client is not None:
+            await self._client.close()
+        self._client = AsyncRealtimeClient(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+        channel = self._client.channel(self.relay_channel)
+        channel.on_broadcast(RELAY_EVENT, self._on_relayed)
+        await channel.subscribe()
+        self._channel = channel
+
+    async def _relay_loop(self):
+        """Connect, then broadcast the outbox every relay_interval_seconds"""
+        while self.is_running:
+            try:
+                if self._channel is None:
+                    await self._connect()
+                await asyncio.sleep(self.relay_interval_seconds)
+                if self.relay_connected:
+                    await self._send_outbox()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error relaying live events: {e}")
+                await asyncio.sleep(RELAY_RETRY_SECONDS)
+
+    async def _send_outbox(self):
+        while self._outbox:
+            batch = [self._outbox.popleft() for _ in range(min(self.relay_batch_size, len(self._outbox)))]
+            await self._channel.send_broadcast(RELAY_EVENT, {"origin": self.instance_id, "events": batch})
+            self.relayed_count += len(batch)
+
+    def _on_relayed(self, message: Dict[str, Any]):
+        """Deliver a batch broadcast by another instance to local subscribers"""
+        payload = message.get("payload") or {}
+        if payload.get("origin") == self.instance_id:
+            return
+        events = payload.get("events") or []
+        self.received_count += len(events)
+        for event in events:
+            self._deliver(event)
+
+    def subscribe(self, device_ids: Optional[Set[int]] = None, sensor_names: Optional[Set[str]] = None,
+                  bbox: Optional[Tuple[float, float, float, float]] = None) -> Subscription:
+        subscription = Subscription(self.subscriber_queue_size, device_ids, sensor_names, bbox)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def _deliver(self, event: Dict[str, Any]):
+        for subscription in self._subscriptions:
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    def publish(self, event: Dict[str, Any]):
+        """Deliver an event to local subscribers and queue it for the other instances"""
+        self._deliver(event)
+        if self.is_running:
+            if len(self._outbox) >= self.relay_batch_size * 50:
+                self._outbox.popleft()
+                self.relay_dropped += 1
+            self._outbox.append(event)
+
+    def publish_device_status(self, device_id: int, name: str, status: str, last_seen):
+        """Publish a device online/offline transition"""
+        if not self._subscriptions and not self.is_running:
+            return
+        self.publish({
+            "type": "device_status",
+            "device_id": device_id,
+            "name": name,
+            "status": status,
+            "last_seen": last_seen.isoformat() if hasattr(last_seen, "isoformat") else last_seen
+        })
+
+    def publish_readings(self, records: List[Dict[str, Any]]):
+        """Publish newly ingested sensor_data rows"""
+        if not self._subscriptions and not self.is_running:
+            return
+        for record in records:
+            self.publish({"type": "reading", **record})
+
+
+# Global event bus instance
+event_bus = EventBus(
+    subscriber_queue_size=settings.LIVE_SUBSCRIBER_QUEUE_SIZE,
+    relay_backend=settings.LIVE_RELAY_BACKEND,
+    relay_channel=settings.LIVE_RELAY_CHANNEL
+)
@@ -0,0 +1,198 @@
+import asyncio
+import time
+from typing import Optional, List, Dict, Any, Callable
+
+from app.core.config import settings
+from app.core.database import run_blocking
+from app.services.sensor_data_store import insert_sensor_records
+from app.services.ingestion_spool import ingestion_spool
+
+
+class IngestionBuffer:
+    """Write-behind buffer that flushes sensor readings to Supabase in micro-batches"""
+
+    def __init__(self, max_depth: int = 10000, batch_size: int = 500, flush_interval_seconds: float = 1.0,
+                 latency_budget_seconds: float = 2.0, slow_cooldown_seconds: float = 30.0):
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.latency_budget_seconds = latency_budget_seconds
+        self.slow_cooldown_seconds = slow_cooldown_seconds
+        self.is_running = False
+        self.flushed_count = 0
+        self.spooled_count = 0
+        self._spool_until = 0.0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_depth)
+        self._in_flight: List[Dict[str, Any]] = []
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        """Number of readings waiting to be flushed"""
+        return self._queue.qsize()
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        Queue a prepared sensor_data row without waiting for the database.
+        Returns False when the buffer is full or not running, so the caller can apply backpressure.
+        """
+        if not self.is_running:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def add_listener(self, callback: Callable[[List[Dict[str, Any]]], None]):
+        """Call callback with readings once they are stored or spooled, never with dead-lettered ones"""
+        self._listeners.append(callback)
+
+    def publish_stored(self, records: List[Dict[str, Any]]):
+        """Hand readings that were stored or spooled to the listeners (also used by the bulk endpoint)"""
+        if not records:
+            return
+        for callback in self._listeners:
+            try:
+                callback(records)
+            except Exception as e:
+                print(f"❌ Ingestion listener error: {e}")
+
+    async def start(self):
+        """Start the background flusher"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        print(f"✅ Ingestion buffer started - flushing every {self.flush_interval_seconds}s or {self.batch_size} reading(s)")
+
+    async def stop(self, drain_timeout_seconds: float = 30):
+        """
+        Stop accepting readings and flush whatever is still queued.
+        Readings that could not be flushed before the timeout (or a cancelled
+        shutdown) are written to the spool, since they were already acknowledged.
+        """
+        if not self._task:
+            return
+
+        self.is_running = False
+        print(f"⏳ Draining ingestion buffer ({self.depth} reading(s) queued)...")
+        try:
+            await asyncio.wait_for(self._task, timeout=drain_timeout_seconds)
+        except asyncio.TimeoutError:
+            print("❌ Ingestion buffer drain timed out")
+            self._spool_unflushed()
+        except asyncio.CancelledError:
+            self._spool_unflushed()
+            raise
+        finally:
+            self._task = None
+        print("🛑 Ingestion buffer stopped")
+
+    def _spool_unflushed(self):
+        """
+        Synchronously spool the batch being flushed and everything still queued.
+        The interrupted batch may already be partly stored; spooling it again
+        risks a duplicate reading rather than losing an acknowledged one.
+        """
+        remaining = list(self._in_flight)
+        self._in_flight = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        if remaining:
+            ingestion_spool.append(remaining)
+            self.spooled_count += len(remaining)
+            self.publish_stored(remaining)
+            print(f"📦 Spooled {len(remaining)} unflushed reading(s) at shutdown")
+
+    async def _flush_loop(self):
+        """Main flush loop, keeps running until stopped and the queue is empty"""
+        while self.is_running or not self._queue.empty():
+            try:
+                batch = await self._next_batch()
+                if batch:
+                    self._in_flight = batch
+                    await self._flush(batch)
+                    self._in_flight = []
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ingestion buffer error: {e}")
+                await asyncio.sleep(1)
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """Collect readings until the batch is full or the flush interval elapses"""
+        loop = asyncio.get_running_loop()
+        try:
+            first = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval_seconds)
+        except asyncio.TimeoutError:
+            return []
+
+        batch = [first]
+        deadline = loop.time() + self.flush_interval_seconds
+        while len(batch) < self.batch_size:
+            # take everything already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            # when shutting down, flush immediately instead of waiting for more
+            remaining = deadline - loop.time()
+            if not self.is_running or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        """
+        Write one micro-batch to the sensor_data table.
+        Batches go to the local spool instead when the insert fails transiently, when
+        older readings are still spooled (to keep order), or while the database is slow.
+        Rows the database refuses outright are dead-lettered rather than retried.
+        Listeners only see the stored and spooled readings.
+        """
+        if ingestion_spool.depth > 0 or time.monotonic() < self._spool_until:
+            await run_blocking(ingestion_spool.append, batch)
+            self.spooled_count += len(batch)
+            self.publish_stored(batch)
+            return
+
+        started = time.monotonic()
+        # stop at the first transient failure so later readings are not stored ahead of the spooled ones
+        results = await run_blocking(insert_sensor_records, batch, self.batch_size, True)
+        elapsed = time.monotonic() - started
+
+        for chunk in results:
+            count = chunk["end"] - chunk["start"]
+            rows = batch[chunk["start"]:chunk["end"]]
+            if chunk["ok"]:
+                self.flushed_count += count
+                self.publish_stored(rows)
+            elif chunk["permanent"]:
+                await run_blocking(ingestion_spool.dead_letter, rows, chunk["error"])
+            else:
+                print(f"❌ Insert failed, spooling {count} reading(s): {chunk['error']}")
+                await run_blocking(ingestion_spool.append, rows)
+                self.spooled_count += count
+                self.publish_stored(rows)
+
+        if elapsed > self.latency_budget_seconds:
+            self._spool_until = time.monotonic() + self.slow_cooldown_seconds
+            print(f"🐢 Insert took {elapsed:.1f}s (budget {self.latency_budget_seconds}s), "
+                  f"spooling for the next {self.slow_cooldown_seconds:.0f}s")
+
+        print(f"📥 Ingestion buffer flushed {len(batch)} reading(s), {self.depth} still queued")
+
+
+# Global ingestion buffer instance
+ingestion_buffer = IngestionBuffer(
+    max_depth=settings.INGEST_QUEUE_MAX_DEPTH,
+    batch_size=settings.INGEST_INSERT_CHUNK_SIZE,
+    flush_interval_seconds=settings.INGEST_FLUSH_INTERVAL_SECONDS,
+    latency_budget_seconds=settings.INGEST_LATENCY_BUDGET_SECONDS,
+    slow_cooldown_seconds=settings.INGEST_SLOW_COOLDOWN_SECONDS
+)
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+from app.core.config import settings
+from app.core.database import run_blocking
+from app.services.sensor_data_store import insert_sensor_records
+
+
+class IngestionSpool:
+    """
+    Durable append-only spool (SQLite) for readings that could not be written to Supabase.
+    A background replayer drains it oldest-first with bulk inserts once the database recovers.
+    Rows the database refuses outright (constraint or type errors) are moved to a
+    dead_letter table in the same file, so they never block the head of the spool.
+    Writes are blocking and thread-safe; call them through run_blocking from async code.
+
+    Several worker processes can share one spool file. Only one of them replays
+    at a time: a replayer claims the head batch (claim column) in one write
+    transaction, and nobody else claims rows while an unexpired claim exists.
+    Counts are re-read from the file, so they include other workers' rows.
+    """
+
+    def __init__(self, path: str, replay_batch_size: int = 500, replay_interval_seconds: float = 5.0,
+                 max_backoff_seconds: float = 300.0, claim_ttl_seconds: float = 300.0):
+        self.path = path
+        self.replay_batch_size = replay_batch_size
+        self.replay_interval_seconds = replay_interval_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        # a claim older than this belongs to a replayer that died mid-batch
+        self.claim_ttl_seconds = claim_ttl_seconds
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_running = False
+        self.replayed_count = 0
+        self.last_error: Optional[str] = None
+        self._depth = 0
+        self._dead_letter_count = 0
+        self._oldest_spooled_at: Optional[float] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        """Number of readings waiting in the spool"""
+        return self._depth
+
+    @property
+    def replay_lag_seconds(self) -> float:
+        """Age of the oldest spooled reading, 0 when the spool is empty"""
+        if self._depth == 0 or self._oldest_spooled_at is None:
+            return 0.0
+        return round(time.time() - self._oldest_spooled_at, 1)
+
+    @property
+    def dead_letter_count(self) -> int:
+        """Number of readings the database refused, kept for inspection"""
+        return self._dead_letter_count
+
+    def open(self):
+        """Open (or create) the spool database"""
+        with self._lock:
+            if self._conn:
+                return
+
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " spooled_at REAL NOT NULL,"
+                " claim TEXT,"
+                " claimed_at REAL)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(spool)")}
+            if "claim" not in columns:
+                # spool files from before claims
+                self._conn.execute("ALTER TABLE spool ADD COLUMN claim TEXT")
+                self._conn.execute("ALTER TABLE spool ADD COLUMN claimed_at REAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " error TEXT,"
+                " failed_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._refresh_counts()
+            if self._depth:
+                print(f"📦 Ingestion spool has {self._depth} reading(s) left from a previous run")
+            if self._dead_letter_count:
+                print(f"⚠️  Ingestion spool has {self._dead_letter_count} dead-lettered reading(s)")
+
+    def _refresh_counts(self):
+        """Re-read the depth, dead letter count and head spool time, which other workers change too"""
+        with self._lock:
+            self._depth = self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+            self._dead_letter_count = self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+            row = self._conn.execute("SELECT spooled_at FROM spool ORDER BY seq LIMIT 1").fetchone()
+            self._oldest_spooled_at = row[0] if row else None
+
+    def close(self):
+        """Close the spool database"""
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def append(self, records: List[Dict[str, Any]]):
+        """Durably append prepared sensor_data rows to the end of the spool"""
+        if not records:
+            return
+
+        now = time.time()
+        with self._lock:
+            self.open()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO spool (payload, spooled_at) VALUES (?, ?)",
+                    [(json.dumps(record), now) for record in records]
+                )
+            if self._depth == 0:
+                self._oldest_spooled_at = now
+            self._depth += len(records)
+        print(f"📦 Spooled {len(records)} reading(s), spool depth {self._depth}")
+
+    def dead_letter(self, records: List[Dict[str, Any]], error: Optional[str]):
+        """Durably keep rows the database refused, with the error, instead of retrying them"""
+        if not records:
+            return
+
+        now = time.time()
+        with self._lock:
+            self.open()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO dead_letter (payload, error, failed_at) VALUES (?, ?, ?)",
+                    [(json.dumps(record), error, now) for record in records]
+                )
+            self._dead_letter_count += len(records)
+        print(f"☠️  Dead-lettered {len(records)} reading(s) the database refused: {error}")
+
+    def _claim_oldest(self) -> Tuple[List[int], List[Dict[str, Any]]]:
+        """
+        Claim the oldest batch for this process and return its seqs and records.
+        Returns nothing while another worker holds an unexpired claim.
+        """
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                rows = self._conn.execute(
+                    "UPDATE spool SET claim = ?, claimed_at = ?"
+                    " WHERE seq IN (SELECT seq FROM spool ORDER BY seq LIMIT ?)"
+                    " AND NOT EXISTS (SELECT 1 FROM spool WHERE claim IS NOT NULL AND claim != ? AND claimed_at > ?)"
+                    " RETURNING seq, payload",
+                    (self.instance_id, now, self.replay_batch_size, self.instance_id, now - self.claim_ttl_seconds)
+                ).fetchall()
+        rows.sort()
+        return [seq for seq, _ in rows], [json.loads(payload) for _, payload in rows]
+
+    def _release(self, seqs: List[int]):
+        """Give up the claim on rows that failed, so they are retried first"""
+        if not seqs:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("UPDATE spool SET claim = NULL, claimed_at = NULL WHERE seq = ? AND claim = ?",
+                                       [(seq, self.instance_id) for seq in seqs])
+
+    def _delete(self, seqs: List[int]):
+        """Remove replayed or dead-lettered records from the spool"""
+        if not seqs:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("DELETE FROM spool WHERE seq = ?", [(seq,) for seq in seqs])
+            self._refresh_counts()
+
+    async def start(self):
+        """Open the spool and start the background replayer"""
+        if self.is_running:
+            return
+
+        self.open()
+        self.is_running = True
+        self._task = asyncio.create_task(self._replay_loop())
+        print(f"✅ Ingestion spool replayer started - spool at {self.path}")
+
+    async def stop(self):
+        """Stop the replayer; spooled readings stay on disk for the next start"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.close()
+        print("🛑 Ingestion spool replayer stopped")
+
+    async def _replay_loop(self):
+        """
+        Drain the spool in order, backing off while the database is unavailable.
+        Inserted and permanently refused rows leave the spool. The first transient
+        failure stops the batch, and it and every row after it stay at the head.
+        """
+        backoff = self.replay_interval_seconds
+        while self.is_running:
+            try:
+                await run_blocking(self._refresh_counts)
+                if self._depth == 0:
+                    await asyncio.sleep(self.replay_interval_seconds)
+                    continue
+
+                seqs, records = await run_blocking(self._claim_oldest)
+                if not records:
+                    # another worker is replaying
+                    await asyncio.sleep(self.replay_interval_seconds)
+                    continue
+
+                done = []
+                try:
+                    results = await run_blocking(insert_sensor_records, records, len(records), True)
+                    for chunk in results:
+                        if chunk["ok"]:
+                            self.replayed_count += chunk["end"] - chunk["start"]
+                        elif chunk["permanent"]:
+                            await run_blocking(self.dead_letter, records[chunk["start"]:chunk["end"]], chunk["error"])
+                        else:
+                            break
+                        done.extend(seqs[chunk["start"]:chunk["end"]])
+                finally:
+                    await run_blocking(self._delete, done)
+                    await run_blocking(self._release, seqs[len(done):])
+
+                transient = [chunk for chunk in results if not chunk["ok"] and not chunk["permanent"]]
+                if not transient:
+                    self.last_error = None
+                    backoff = self.replay_interval_seconds
+                    print(f"♻️  Replayed {len(records)} spooled reading(s), {self._depth} left")
+                    continue
+
+                self.last_error = transient[0]["error"]
+            except Exception as e:
+                self.last_error = str(e)
+
+            print(f"❌ Spool replay failed, retrying in {backoff:.0f}s: {self.last_error}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff_seconds)
+
+
+# Global ingestion spool instance
+ingestion_spool = IngestionSpool(
+    path=settings.INGEST_SPOOL_PATH,
+    replay_batch_size=settings.INGEST_INSERT_CHUNK_SIZE,
+    replay_interval_seconds=settings.INGEST_SPOOL_REPLAY_INTERVAL_SECONDS
+)
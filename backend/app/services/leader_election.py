@@ -0,0 +1,176 @@
+import asyncio
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Optional, List, Callable, Awaitable
+
+from app.core.config import settings
+from app.core.database import supabase, run_query
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LeaderElector:
+    """
+    Elects one leader among all API workers/replicas so singleton background
+    tasks (the device scheduler) run exactly once.
+
+    Backends:
+    - "file":  exclusive lock on a local file, for several workers on one host.
+               The OS drops the lock when the leader dies.
+    - "lease": lease row in the scheduler_leases table (sql/scheduler_lease.sql),
+               for replicas on several hosts. Expires if not renewed within the TTL.
+    - "none":  this instance is always the leader.
+    """
+
+    def __init__(self, backend: str = "file", lock_path: str = "scheduler.lock", lease_name: str = "device_scheduler",
+                 lease_ttl_seconds: float = 15.0, renew_interval_seconds: float = 5.0):
+        self.backend = backend
+        self.lock_path = lock_path
+        self.lease_name = lease_name
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.renew_interval_seconds = renew_interval_seconds
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.leader_id: Optional[str] = None
+        self._lock_file = None
+        self._lease_renewed_at = 0.0
+        self._on_elected: List[Callable[[], Awaitable[None]]] = []
+        self._on_demoted: List[Callable[[], Awaitable[None]]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def on_elected(self, callback: Callable[[], Awaitable[None]]):
+        """Register a coroutine function to run when this instance becomes leader"""
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: Callable[[], Awaitable[None]]):
+        """Register a coroutine function to run when this instance stops being leader"""
+        self._on_demoted.append(callback)
+
+    async def start(self):
+        """Try to become leader now and keep campaigning in the background"""
+        if self._task:
+            return
+
+        await self._campaign()
+        self._task = asyncio.create_task(self._election_loop())
+        print(f"✅ Leader election started ({self.backend}) - instance {self.instance_id} "
+              f"is {'LEADER' if self.is_leader else 'follower'}")
+
+    async def stop(self):
+        """Stop campaigning and give up leadership"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader:
+            await self._set_leader(False)
+        try:
+            await self._release()
+        except Exception as e:
+            print(f"❌ Could not release leadership: {e}")
+
+    async def _election_loop(self):
+        while True:
+            await asyncio.sleep(self.renew_interval_seconds)
+            await self._campaign()
+
+    async def _campaign(self):
+        """Acquire or renew leadership and run callbacks on transitions"""
+        try:
+            acquired = await self._try_acquire()
+        except Exception as e:
+            print(f"❌ Leader election error: {e}")
+            # a leader keeps its role until its lease could have expired
+            acquired = self.is_leader and time.monotonic() - self._lease_renewed_at < self.lease_ttl_seconds
+
+        if acquired != self.is_leader:
+            await self._set_leader(acquired)
+
+    async def _set_leader(self, is_leader: bool):
+        self.is_leader = is_leader
+        if is_leader:
+            self.leader_id = self.instance_id
+        print(f"👑 Instance {self.instance_id} {'became LEADER' if is_leader else 'is no longer leader'}")
+        for callback in (self._on_elected if is_leader else self._on_demoted):
+            try:
+                await callback()
+            except Exception as e:
+                print(f"❌ Leader transition callback failed: {e}")
+
+    async def _try_acquire(self) -> bool:
+        if self.backend == "none":
+            self.leader_id = self.instance_id
+            return True
+        if self.backend == "lease":
+            return await self._try_acquire_lease()
+        return self._try_acquire_file_lock()
+
+    async def _release(self):
+        if self.backend == "lease":
+            await run_query(supabase.rpc("release_scheduler_lease", {
+                "p_name": self.lease_name,
+                "p_holder": self.instance_id
+            }))
+        elif self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _try_acquire_file_lock(self) -> bool:
+        """Take (or keep) an exclusive non-blocking lock on lock_path"""
+        if self._lock_file is not None:
+            return True
+
+        Path(self.lock_path).parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            # someone else holds the lock - read who, for /health
+            lock_file.seek(0)
+            self.leader_id = lock_file.read().strip() or None
+            lock_file.close()
+            return False
+
+        # record the leader's identity in the lock file
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(self.instance_id)
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    async def _try_acquire_lease(self) -> bool:
+        """Acquire or renew the lease row; returns True if this instance holds it"""
+        response = await run_query(supabase.rpc("acquire_scheduler_lease", {
+            "p_name": self.lease_name,
+            "p_holder": self.instance_id,
+            "p_ttl_seconds": self.lease_ttl_seconds
+        }))
+        self.leader_id = response.data
+        if self.leader_id == self.instance_id:
+            self._lease_renewed_at = time.monotonic()
+            return True
+        return False
+
+
+# Global leader elector instance
+leader_elector = LeaderElector(
+    backend=settings.LEADER_ELECTION_BACKEND,
+    lock_path=settings.LEADER_LOCK_PATH,
+    lease_ttl_seconds=settings.LEADER_LEASE_TTL_SECONDS,
+    renew_interval_seconds=settings.LEADER_RENEW_INTERVAL_SECONDS
+)
@@ -0,0 +1,439 @@
+import asyncio
+import base64
+import math
+import struct
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, List, Any, Iterable, Tuple, Set
+
+from app.core.config import settings
+from app.core.database import supabase, run_query
+from app.services.device_registry import parse_timestamp, to_timestamptz
+from app.services.leader_election import leader_elector
+
+SKETCH_FORMAT_VERSION = 1
+# version, relative accuracy, sum, min, max
+SKETCH_HEADER = "<Bdddd"
+# lux below this goes to the zero bucket (a dark or covered sensor)
+MIN_INDEXABLE_LUX = 1e-3
+QUERY_PAGE_SIZE = 1000
+SKETCH_DIMENSIONS = ("city", "barangay", "segment")
+CITY_KEY = "all"
+# instance_id of the rows old nights are compacted into
+COMPACTED_INSTANCE_ID = "compacted"
+
+SketchKey = Tuple[str, str, date]
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class DDSketch:
+    """
+    Mergeable quantile sketch (DDSketch) with relative error guarantees.
+    A value x goes to bucket ceil(log_gamma(x)) with gamma = (1 + a) / (1 - a),
+    so every quantile is returned within a relative error a of the true value.
+    Merging adds bucket counts, so sketches from several workers or nights
+    combine exactly. When there are more than max_bins buckets the lowest are
+    collapsed together, which only affects the darkest quantiles.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "gamma", "_log_gamma", "bins", "zero_count",
+                 "count", "sum", "min", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value < MIN_INDEXABLE_LUX:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        """Fold the lowest buckets together until there are max_bins left"""
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        target = keys[excess]
+        for key in keys[:excess]:
+            self.bins[target] += self.bins.pop(key)
+
+    def merge(self, other: "DDSketch"):
+        """Add another sketch with the same relative accuracy"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+
+    def _value(self, key: int) -> float:
+        """Representative value of a bucket, within relative_accuracy of anything in it"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile (0 <= q <= 1), None for an empty sketch"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return min(max(self._value(key), self.min), self.max)
+        return self.max
+
+    def histogram(self, edges: List[float]) -> Tuple[int, List[int]]:
+        """
+        Approximate counts in [edges[i], edges[i + 1]); the last bucket is open-ended.
+        Returns (count below edges[0], counts), so values under the first edge are
+        reported on their own instead of inflating the first bucket.
+        """
+        below = 0
+        counts = [0] * len(edges)
+
+        def add(value, count):
+            nonlocal below
+            position = bisect_right(edges, value) - 1
+            if position < 0:
+                below += count
+            else:
+                counts[position] += count
+
+        if self.zero_count:
+            add(0.0, self.zero_count)
+        for key, count in self.bins.items():
+            add(self._value(key), count)
+        return below, counts
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary form: a fixed header, then the sorted bucket keys as
+        varint deltas (the first zigzag-encoded) each followed by its count.
+        """
+        out = bytearray(struct.pack(SKETCH_HEADER, SKETCH_FORMAT_VERSION, self.relative_accuracy, self.sum,
+                                    self.min if self.count else 0.0, self.max if self.count else 0.0))
+        _write_varint(out, self.zero_count)
+        _write_varint(out, len(self.bins))
+        previous = None
+        for key in sorted(self.bins):
+            if previous is None:
+                _write_varint(out, (key << 1) ^ (key >> 63))
+            else:
+                _write_varint(out, key - previous)
+            _write_varint(out, self.bins[key])
+            previous = key
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = 2048) -> "DDSketch":
+        version, relative_accuracy, total, minimum, maximum = struct.unpack_from(SKETCH_HEADER, data)
+        if version != SKETCH_FORMAT_VERSION:
+            raise ValueError(f"Unsupported sketch format {version}")
+        sketch = cls(relative_accuracy, max_bins)
+        pos = struct.calcsize(SKETCH_HEADER)
+        sketch.zero_count, pos = _read_varint(data, pos)
+        num_bins, pos = _read_varint(data, pos)
+        key = 0
+        for i in range(num_bins):
+            value, pos = _read_varint(data, pos)
+            key = ((value >> 1) ^ -(value & 1)) if i == 0 else key + value
+            sketch.bins[key], pos = _read_varint(data, pos)
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        sketch.sum = total
+        if sketch.count:
+            sketch.min, sketch.max = minimum, maximum
+        return sketch
+
+    def to_text(self) -> str:
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_text(cls, text: str, max_bins: int = 2048) -> "DDSketch":
+        return cls.from_bytes(base64.b64decode(text), max_bins)
+
+
+def night_of(timestamp: datetime) -> date:
+    """The night a reading belongs to: readings before noon count toward the previous evening"""
+    return (timestamp - timedelta(hours=12)).date()
+
+
+class LuxSketchStore:
+    """
+    Lux sketches per night for the whole city, each barangay and each street
+    segment, updated as readings are ingested.
+    Every worker keeps its own sketches and upserts the changed ones, as
+    compact base64 DDSketches, under its instance_id into the lux_sketches
+    table (sql/lux_sketches.sql). Queries merge the rows of every instance
+    and night in the requested window. Before a worker first writes a key it
+    merges in its own stored row, so a restarted worker with the same
+    instance_id adds to its earlier sketches instead of replacing them.
+    Instance ids change with every restart, so the leader periodically merges
+    all rows of nights older than compact_after_nights into one row per
+    (dimension, key, night) under COMPACTED_INSTANCE_ID.
+    """
+
+    def __init__(self, instance_id: str, relative_accuracy: float = 0.01, max_bins: int = 2048,
+                 flush_interval_seconds: float = 30.0, memory_nights: int = 2,
+                 compact_after_nights: int = 7, compact_interval_seconds: float = 3600.0):
+        self.instance_id = instance_id
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.flush_interval_seconds = flush_interval_seconds
+        self.memory_nights = memory_nights
+        # never compact nights a worker may still hold in memory
+        self.compact_after_nights = max(compact_after_nights, memory_nights + 1)
+        self.compact_interval_seconds = compact_interval_seconds
+        self.compacted_count = 0
+        self._compacted_at = 0.0
+        self.is_running = False
+        self._sketches: Dict[SketchKey, DDSketch] = {}
+        self._dirty: Set[SketchKey] = set()
+        self._loaded: Set[SketchKey] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def sketch_count(self) -> int:
+        return len(self._sketches)
+
+    @property
+    def pending_count(self) -> int:
+        """Sketches changed since the last flush"""
+        return len(self._dirty)
+
+    def new_sketch(self) -> DDSketch:
+        return DDSketch(self.relative_accuracy, self.max_bins)
+
+    def _add(self, key: SketchKey, lux: float):
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = self.new_sketch()
+        sketch.add(lux)
+        self._dirty.add(key)
+
+    def add_readings(self, records: Iterable[Dict[str, Any]]):
+        """Fold prepared sensor_data rows into their city, barangay and segment sketches"""
+        for record in records:
+            lux = record["lux"]
+            night = night_of(parse_timestamp(record["timestamp"]))
+            self._add(("city", CITY_KEY, night), lux)
+            if record.get("barangay"):
+                self._add(("barangay", record["barangay"], night), lux)
+            if record.get("segment_id") is not None:
+                self._add(("segment", str(record["segment_id"]), night), lux)
+
+    async def _fetch_sketches(self, instance_id: str, keys: Iterable[SketchKey]) -> Dict[SketchKey, DDSketch]:
+        """Stored sketches of one instance for keys"""
+        groups: Dict[Tuple[str, date], List[str]] = {}
+        for dimension, key, night in keys:
+            groups.setdefault((dimension, night), []).append(key)
+        sketches = {}
+        for (dimension, night), names in groups.items():
+            response = await run_query(
+                supabase.table("lux_sketches").select("key, sketch").eq("instance_id", instance_id)
+                .eq("dimension", dimension).eq("night", night.isoformat()).in_("key", names)
+            )
+            for row in response.data:
+                sketches[(dimension, row["key"], night)] = DDSketch.from_text(row["sketch"], self.max_bins)
+        return sketches
+
+    async def _load_own(self, keys: Set[SketchKey]):
+        """Merge this instance's stored rows for keys into memory"""
+        for sketch_key, sketch in (await self._fetch_sketches(self.instance_id, keys)).items():
+            self._sketches[sketch_key].merge(sketch)
+        self._loaded.update(keys)
+
+    async def flush(self):
+        """Upsert the changed sketches, then drop old nights from memory"""
+        if self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            try:
+                unloaded = dirty - self._loaded
+                if unloaded:
+                    await self._load_own(unloaded)
+                rows = [{
+                    "instance_id": self.instance_id,
+                    "dimension": dimension,
+                    "key": key,
+                    "night": night.isoformat(),
+                    "sketch": self._sketches[(dimension, key, night)].to_text(),
+                    "reading_count": self._sketches[(dimension, key, night)].count,
+                    "updated_at": to_timestamptz(datetime.now())
+                } for dimension, key, night in dirty]
+                await run_query(supabase.table("lux_sketches").upsert(
+                    rows, on_conflict="dimension,key,night,instance_id"))
+            except Exception:
+                self._dirty |= dirty
+                raise
+
+        oldest = night_of(datetime.now()) - timedelta(days=self.memory_nights)
+        for key in [k for k in self._sketches if k[2] < oldest and k not in self._dirty]:
+            del self._sketches[key]
+            self._loaded.discard(key)
+
+    async def compact(self):
+        """
+        Merge the per-instance rows of nights older than compact_after_nights into
+        one COMPACTED_INSTANCE_ID row per (dimension, key, night). Each page is
+        swapped in one transaction (compact_lux_sketches), which fails if a source
+        row changed after it was read, so no reading is counted twice or lost.
+        """
+        cutoff = night_of(datetime.now()) - timedelta(days=self.compact_after_nights)
+        while True:
+            response = await run_query(
+                supabase.table("lux_sketches").select("dimension, key, night, instance_id, sketch, updated_at")
+                .lt("night", cutoff.isoformat()).neq("instance_id", COMPACTED_INSTANCE_ID)
+                .order("night").order("dimension").order("key").limit(QUERY_PAGE_SIZE)
+            )
+            if not response.data:
+                return
+
+            groups: Dict[SketchKey, DDSketch] = {}
+            for row in response.data:
+                sketch_key = (row["dimension"], row["key"], date.fromisoformat(row["night"]))
+                if sketch_key not in groups:
+                    groups[sketch_key] = self.new_sketch()
+                groups[sketch_key].merge(DDSketch.from_text(row["sketch"], self.max_bins))
+            for sketch_key, sketch in (await self._fetch_sketches(COMPACTED_INSTANCE_ID, groups)).items():
+                groups[sketch_key].merge(sketch)
+
+            await run_query(supabase.rpc("compact_lux_sketches", {
+                "p_compacted": [{
+                    "dimension": dimension,
+                    "key": key,
+                    "night": night.isoformat(),
+                    "sketch": sketch.to_text(),
+                    "reading_count": sketch.count
+                } for (dimension, key, night), sketch in groups.items()],
+                "p_sources": [{
+                    "dimension": row["dimension"],
+                    "key": row["key"],
+                    "night": row["night"],
+                    "instance_id": row["instance_id"],
+                    "updated_at": row["updated_at"]
+                } for row in response.data]
+            }))
+            self.compacted_count += len(response.data)
+            print(f"🗜️  Compacted {len(response.data)} lux sketch row(s) into {len(groups)}")
+            if len(response.data) < QUERY_PAGE_SIZE:
+                return
+
+    async def query(self, dimension: str, key: str, start: date, end: date) -> DDSketch:
+        """Merged sketch of one city/barangay/segment key over the nights start..end (inclusive)"""
+        merged = self.new_sketch()
+        offset = 0
+        while True:
+            response = await run_query(
+                supabase.table("lux_sketches").select("instance_id, night, sketch")
+                .eq("dimension", dimension).eq("key", key)
+                .gte("night", start.isoformat()).lte("night", end.isoformat())
+                .order("night").order("instance_id").range(offset, offset + QUERY_PAGE_SIZE - 1)
+            )
+            for row in response.data:
+                sketch_key = (dimension, key, date.fromisoformat(row["night"]))
+                # memory already holds this instance's stored row once it has been loaded
+                if row["instance_id"] == self.instance_id and sketch_key in self._loaded and sketch_key in self._sketches:
+                    continue
+                merged.merge(DDSketch.from_text(row["sketch"], self.max_bins))
+            if len(response.data) < QUERY_PAGE_SIZE:
+                break
+            offset += QUERY_PAGE_SIZE
+
+        for (sketch_dimension, sketch_key, night), sketch in self._sketches.items():
+            if sketch_dimension == dimension and sketch_key == key and start <= night <= end:
+                merged.merge(sketch)
+        return merged
+
+    async def start(self):
+        """Start the background flusher"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        print(f"✅ Lux sketches started (instance {self.instance_id}, "
+              f"{self.relative_accuracy:.0%} relative accuracy)")
+
+    async def stop(self):
+        """Stop the flusher and write any pending sketches"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Final lux sketch flush failed: {e}")
+        print("🛑 Lux sketches stopped")
+
+    async def _flush_loop(self):
+        """Periodically persist changed sketches; the leader also compacts old nights"""
+        while self.is_running:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+                if leader_elector.is_leader and time.monotonic() - self._compacted_at >= self.compact_interval_seconds:
+                    self._compacted_at = time.monotonic()
+                    await self.compact()
+            except Exception as e:
+                print(f"❌ Lux sketch error: {e}")
+
+
+# Global lux sketch store instance
+lux_sketches = LuxSketchStore(
+    instance_id=leader_elector.instance_id,
+    relative_accuracy=settings.SKETCH_RELATIVE_ACCURACY,
+    max_bins=settings.SKETCH_MAX_BINS,
+    flush_interval_seconds=settings.SKETCH_FLUSH_INTERVAL_SECONDS,
+    memory_nights=settings.SKETCH_MEMORY_NIGHTS,
+    compact_after_nights=settings.SKETCH_COMPACT_AFTER_NIGHTS,
+    compact_interval_seconds=settings.SKETCH_COMPACT_INTERVAL_SECONDS
+)
@@ -0,0 +1,319 @@
+import asyncio
+import math
+from typing import Optional, Dict, List, Any, Iterable
+
+from app.core.config import settings
+from app.core.database import supabase, run_query
+from app.geo.snapping import get_road_snapper
+
+LOAD_PAGE_SIZE = 1000
+# lux classes of the illumination maps (test/geoprocessing/exp_folium.py)
+POORLY_LIT_LUX = 10.0
+WELL_LIT_LUX = 20.0
+
+
+class SegmentRollup:
+    """
+    Illumination statistics of one street segment.
+    Coverage splits the segment into bins of COVERAGE_BIN_METERS along its
+    length; covered is a bitmask of the bins with at least one reading.
+    """
+
+    __slots__ = ("segment_id", "street_id", "barangay_id", "count", "lux_sum", "min_lux",
+                 "under_10", "under_20", "bins", "covered")
+
+    def __init__(self, segment_id: int, street_id: Optional[int], barangay_id: Optional[int], bins: int,
+                 count: int = 0, lux_sum: float = 0.0, min_lux: Optional[float] = None,
+                 under_10: int = 0, under_20: int = 0, covered: int = 0):
+        self.segment_id = segment_id
+        self.street_id = street_id
+        self.barangay_id = barangay_id
+        self.bins = bins
+        self.count = count
+        self.lux_sum = lux_sum
+        self.min_lux = min_lux
+        self.under_10 = under_10
+        self.under_20 = under_20
+        self.covered = covered
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "SegmentRollup":
+        """Build from a segment_rollups row; covered_bits is a bit string, bin 0 first"""
+        bits = row.get("covered_bits") or ""
+        return cls(
+            segment_id=row["segment_id"],
+            street_id=row.get("street_id"),
+            barangay_id=row.get("barangay_id"),
+            bins=row["coverage_bins"],
+            count=row["reading_count"],
+            lux_sum=row["lux_sum"],
+            min_lux=row["min_lux"],
+            under_10=row["under_10_count"],
+            under_20=row["under_20_count"],
+            covered=int(bits[::-1], 2) if bits else 0
+        )
+
+    @property
+    def mean_lux(self) -> float:
+        return self.lux_sum / self.count if self.count else 0.0
+
+    @property
+    def covered_bins(self) -> int:
+        return self.covered.bit_count()
+
+    @property
+    def coverage(self) -> float:
+        """Fraction of the segment's length with readings"""
+        return self.covered_bins / self.bins if self.bins else 0.0
+
+    def add(self, lux: float, offset_m: Optional[float]):
+        """Fold one reading in at offset_m meters along the segment"""
+        self.count += 1
+        self.lux_sum += lux
+        if self.min_lux is None or lux < self.min_lux:
+            self.min_lux = lux
+        if lux < POORLY_LIT_LUX:
+            self.under_10 += 1
+        if lux < WELL_LIT_LUX:
+            self.under_20 += 1
+        if offset_m is not None and self.bins:
+            self.covered |= 1 << min(max(int(offset_m // settings.COVERAGE_BIN_METERS), 0), self.bins - 1)
+
+    def merge(self, other: "SegmentRollup"):
+        """Fold another rollup of the same segment in"""
+        self.count += other.count
+        self.lux_sum += other.lux_sum
+        if other.min_lux is not None and (self.min_lux is None or other.min_lux < self.min_lux):
+            self.min_lux = other.min_lux
+        self.under_10 += other.under_10
+        self.under_20 += other.under_20
+        if other.bins == self.bins:
+            self.covered |= other.covered
+        else:
+            # the segment was rebuilt with a new length; its coverage starts over
+            self.bins, self.covered = other.bins, other.covered
+
+    def copy(self) -> "SegmentRollup":
+        return SegmentRollup(self.segment_id, self.street_id, self.barangay_id, self.bins, self.count,
+                             self.lux_sum, self.min_lux, self.under_10, self.under_20, self.covered)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Rollup as returned by the segment illumination endpoints"""
+        return {
+            "segment_id": self.segment_id,
+            "street_id": self.street_id,
+            "barangay_id": self.barangay_id,
+            "count": self.count,
+            "mean_lux": round(self.mean_lux, 2),
+            "min_lux": self.min_lux,
+            "coverage": round(self.coverage, 4),
+            "share_under_10_lux": round(self.under_10 / self.count, 4) if self.count else None,
+            "share_under_20_lux": round(self.under_20 / self.count, 4) if self.count else None
+        }
+
+    def to_merge_row(self) -> Dict[str, Any]:
+        """Delta sent to merge_segment_rollups"""
+        return {
+            "segment_id": self.segment_id,
+            "street_id": self.street_id,
+            "barangay_id": self.barangay_id,
+            "coverage_bins": self.bins,
+            "reading_count": self.count,
+            "lux_sum": self.lux_sum,
+            "min_lux": self.min_lux,
+            "under_10_count": self.under_10,
+            "under_20_count": self.under_20,
+            "covered_bits": format(self.covered, f"0{self.bins}b")[::-1] if self.bins else ""
+        }
+
+
+def combine_rollups(rollups: List[SegmentRollup], total_bins: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Statistics of several segments together (e.g. a whole street); coverage is length-weighted.
+    total_bins counts segments without readings as uncovered length.
+    """
+    count = sum(r.count for r in rollups)
+    bins = total_bins or sum(r.bins for r in rollups)
+    mins = [r.min_lux for r in rollups if r.min_lux is not None]
+    return {
+        "segments": len(rollups),
+        "count": count,
+        "mean_lux": round(sum(r.lux_sum for r in rollups) / count, 2) if count else 0.0,
+        "min_lux": min(mins) if mins else None,
+        "coverage": round(sum(r.covered_bins for r in rollups) / bins, 4) if bins else 0.0,
+        "share_under_10_lux": round(sum(r.under_10 for r in rollups) / count, 4) if count else None,
+        "share_under_20_lux": round(sum(r.under_20 for r in rollups) / count, 4) if count else None
+    }
+
+
+class SegmentRollupStore:
+    """
+    Per-street-segment illumination statistics, updated as snapped readings arrive.
+    Like the cell aggregates, each worker keeps the changes since its last
+    flush as per-segment deltas and merges them into the segment_rollups table
+    (sql/segment_rollups.sql) in one RPC every flush interval; the totals are
+    refreshed from the table periodically.
+    """
+
+    def __init__(self, flush_interval_seconds: float = 10.0, refresh_interval_seconds: float = 60.0):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.is_running = False
+        self.is_loaded = False
+        self._rollups: Dict[int, SegmentRollup] = {}
+        self._pending: Dict[int, SegmentRollup] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+        self._segments: Optional[Dict[int, tuple]] = None
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._rollups)
+
+    @property
+    def pending_count(self) -> int:
+        """Segments with readings not yet written to the database"""
+        return len(self._pending)
+
+    def _segment_info(self) -> Dict[int, tuple]:
+        """segment id -> (street id, barangay id, coverage bins), from the road snapper"""
+        if self._segments is None:
+            snapper = get_road_snapper()
+            self._segments = {}
+            if snapper is not None:
+                for segment_id, street_id, barangay_id, length_m in zip(
+                        snapper.segment_ids.tolist(), snapper.street_ids, snapper.barangay_ids, snapper.lengths_m.tolist()):
+                    bins = max(1, math.ceil(length_m / settings.COVERAGE_BIN_METERS))
+                    self._segments[segment_id] = (street_id, barangay_id, bins)
+        return self._segments
+
+    def _new_rollup(self, segment_id: int) -> Optional[SegmentRollup]:
+        info = self._segment_info().get(segment_id)
+        if info is None:
+            return None
+        street_id, barangay_id, bins = info
+        return SegmentRollup(segment_id, street_id, barangay_id, bins)
+
+    def add_readings(self, records: Iterable[Dict[str, Any]]):
+        """Fold prepared sensor_data rows in; rows that were not snapped to a segment are skipped"""
+        for record in records:
+            segment_id = record.get("segment_id")
+            if segment_id is None:
+                continue
+            for rollups in (self._rollups, self._pending):
+                rollup = rollups.get(segment_id)
+                if rollup is None:
+                    rollup = self._new_rollup(segment_id)
+                    if rollup is None:
+                        break
+                    rollups[segment_id] = rollup
+                rollup.add(record["lux"], record.get("segment_offset_m"))
+
+    def total_bins(self, street_id: Optional[int] = None, barangay_id: Optional[int] = None) -> int:
+        """Coverage bins of all known segments, optionally of one street or barangay"""
+        return sum(bins for segment_street_id, segment_barangay_id, bins in self._segment_info().values()
+                   if (street_id is None or segment_street_id == street_id)
+                   and (barangay_id is None or segment_barangay_id == barangay_id))
+
+    def get(self, segment_id: int) -> Optional[SegmentRollup]:
+        return self._rollups.get(segment_id)
+
+    def rollups(self, street_id: Optional[int] = None, barangay_id: Optional[int] = None) -> List[SegmentRollup]:
+        """Rollups of every segment with readings, optionally of one street or barangay"""
+        return [r for r in self._rollups.values()
+                if (street_id is None or r.street_id == street_id)
+                and (barangay_id is None or r.barangay_id == barangay_id)]
+
+    async def load(self):
+        """Load the stored totals, keeping local changes that have not been flushed"""
+        rollups: Dict[int, SegmentRollup] = {}
+        start = 0
+        while True:
+            response = await run_query(
+                supabase.table("segment_rollups").select("*")
+                .order("segment_id").range(start, start + LOAD_PAGE_SIZE - 1)
+            )
+            for row in response.data:
+                rollup = SegmentRollup.from_row(row)
+                rollups[rollup.segment_id] = rollup
+            if len(response.data) < LOAD_PAGE_SIZE:
+                break
+            start += LOAD_PAGE_SIZE
+
+        for segment_id, delta in self._pending.items():
+            if segment_id in rollups:
+                rollups[segment_id].merge(delta)
+            else:
+                rollups[segment_id] = delta.copy()
+        self._rollups = rollups
+        self.is_loaded = True
+        self._last_refresh = asyncio.get_running_loop().time()
+
+    async def flush(self):
+        """Merge the pending deltas into segment_rollups in one call"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        try:
+            await run_query(supabase.rpc("merge_segment_rollups", {
+                "p_rollups": [delta.to_merge_row() for delta in pending.values()]
+            }))
+        except Exception:
+            # fold the deltas back in front of anything that arrived meanwhile
+            for segment_id, delta in self._pending.items():
+                if segment_id in pending:
+                    pending[segment_id].merge(delta)
+                else:
+                    pending[segment_id] = delta
+            self._pending = pending
+            raise
+
+    async def start(self):
+        """Load the stored rollups and start the background flusher"""
+        if self.is_running:
+            return
+
+        try:
+            await self.load()
+            print(f"✅ Segment rollups loaded for {len(self._rollups)} segment(s)")
+        except Exception as e:
+            print(f"❌ Could not load segment rollups, will retry: {e}")
+
+        self.is_running = True
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and write any pending changes"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"❌ Final segment rollup flush failed: {e}")
+        print("🛑 Segment rollups stopped")
+
+    async def _flush_loop(self):
+        """Flush pending deltas and periodically refresh from the database"""
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+                if not self.is_loaded or loop.time() - self._last_refresh >= self.refresh_interval_seconds:
+                    await self.load()
+            except Exception as e:
+                print(f"❌ Segment rollup error: {e}")
+
+
+# Global segment rollup store instance
+segment_rollups = SegmentRollupStore(
+    flush_interval_seconds=settings.SEGMENT_ROLLUP_FLUSH_INTERVAL_SECONDS,
+    refresh_interval_seconds=settings.SEGMENT_ROLLUP_REFRESH_INTERVAL_SECONDS
+)
@@ -0,0 +1,171 @@
+# app/services/sensor_data_store.py
+# - prepare_sensor_record
+# - attach_snapped_positions
+# - attach_barangays
+# - insert_sensor_records
+
+from datetime import datetime
+from typing import List, Dict, Any
+
+from postgrest import ReturnMethod
+from postgrest.exceptions import APIError
+
+from app.core.database import supabase
+from app.core.config import settings
+from app.models.sensor_data import SensorData
+from app.geo.snapping import get_road_snapper
+from app.geo.barangay_index import get_barangay_index
+
+# sensor_data columns added by sql/sensor_data_snapping.sql
+SNAP_COLUMNS = ("snapped_lat", "snapped_lon", "snap_distance_m", "segment_id", "segment_offset_m")
+
+# SQLSTATE classes caused by the rows themselves: data exceptions,
+# integrity constraint violations and undefined columns / type mismatches
+PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+def prepare_sensor_record(data: SensorData) -> Dict[str, Any]:
+    """
+    Convert a validated SensorData reading into a row for the sensor_data table.
+    """
+    record = data.model_dump()
+    record["timestamp"] = record["timestamp"].isoformat()
+    record["uploaded_at"] = datetime.now().isoformat()
+    return record
+
+
+def attach_snapped_positions(records: List[Dict[str, Any]]):
+    """
+    Snap a batch of prepared rows to their nearest street segments in place.
+    Adds the SNAP_COLUMNS and fills "street" when the device did not send one.
+    Rows with no segment within SNAP_MAX_DISTANCE_METERS are left unchanged.
+    """
+    if not records or not settings.INGEST_SNAP_TO_STREET:
+        return
+
+    snapper = get_road_snapper()
+    if snapper is None:
+        return
+
+    if len(records) == 1:
+        snaps = [snapper.snap(records[0]["lat"], records[0]["lon"])]
+    else:
+        snaps = snapper.snap_batch([r["lat"] for r in records], [r["lon"] for r in records])
+    for record, snap in zip(records, snaps):
+        if snap is None:
+            continue
+        record["snapped_lat"] = snap.lat
+        record["snapped_lon"] = snap.lon
+        record["snap_distance_m"] = snap.distance_m
+        record["segment_id"] = snap.segment_id
+        record["segment_offset_m"] = snap.offset_m
+        if not record.get("street"):
+            record["street"] = snap.street_name
+
+
+def attach_barangays(records: List[Dict[str, Any]]):
+    """
+    Fill "barangay" in place from the boundary polygons for rows the device
+    sent without one, assigning the whole batch at once.
+    """
+    if not records or not settings.INGEST_ASSIGN_BARANGAY:
+        return
+
+    missing = [r for r in records if not r.get("barangay")]
+    if not missing:
+        return
+
+    index = get_barangay_index()
+    if index is None:
+        return
+
+    names = index.assign_names([r["lat"] for r in missing], [r["lon"] for r in missing])
+    for record, name in zip(missing, names):
+        if name:
+            record["barangay"] = name
+
+
+def enrich_sensor_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Snap prepared rows to street segments and tag their barangays, in place.
+    Both are CPU-bound for big batches, so async callers run this through run_blocking.
+    """
+    attach_snapped_positions(records)
+    attach_barangays(records)
+    return records
+
+
+def _rows_for_insert(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop the snap columns unless the table has them; PostgREST needs uniform keys across rows"""
+    if settings.INGEST_STORE_SNAP_COLUMNS:
+        return [{**{column: None for column in SNAP_COLUMNS}, **record} for record in records]
+    return [{k: v for k, v in record.items() if k not in SNAP_COLUMNS} for record in records]
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    True when retrying the same rows can never succeed: PostgREST request errors
+    (4xx other than auth, timeouts and rate limits) and data or constraint errors.
+    Network failures, timeouts, auth failures and 5xx responses are transient.
+    """
+    if not isinstance(error, APIError):
+        return False
+
+    code = str(error.code or "")
+    if code.isdigit() and len(code) == 3:
+        # non-JSON error response, the code is the HTTP status
+        return 400 <= int(code) < 500 and int(code) not in (401, 403, 408, 429)
+    if code.startswith("PGRST"):
+        # PGRST1xx are request errors, PGRST2xx schema errors; 0xx (connection) and 3xx (JWT) are not the rows' fault
+        return code[5:6] in ("1", "2")
+    return code[:2] in PERMANENT_SQLSTATE_CLASSES
+
+
+def _insert_range(rows: List[Dict[str, Any]], start: int, end: int, results: List[Dict[str, Any]],
+                  stop_on_transient: bool = False):
+    """
+    Insert rows[start:end] in one request. A permanent failure is bisected
+    until the offending rows are isolated, so the rest of the chunk still goes in.
+    With stop_on_transient, nothing more is tried after a transient failure and
+    the remaining rows are reported failed with it, so none get ahead of it.
+    """
+    if stop_on_transient and results and not results[-1]["ok"] and not results[-1]["permanent"]:
+        results[-1]["end"] = end
+        return
+
+    try:
+        supabase.table("sensor_data").insert(rows[start:end], returning=ReturnMethod.minimal).execute()
+        results.append({"start": start, "end": end, "ok": True, "permanent": False, "error": None})
+        return
+    except Exception as e:
+        permanent = is_permanent_error(e)
+        if permanent and end - start > 1:
+            middle = (start + end) // 2
+            _insert_range(rows, start, middle, results, stop_on_transient)
+            _insert_range(rows, middle, end, results, stop_on_transient)
+            return
+        print(f"❌ Insert of rows {start}-{end - 1} failed ({'permanent' if permanent else 'transient'}): {e}")
+        results.append({"start": start, "end": end, "ok": False, "permanent": permanent, "error": str(e)})
+
+
+def insert_sensor_records(records: List[Dict[str, Any]], chunk_size: int = None,
+                          stop_on_transient: bool = False) -> List[Dict[str, Any]]:
+    """
+    Insert sensor_data rows using multi-row inserts of at most chunk_size rows.
+    A chunk the database refuses outright is split until only the rows it
+    refuses are left out. A transiently failing chunk does not stop the
+    remaining chunks, unless stop_on_transient is set to keep the rows in order:
+    then the first transient failure covers every row after it.
+
+    Returns one result per inserted or failed range, in order:
+    {"start", "end", "ok", "permanent", "error"}, where start/end are indexes
+    into records and permanent marks rows that must not be retried.
+    """
+    chunk_size = chunk_size or settings.INGEST_INSERT_CHUNK_SIZE
+    rows = _rows_for_insert(records)
+    results = []
+
+    for start in range(0, len(records), chunk_size):
+        _insert_range(rows, start, min(start + chunk_size, len(records)), results, stop_on_transient)
+
+    return results
@@ -0,0 +1,271 @@
+import hashlib
+import math
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple
+
+import numpy as np
+import shapely
+import mapbox_vector_tile
+from shapely import STRtree
+
+from app.core.config import settings
+from app.core.database import run_blocking
+from app.geo.geohash import cell_size_degrees, encode_int_array, grid_index
+from app.geo.segment_store import get_segment_store
+from app.geo.snapping import get_road_snapper
+from app.geo.tiles import (MERCATOR_RADIUS_M, lonlat_to_mercator, mercator_to_lonlat, tile_bounds,
+                           tile_bounds_lonlat, tile_range, tile_size_meters)
+from app.services.cell_aggregates import cell_aggregates, CellAggregate
+
+TILE_EXTENT = 4096
+TILE_BUFFER_PIXELS = 64
+SIMPLIFY_PIXELS = 1.0
+# bump when the tile contents change, so stale tiles on disk are not served
+RENDERER_VERSION = 1
+MERCATOR_METERS_PER_DEGREE = MERCATOR_RADIUS_M * math.pi / 180.0
+LINE_TYPE_IDS = (1, 5)
+
+
+class VectorTileCache:
+    """
+    Mapbox Vector Tiles of the street segments (colored by aggregated lux) and
+    the illumination cells, rendered from the cell aggregate pyramid at the
+    level for the tile's zoom.
+    Rendered tiles are kept in an in-memory LRU and on disk. Memory entries are
+    dropped when a reading changes a cell inside the tile (cell_aggregates
+    listener); disk entries carry a digest of the cells they were rendered
+    from and are only used while it still matches, so they survive restarts
+    and can be shared by several workers.
+    """
+
+    def __init__(self, cache_path: str, max_tiles: int = 2048, min_zoom: int = 10, max_zoom: int = 20):
+        self.cache_path = cache_path
+        self.max_tiles = max_tiles
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+        self._memory: "OrderedDict[Tuple[int, int, int], Tuple[str, bytes]]" = OrderedDict()
+        self._segments: Optional[Dict] = None
+        # bumped on every invalidation, so a render that raced one is not cached
+        self._generation = 0
+
+    @property
+    def cached_tiles(self) -> int:
+        return len(self._memory)
+
+    def _load_segments(self) -> Dict:
+        """Street segments in Mercator meters with an STRtree, built once from the road snapper"""
+        if self._segments is None:
+            snapper = get_road_snapper()
+            if snapper is None:
+                self._segments = {"geometries": np.empty(0, dtype=object), "tree": None, "version": "none"}
+            else:
+                def to_mercator(coords):
+                    return np.column_stack(lonlat_to_mercator(*snapper.projection.inverse(coords[:, 0], coords[:, 1])))
+
+                geometries = shapely.transform(snapper.geometries, to_mercator)
+                store = get_segment_store()
+                if store is not None:
+                    modified_at = store.modified_at
+                elif os.path.exists(settings.STREET_SEGMENTS_PATH):
+                    modified_at = os.path.getmtime(settings.STREET_SEGMENTS_PATH)
+                else:
+                    modified_at = 0
+                self._segments = {
+                    "geometries": geometries,
+                    "tree": STRtree(geometries),
+                    "segment_ids": snapper.segment_ids,
+                    "street_ids": snapper.street_ids,
+                    "street_names": snapper.street_names,
+                    "version": f"{len(geometries)}:{modified_at:.0f}"
+                }
+        return self._segments
+
+    def _buffer_meters(self, z: int) -> float:
+        return tile_size_meters(z) * TILE_BUFFER_PIXELS / TILE_EXTENT
+
+    def _tile_cells(self, z: int, x: int, y: int) -> Tuple[int, List[CellAggregate]]:
+        """
+        Pyramid level for the zoom and copies of its cells intersecting the buffered tile.
+        Copies, because readings keep updating the live aggregates while the tile renders.
+        """
+        precision = cell_aggregates.precision_for_zoom(z)
+        pad = self._buffer_meters(z) / MERCATOR_METERS_PER_DEGREE
+        min_lon, min_lat, max_lon, max_lat = tile_bounds_lonlat(z, x, y)
+        cells = cell_aggregates.cells((min_lon - pad, min_lat - pad, max_lon + pad, max_lat + pad), precision)
+        return precision, [cell.copy() for cell in cells]
+
+    def _digest(self, precision: int, cells: List[CellAggregate]) -> str:
+        """Fingerprint of everything a tile is rendered from"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{RENDERER_VERSION}|{self._load_segments()['version']}|{precision}|".encode())
+        for cell in sorted(cells, key=lambda c: c.cell):
+            digest.update(f"{cell.cell}:{cell.count}:{cell.latest_at.isoformat()};".encode())
+        return digest.hexdigest()
+
+    def _segment_lux(self, pieces: np.ndarray, cells: Dict[int, CellAggregate], precision: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (reading count, lux sum) of each clipped segment piece from the cells it passes through.
+        Pieces are sampled at half a cell so no cell along them is skipped.
+        """
+        counts = np.zeros(len(pieces))
+        lux_sums = np.zeros(len(pieces))
+        if not len(pieces) or not cells:
+            return counts, lux_sums
+
+        step = min(cell_size_degrees(precision)) * MERCATOR_METERS_PER_DEGREE / 2
+        coords, index = shapely.get_coordinates(shapely.segmentize(pieces, step), return_index=True)
+        lons, lats = mercator_to_lonlat(coords[:, 0], coords[:, 1])
+        codes = encode_int_array(lats, lons, precision).astype(np.int64)
+        for piece, code in np.unique(np.column_stack((index, codes)), axis=0).tolist():
+            aggregate = cells.get(code)
+            if aggregate is not None:
+                counts[piece] += aggregate.count
+                lux_sums[piece] += aggregate.lux_sum
+        return counts, lux_sums
+
+    def render(self, z: int, x: int, y: int, precision: int, cells: List[CellAggregate]) -> bytes:
+        """Encode the segments and illumination layers of one tile"""
+        min_x, min_y, max_x, max_y = tile_bounds(z, x, y)
+        buffer = self._buffer_meters(z)
+        clip = (min_x - buffer, min_y - buffer, max_x + buffer, max_y + buffer)
+        scale = TILE_EXTENT / (max_x - min_x)
+
+        def to_tile(coords):
+            return np.column_stack(((coords[:, 0] - min_x) * scale, (coords[:, 1] - min_y) * scale))
+
+        segments = self._load_segments()
+        segment_features = []
+        if segments["tree"] is not None:
+            candidates = segments["tree"].query(shapely.box(*clip))
+            pieces = shapely.clip_by_rect(segments["geometries"][candidates], *clip)
+            keep = np.isin(shapely.get_type_id(pieces), LINE_TYPE_IDS) & ~shapely.is_empty(pieces)
+            candidates, pieces = candidates[keep], pieces[keep]
+
+            counts, lux_sums = self._segment_lux(pieces, {c.cell: c for c in cells}, precision)
+            pieces = shapely.simplify(shapely.transform(pieces, to_tile), SIMPLIFY_PIXELS)
+            for piece, position, count, lux_sum in zip(pieces, candidates.tolist(), counts.tolist(), lux_sums.tolist()):
+                if piece.is_empty:
+                    continue
+                properties = {"segment_id": int(segments["segment_ids"][position])}
+                if segments["street_ids"][position] is not None:
+                    properties["street_id"] = int(segments["street_ids"][position])
+                if segments["street_names"][position]:
+                    properties["street_name"] = segments["street_names"][position]
+                if count:
+                    properties["mean_lux"] = round(lux_sum / count, 2)
+                    properties["readings"] = int(count)
+                segment_features.append({"geometry": piece, "properties": properties})
+
+        cell_features = []
+        if cells:
+            xs, ys = lonlat_to_mercator([c.lon for c in cells], [c.lat for c in cells])
+            for cell, cx, cy in zip(cells, xs.tolist(), ys.tolist()):
+                if not (clip[0] <= cx <= clip[2] and clip[1] <= cy <= clip[3]):
+                    continue
+                properties = cell.to_dict(precision)
+                del properties["lat"], properties["lon"]
+                cell_features.append({
+                    "geometry": shapely.Point((cx - min_x) * scale, (cy - min_y) * scale),
+                    "properties": properties
+                })
+
+        return mapbox_vector_tile.encode(
+            [{"name": "segments", "features": segment_features},
+             {"name": "illumination", "features": cell_features}],
+            default_options={"extents": TILE_EXTENT}
+        )
+
+    def _disk_path(self, z: int, x: int, y: int) -> Path:
+        return Path(self.cache_path) / str(z) / str(x) / f"{y}.mvt"
+
+    def _read_disk(self, z: int, x: int, y: int, digest: str) -> Optional[bytes]:
+        """Tile bytes from disk when they were rendered from the same data"""
+        try:
+            with open(self._disk_path(z, x, y), "rb") as f:
+                stored_digest = f.readline().strip().decode()
+                return f.read() if stored_digest == digest else None
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+
+    def _write_disk(self, z: int, x: int, y: int, digest: str, data: bytes):
+        path = self._disk_path(z, x, y)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(digest.encode() + b"\n" + data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"❌ Could not write tile {z}/{x}/{y} to disk: {e}")
+
+    def _load_tile(self, z: int, x: int, y: int, precision: int, cells: List[CellAggregate]) -> Tuple[str, bytes]:
+        """(digest, tile bytes) from disk or freshly rendered; blocking, runs in the executor"""
+        digest = self._digest(precision, cells)
+        data = self._read_disk(z, x, y, digest)
+        if data is None:
+            data = self.render(z, x, y, precision, cells)
+            self._write_disk(z, x, y, digest, data)
+            self.renders += 1
+        else:
+            self.disk_hits += 1
+        return digest, data
+
+    async def get_tile(self, z: int, x: int, y: int) -> Tuple[str, bytes]:
+        """
+        (digest, tile bytes), from memory, disk or freshly rendered.
+        Only the memory lookup runs on the event loop; rendering and the disk
+        cache run in the executor.
+        """
+        key = (z, x, y)
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry
+
+        generation = self._generation
+        precision, cells = self._tile_cells(z, x, y)
+        entry = await run_blocking(self._load_tile, z, x, y, precision, cells)
+
+        if generation == self._generation:
+            self._memory[key] = entry
+            if len(self._memory) > self.max_tiles:
+                self._memory.popitem(last=False)
+        return entry
+
+    def invalidate_positions(self, positions: List[Tuple[float, float]]):
+        """Drop cached tiles whose buffer touches a cell containing any of the (lat, lon) positions"""
+        self._generation += 1
+        if not self._memory:
+            return
+
+        zooms = {z for z, _, _ in self._memory}
+        cells_by_precision: Dict[int, set] = {}
+        for z in zooms:
+            precision = cell_aggregates.precision_for_zoom(z)
+            if precision not in cells_by_precision:
+                cells_by_precision[precision] = {grid_index(lat, lon, precision) for lat, lon in positions}
+            lat_height, lon_width = cell_size_degrees(precision)
+            pad = self._buffer_meters(z) / MERCATOR_METERS_PER_DEGREE
+            for lat_idx, lon_idx in cells_by_precision[precision]:
+                min_lat = lat_idx * lat_height - 90.0
+                min_lon = lon_idx * lon_width - 180.0
+                x0, y0, x1, y1 = tile_range(min_lon - pad, min_lat - pad, min_lon + lon_width + pad,
+                                            min_lat + lat_height + pad, z)
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        self._memory.pop((z, x, y), None)
+
+
+# Global vector tile cache instance
+vector_tiles = VectorTileCache(
+    cache_path=settings.TILE_CACHE_PATH,
+    max_tiles=settings.TILE_CACHE_MAX_TILES,
+    min_zoom=settings.TILE_MIN_ZOOM,
+    max_zoom=settings.TILE_MAX_ZOOM
+)
@@ -0,0 +1,96 @@
+# backfill_barangays.py
+# Assigns barangays from their boundary polygons (app/geo/barangay_index.py)
+# to sensor_data rows stored without one. Rows are read a page at a time in
+# id order, assigned as one vectorized batch and written back through the
+# assign_sensor_data_barangays RPC (sql/sensor_data_barangays.sql).
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# make the backend "app" package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.core.database import supabase
+from app.geo.barangay_index import get_barangay_index
+
+
+def iter_missing_barangay(page_size):
+    """Pages of sensor_data rows without a barangay, in id order (keyset pagination)"""
+    last_id = 0
+    while True:
+        rows = (supabase.table("sensor_data").select("id, lat, lon")
+                .gt("id", last_id).or_("barangay.is.null,barangay.eq.").order("id").limit(page_size).execute().data)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def backfill_barangays(page_size, dry_run=False):
+    """Assign and store barangays for every row missing one"""
+    try:
+        index = get_barangay_index()
+        if index is None:
+            print("❌ No barangay boundaries found. Please run fetch_barangays.py first.")
+            return False
+
+        print("🔄 Assigning barangays to sensor_data rows without one...")
+        start = time.perf_counter()
+        assign_seconds = 0.0
+        total = assigned = 0
+        counts = {}
+        for rows in iter_missing_barangay(page_size):
+            assign_start = time.perf_counter()
+            names = index.assign_names([r["lat"] for r in rows], [r["lon"] for r in rows])
+            assign_seconds += time.perf_counter() - assign_start
+
+            updates = [{"id": row["id"], "barangay": name} for row, name in zip(rows, names) if name]
+            if updates and not dry_run:
+                supabase.rpc("assign_sensor_data_barangays", {"p_rows": updates}).execute()
+
+            total += len(rows)
+            assigned += len(updates)
+            for update in updates:
+                counts[update["barangay"]] = counts.get(update["barangay"], 0) + 1
+            elapsed = time.perf_counter() - start
+            print(f"   {total} rows, {assigned} assigned ({total / elapsed:,.0f} rows/s)")
+
+        elapsed = time.perf_counter() - start
+        print(f"✅ Assigned {assigned} of {total} rows in {elapsed:.1f}s" + (" (dry run, nothing written)" if dry_run else ""))
+
+        print(f"\n📊 Statistics:")
+        print(f"   - Overall: {total / elapsed if elapsed else 0:,.0f} rows/s")
+        print(f"   - Point-in-polygon only: {total / assign_seconds if assign_seconds else 0:,.0f} points/s")
+        print(f"   - Outside every barangay: {total - assigned}")
+        for name, count in sorted(counts.items(), key=lambda item: -item[1])[:10]:
+            print(f"   - {name}: {count}")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Error backfilling barangays: {e}")
+        return False
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Assign barangays to sensor_data rows stored without one")
+    parser.add_argument("--page-size", type=int, default=1000, help="rows per request and per batch")
+    parser.add_argument("--dry-run", action="store_true", help="assign and report without writing")
+    args = parser.parse_args()
+
+    print("🚀 Starting barangay backfill...")
+
+    if backfill_barangays(args.page_size, args.dry_run):
+        print("🎉 Barangay backfill completed successfully!")
+    else:
+        print("❌ Barangay backfill failed!")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# build_cell_pyramid.py
+# Rebuilds the geohash illumination pyramid (cell_aggregates table,
+# sql/cell_aggregates.sql) from every reading in sensor_data. The API keeps
+# the pyramid up to date incrementally afterwards; run this once after
+# applying the migration, or after changing CELL_PYRAMID_LEVELS.
+# Readings are placed at their snapped position, snapped here like the API
+# does (sensor_data only has snapped columns with INGEST_STORE_SNAP_COLUMNS).
+# The cells are built into cell_aggregates_rebuild and swapped in at the end
+# in one transaction; the API's merges during the run go to both tables.
+# Only readings up to the newest one at the start are read, so at most a
+# flush interval of readings around the start can be counted twice.
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# make the backend "app" package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.core.config import settings
+from app.core.database import supabase
+from app.geo.snapping import get_road_snapper
+from app.services.cell_aggregates import CellPyramid, parse_pyramid_levels
+
+READING_COLUMNS = "id, lat, lon, lux, timestamp"
+
+
+def newest_reading_id():
+    rows = supabase.table("sensor_data").select("id").order("id", desc=True).limit(1).execute().data
+    return rows[0]["id"] if rows else 0
+
+
+def iter_sensor_data(page_size, through_id):
+    """Pages of sensor_data rows with id <= through_id in id order (keyset pagination)"""
+    last_id = 0
+    while True:
+        rows = (supabase.table("sensor_data").select(READING_COLUMNS)
+                .gt("id", last_id).lte("id", through_id).order("id").limit(page_size).execute().data)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def snap_rows(snapper, rows):
+    """Set snapped_lat and snapped_lon on the rows within snapping distance of a segment"""
+    snaps = snapper.snap_batch([row["lat"] for row in rows], [row["lon"] for row in rows])
+    for row, snap in zip(rows, snaps):
+        if snap is not None:
+            row["snapped_lat"] = snap.lat
+            row["snapped_lon"] = snap.lon
+
+
+def build_cell_pyramid(levels, page_size, chunk_size):
+    """Aggregate sensor_data into every pyramid level and swap the result in for the stored cells"""
+    snapper = get_road_snapper() if settings.INGEST_SNAP_TO_STREET else None
+    if snapper is None:
+        print("⚠️  Not snapping readings, cells use the reported positions")
+
+    started = False
+    try:
+        precisions = sorted({precision for _, precision in parse_pyramid_levels(levels)})
+        pyramid = CellPyramid(precisions)
+        supabase.rpc("begin_cell_aggregates_rebuild", {}).execute()
+        started = True
+        through_id = newest_reading_id()
+        print(f"🔄 Aggregating sensor_data through id {through_id} at precision(s) {precisions}...")
+
+        start = time.perf_counter()
+        readings = 0
+        for rows in iter_sensor_data(page_size, through_id):
+            rows = [row for row in rows if row.get("lux") is not None]
+            if snapper is not None:
+                snap_rows(snapper, rows)
+            pyramid.add_records(rows)
+            readings += len(rows)
+        elapsed = time.perf_counter() - start
+        print(f"📊 Aggregated {readings} readings in {elapsed:.1f}s "
+              f"({readings / elapsed if elapsed else 0:,.0f} readings/s)")
+
+        if not readings:
+            print("❌ sensor_data has no readings, keeping the stored cells")
+            supabase.rpc("cancel_cell_aggregates_rebuild", {}).execute()
+            return False
+
+        for precision in precisions:
+            cells = list(pyramid.levels[precision].values())
+            for i in range(0, len(cells), chunk_size):
+                supabase.rpc("stage_cell_aggregates", {
+                    "p_precision": precision,
+                    "p_cells": [cell.to_merge_row(precision) for cell in cells[i:i + chunk_size]]
+                }).execute()
+            print(f"📦 Precision {precision}: {len(cells)} cell(s) staged")
+
+        swapped = supabase.rpc("finish_cell_aggregates_rebuild", {"p_precisions": precisions}).execute().data
+        print(f"💾 {swapped} cell(s) saved with the merges made meanwhile")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Error building cell pyramid: {e}")
+        if started:
+            try:
+                supabase.rpc("cancel_cell_aggregates_rebuild", {}).execute()
+            except Exception as cancel_error:
+                print(f"❌ Could not cancel the rebuild: {cancel_error}")
+        return False
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild the geohash illumination pyramid from sensor_data")
+    parser.add_argument("--levels", default=settings.CELL_PYRAMID_LEVELS,
+                        help="pyramid levels as min_zoom:precision (default: CELL_PYRAMID_LEVELS)")
+    parser.add_argument("--page-size", type=int, default=1000, help="sensor_data rows per request")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="cells per merge call")
+    args = parser.parse_args()
+
+    print("🚀 Starting cell pyramid build...")
+
+    if build_cell_pyramid(args.levels, args.page_size, args.chunk_size):
+        print("🎉 Cell pyramid build completed successfully!")
+    else:
+        print("❌ Cell pyramid build failed!")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# build_geohash_index.py
+# Rasterizes street_segments.json into a geohash cell -> candidate segment ids
+# table used by the API's road snapper (app/geo/geohash_index.py).
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# make the backend "app" package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.core.config import settings
+from app.geo.geohash import cell_size_meters
+from app.geo.geohash_index import rasterize_segments, write_geohash_index, GeohashSegmentIndex
+from app.geo.snapping import load_road_snapper
+
+# coarser cells hold so many candidates that the index is slower than the STRtree
+# (65 us vs 37 us per snap at precision 7), see test/benchmark/bench_snapping.py
+MIN_PRECISION = 8
+
+
+def build_geohash_index(precision, buffer_m, output_file):
+    """Build and verify the geohash cell index"""
+    try:
+        print("🔄 Loading street segments...")
+        try:
+            # a fresh snapper: the index being replaced may be outdated or incompatible
+            snapper = load_road_snapper()
+        except Exception as e:
+            print(f"❌ Could not load street segments ({e}). Please run fetch_street_segments.py first.")
+            return False
+
+        cell_h, cell_w = cell_size_meters(precision, snapper.projection.ref_lat)
+        print(f"📊 Precision {precision}: cells are about {cell_h:.0f}m x {cell_w:.0f}m, buffer {buffer_m}m")
+
+        start = time.perf_counter()
+        cells = rasterize_segments(snapper, precision, buffer_m)
+        print(f"📊 Rasterized {len(snapper)} segments into {len(cells)} cells in {time.perf_counter() - start:.1f}s")
+
+        Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+        write_geohash_index(cells, precision, buffer_m, output_file)
+        print(f"💾 Geohash index saved to {output_file} ({os.path.getsize(output_file) / 1024:.0f} KB)")
+
+        # show statistics
+        candidate_counts = [len(ids) for ids in cells.values()]
+        print(f"\n📊 Statistics:")
+        print(f"   - Average candidates per cell: {sum(candidate_counts) / len(candidate_counts):.1f}")
+        print(f"   - Max candidates per cell: {max(candidate_counts)}")
+
+        # verify a sample of cells round-trips through the memory-mapped file
+        index = GeohashSegmentIndex(output_file)
+        for code, ids in list(cells.items())[:1000]:
+            assert set(index.candidates_for_cell(code)) == ids, f"Cell {code} does not round-trip"
+        index.close()
+        print("✅ Index verified")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Error building geohash index: {e}")
+        return False
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build the geohash cell -> street segment lookup table")
+    parser.add_argument("--precision", type=int, default=settings.GEOHASH_INDEX_PRECISION, help="geohash precision (default 8, ~19m x 37m cells)")
+    parser.add_argument("--buffer", type=float, default=settings.SNAP_MAX_DISTANCE_METERS, help="meters around each segment to cover")
+    parser.add_argument("--output", default=settings.GEOHASH_INDEX_PATH, help="output file")
+    parser.add_argument("--force", action="store_true", help=f"build even below precision {MIN_PRECISION}")
+    args = parser.parse_args()
+
+    if args.precision < MIN_PRECISION:
+        if not args.force:
+            print(f"❌ Precision {args.precision} is below {MIN_PRECISION}: the index would be slower than "
+                  f"the STRtree it replaces. Use --force to build it anyway.")
+            return False
+        print(f"⚠️  Precision {args.precision} is below {MIN_PRECISION}, snapping will likely be slower than the STRtree")
+
+    print("🚀 Starting geohash index build...")
+
+    if build_geohash_index(args.precision, args.buffer, args.output):
+        print("🎉 Geohash index build completed successfully!")
+    else:
+        print("❌ Geohash index build failed!")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    main()
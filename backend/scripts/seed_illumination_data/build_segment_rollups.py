@@ -0,0 +1,133 @@
+# build_segment_rollups.py
+# Rebuilds the per-street-segment illumination statistics (segment_rollups
+# table, sql/segment_rollups.sql) from the readings in sensor_data, snapping
+# them to the current street segments here (sensor_data only has snapped
+# columns with INGEST_STORE_SNAP_COLUMNS). The API keeps the rollups up to
+# date incrementally afterwards; run this once after applying the migration,
+# or after rebuilding the street segments.
+# The rollups are built into segment_rollups_rebuild and swapped in at the
+# end in one transaction; the API's merges during the run go to both tables.
+# Only readings up to the newest one at the start are read, so at most a
+# flush interval of readings around the start can be counted twice.
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# make the backend "app" package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.core.database import supabase
+from app.geo.snapping import get_road_snapper
+from app.services.segment_rollups import SegmentRollupStore, combine_rollups
+
+READING_COLUMNS = "id, lat, lon, lux"
+
+
+def newest_reading_id():
+    rows = supabase.table("sensor_data").select("id").order("id", desc=True).limit(1).execute().data
+    return rows[0]["id"] if rows else 0
+
+
+def iter_sensor_data(page_size, through_id):
+    """Pages of sensor_data rows with id <= through_id in id order (keyset pagination)"""
+    last_id = 0
+    while True:
+        rows = (supabase.table("sensor_data").select(READING_COLUMNS)
+                .gt("id", last_id).lte("id", through_id).order("id").limit(page_size).execute().data)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def snap_rows(snapper, rows):
+    """Set segment_id and segment_offset_m on the rows within snapping distance of a segment"""
+    snaps = snapper.snap_batch([row["lat"] for row in rows], [row["lon"] for row in rows])
+    for row, snap in zip(rows, snaps):
+        if snap is not None:
+            row["segment_id"] = snap.segment_id
+            row["segment_offset_m"] = snap.offset_m
+
+
+def build_segment_rollups(page_size, chunk_size):
+    """Roll up every reading per segment and swap the result in for the stored rollups"""
+    snapper = get_road_snapper()
+    if snapper is None:
+        print("❌ Street segments are not available, refusing to rebuild (run fetch_street_segments.py first)")
+        return False
+
+    started = False
+    try:
+        store = SegmentRollupStore()
+        supabase.rpc("begin_segment_rollups_rebuild", {}).execute()
+        started = True
+        through_id = newest_reading_id()
+        print(f"🔄 Snapping and rolling up sensor_data through id {through_id} per street segment...")
+
+        start = time.perf_counter()
+        readings = snapped = 0
+        for rows in iter_sensor_data(page_size, through_id):
+            rows = [row for row in rows if row.get("lux") is not None]
+            snap_rows(snapper, rows)
+            store.add_readings(rows)
+            readings += len(rows)
+            snapped += sum(1 for row in rows if "segment_id" in row)
+        elapsed = time.perf_counter() - start
+        print(f"📊 Rolled up {snapped} of {readings} readings in {elapsed:.1f}s "
+              f"({readings / elapsed if elapsed else 0:,.0f} readings/s)")
+
+        if not snapped:
+            print("❌ No reading is within snapping distance of a street segment, keeping the stored rollups")
+            supabase.rpc("cancel_segment_rollups_rebuild", {}).execute()
+            return False
+
+        rollups = store.rollups()
+        for i in range(0, len(rollups), chunk_size):
+            supabase.rpc("stage_segment_rollups", {
+                "p_rollups": [rollup.to_merge_row() for rollup in rollups[i:i + chunk_size]]
+            }).execute()
+        swapped = supabase.rpc("finish_segment_rollups_rebuild", {}).execute().data
+        print(f"💾 {len(rollups)} segment rollup(s) rebuilt, {swapped} saved with the merges made meanwhile")
+
+        summary = combine_rollups(rollups, store.total_bins())
+        print(f"\n📊 Statistics:")
+        print(f"   - Mean lux: {summary['mean_lux']}")
+        print(f"   - Coverage of the street network: {summary['coverage']:.1%}")
+        if summary["count"]:
+            print(f"   - Readings under 10 lux: {summary['share_under_10_lux']:.1%}")
+            print(f"   - Readings under 20 lux: {summary['share_under_20_lux']:.1%}")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Error building segment rollups: {e}")
+        if started:
+            try:
+                supabase.rpc("cancel_segment_rollups_rebuild", {}).execute()
+            except Exception as cancel_error:
+                print(f"❌ Could not cancel the rebuild: {cancel_error}")
+        return False
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rebuild per-segment illumination statistics from sensor_data")
+    parser.add_argument("--page-size", type=int, default=1000, help="sensor_data rows per request")
+    parser.add_argument("--chunk-size", type=int, default=500, help="segments per merge call")
+    args = parser.parse_args()
+
+    print("🚀 Starting segment rollup build...")
+
+    if build_segment_rollups(args.page_size, args.chunk_size):
+        print("🎉 Segment rollup build completed successfully!")
+    else:
+        print("❌ Segment rollup build failed!")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# build_segment_store.py
+# Converts street_segments.json and barangays.json into the columnar,
+# memory-mapped segment store (app/geo/segment_store.py) that the API,
+# the snapper and the generator load instead of reparsing the JSON.
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# make the backend "app" package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.core.config import settings
+from app.geo.segment_store import build_segment_store, SegmentStore
+
+
+def load_json(path):
+    """Load a JSON file, or None on error"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"❌ Error loading {path}: {e}")
+        return None
+
+
+def convert(segments_file, barangays_file, output_dir):
+    """Build the store and check it opens"""
+    print("🔄 Loading street segments and barangays data...")
+    start = time.perf_counter()
+    segments = load_json(segments_file)
+    barangays = load_json(barangays_file)
+    parse_time = time.perf_counter() - start
+    if segments is None or barangays is None:
+        return False
+    print(f"📊 Parsed {len(segments)} street segments and {len(barangays)} barangays in {parse_time * 1000:.0f} ms")
+
+    build_segment_store(segments, barangays, output_dir)
+
+    start = time.perf_counter()
+    store = SegmentStore(output_dir)
+    load_time = time.perf_counter() - start
+
+    size = sum(f.stat().st_size for f in Path(store.path).iterdir())
+    print(f"💾 Segment store saved to {store.path} ({size / 1024:.0f} KB, "
+          f"JSON was {(os.path.getsize(segments_file) + os.path.getsize(barangays_file)) / 1024:.0f} KB)")
+    print(f"\n📊 Statistics:")
+    print(f"   - Segments: {len(store)}, vertices: {len(store.coords)}")
+    print(f"   - Barangays: {len(store.barangay_table_ids)}, boundary vertices: {len(store.ring_coords)}")
+    print(f"   - Total street length: {float(store.lengths_m.sum()) / 1000:.1f} km")
+    print(f"   - Store opens in {load_time * 1000:.1f} ms")
+    return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build the columnar street segment and barangay store")
+    parser.add_argument("--segments", default=settings.STREET_SEGMENTS_PATH, help="street_segments.json")
+    parser.add_argument("--barangays", default=settings.BARANGAYS_PATH, help="barangays.json")
+    parser.add_argument("--output", default=settings.SEGMENT_STORE_PATH, help="output directory")
+    args = parser.parse_args()
+
+    print("🚀 Starting segment store build...")
+
+    if convert(args.segments, args.barangays, args.output):
+        print("🎉 Segment store build completed successfully!")
+    else:
+        print("❌ Segment store build failed!")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    main()
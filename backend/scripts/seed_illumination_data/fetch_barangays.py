@@ -1,8 +1,9 @@
 # fetch_barangays.py
 import os
-import json
+import argparse
 from supabase import create_client
 from dotenv import load_dotenv
+from supabase_fetch import sync_table, CONCURRENCY
 
 # Load environment variables
 load_dotenv()
@@ -12,14 +13,14 @@ url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
 supabase = create_client(url, key)
 
-def fetch_barangays_data():
-    """Fetch all barangays data from Supabase and save to JSON"""
+def fetch_barangays_data(full=False, concurrency=CONCURRENCY):
+    """Fetch all barangays data from Supabase and save to JSON (incrementally unless full)"""
     try:
         print("🔄 Fetching barangays data from Supabase...")
         
-        # Fetch all barangays from the barangays table
-        response = supabase.table("barangays").select("*").execute()
-        barangays_data = response.data
+        # Page through the table by id range, or pull only rows changed since the last sync
+        output_file = "barangays.json"
+        barangays_data = sync_table(supabase, "barangays", output_file, full=full, concurrency=concurrency)
         
         print(f"✅ Fetched {len(barangays_data)} barangays from Supabase")
         
@@ -29,11 +30,6 @@ def fetch_barangays_data():
             for i, barangay in enumerate(barangays_data[:3]):  # Show first 3 records
                 print(f"   {i+1}. ID: {barangay.get('id')}, Name: {barangay.get('name', 'Unnamed')}")
         
-        # Save to JSON file
-        output_file = "barangays.json"
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(barangays_data, f, indent=2, ensure_ascii=False)
-        
         print(f"💾 Barangays data saved to {output_file}")
         
         # Show statistics
@@ -54,9 +50,14 @@ def fetch_barangays_data():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Fetch barangays from Supabase into barangays.json")
+    parser.add_argument("--full", action="store_true", help="re-download everything instead of syncing changes")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="concurrent range requests")
+    args = parser.parse_args()
+    
     print("🚀 Starting barangays data fetch...")
     
-    if fetch_barangays_data():
+    if fetch_barangays_data(args.full, args.concurrency):
         print("🎉 Barangays data fetch completed successfully!")
     else:
         print("❌ Barangays data fetch failed!")
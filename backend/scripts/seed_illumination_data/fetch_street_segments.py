@@ -1,8 +1,9 @@
 # fetch_street_segments.py
 import os
-import json
+import argparse
 from supabase import create_client
 from dotenv import load_dotenv
+from supabase_fetch import sync_table, CONCURRENCY
 
 # Load environment variables
 load_dotenv()
@@ -12,14 +13,14 @@ url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
 supabase = create_client(url, key)
 
-def fetch_street_segments_data():
-    """Fetch all street segments data from Supabase and save to JSON"""
+def fetch_street_segments_data(full=False, concurrency=CONCURRENCY):
+    """Fetch all street segments data from Supabase and save to JSON (incrementally unless full)"""
     try:
         print("🔄 Fetching street segments data from Supabase...")
         
-        # Fetch all street segments from the street_segments table
-        response = supabase.table("street_segments").select("*").execute()
-        street_segments_data = response.data
+        # Page through the table by id range, or pull only rows changed since the last sync
+        output_file = "street_segments.json"
+        street_segments_data = sync_table(supabase, "street_segments", output_file, full=full, concurrency=concurrency)
         
         print(f"✅ Fetched {len(street_segments_data)} street segments from Supabase")
         
@@ -29,11 +30,6 @@ def fetch_street_segments_data():
             for i, segment in enumerate(street_segments_data[:3]):  # Show first 3 records
                 print(f"   {i+1}. ID: {segment.get('id')}, Street ID: {segment.get('street_id')}, Barangay ID: {segment.get('barangay_id')}")
         
-        # Save to JSON file
-        output_file = "street_segments.json"
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(street_segments_data, f, indent=2, ensure_ascii=False)
-        
         print(f"💾 Street segments data saved to {output_file}")
         
         # Show statistics
@@ -67,9 +63,14 @@ def fetch_street_segments_data():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Fetch street segments from Supabase into street_segments.json")
+    parser.add_argument("--full", action="store_true", help="re-download everything instead of syncing changes")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="concurrent range requests")
+    args = parser.parse_args()
+    
     print("🚀 Starting street segments data fetch...")
     
-    if fetch_street_segments_data():
+    if fetch_street_segments_data(args.full, args.concurrency):
         print("🎉 Street segments data fetch completed successfully!")
     else:
         print("❌ Street segments data fetch failed!")
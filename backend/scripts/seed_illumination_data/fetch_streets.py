@@ -1,8 +1,9 @@
 # fetch_streets.py
 import os
-import json
+import argparse
 from supabase import create_client
 from dotenv import load_dotenv
+from supabase_fetch import sync_table, CONCURRENCY
 
 # Load environment variables
 load_dotenv()
@@ -12,14 +13,14 @@ url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
 supabase = create_client(url, key)
 
-def fetch_streets_data():
-    """Fetch all streets data from Supabase and save to JSON"""
+def fetch_streets_data(full=False, concurrency=CONCURRENCY):
+    """Fetch all streets data from Supabase and save to JSON (incrementally unless full)"""
     try:
         print("🔄 Fetching streets data from Supabase...")
         
-        # Fetch all streets from the streets table
-        response = supabase.table("streets").select("*").execute()
-        streets_data = response.data
+        # Page through the table by id range, or pull only rows changed since the last sync
+        output_file = "streets.json"
+        streets_data = sync_table(supabase, "streets", output_file, full=full, concurrency=concurrency)
         
         print(f"✅ Fetched {len(streets_data)} streets from Supabase")
         
@@ -29,11 +30,6 @@ def fetch_streets_data():
             for i, street in enumerate(streets_data[:3]):  # Show first 3 records
                 print(f"   {i+1}. ID: {street.get('id')}, Name: {street.get('name', 'Unnamed')}, Meters: {street.get('meters')}")
         
-        # Save to JSON file
-        output_file = "streets.json"
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(streets_data, f, indent=2, ensure_ascii=False)
-        
         print(f"💾 Streets data saved to {output_file}")
         
         # Show statistics
@@ -58,9 +54,14 @@ def fetch_streets_data():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Fetch streets from Supabase into streets.json")
+    parser.add_argument("--full", action="store_true", help="re-download everything instead of syncing changes")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="concurrent range requests")
+    args = parser.parse_args()
+    
     print("🚀 Starting streets data fetch...")
     
-    if fetch_streets_data():
+    if fetch_streets_data(args.full, args.concurrency):
         print("🎉 Streets data fetch completed successfully!")
     else:
         print("❌ Streets data fetch failed!")
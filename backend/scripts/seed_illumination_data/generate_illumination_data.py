@@ -1,11 +1,24 @@
 # generate_illumination_data.py
 import os
+import sys
 import json
 import random
-import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+import numpy as np
 from supabase import create_client
 from dotenv import load_dotenv
 
+# make the backend "app" package importable when run from this folder
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.geo.geodesic import haversine, edge_lengths, stack_lines
+from app.geo.segment_store import get_segment_store
+from illumination_io import IlluminationWriter
+
 # Load environment variables
 load_dotenv()
 
@@ -14,72 +27,71 @@ url = os.environ.get("SUPABASE_URL")
 key = os.environ.get("SUPABASE_KEY")
 supabase = create_client(url, key)
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in meters using Haversine formula"""
-    R = 6371000  # Earth's radius in meters
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(delta_lat / 2) ** 2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
-
 def interpolate_point(lat1, lon1, lat2, lon2, fraction):
     """Interpolate a point between two coordinates based on fraction (0-1)"""
     lat = lat1 + (lat2 - lat1) * fraction
     lon = lon1 + (lon2 - lon1) * fraction
     return lat, lon
 
+# Base illumination levels (realistic street lighting) - Updated to 0-1000 range
+BASE_LEVELS = {
+    'very_dark': (1, 50),        # Very dark areas (0-200 range)
+    'dark': (50, 150),           # Dark areas (0-200 range)
+    'dim': (150, 300),           # Dim lighting (200-400 range)
+    'adequate': (300, 500),      # Adequate lighting (200-400 range)
+    'good': (500, 700),          # Good lighting (400-600 range)
+    'bright': (700, 850),        # Bright areas (600-800 range)
+    'very_bright': (850, 1000)   # Very bright areas (800-1000 range)
+}
+
+# Lighting zones along a street (4 equal quarters) and the level weights in each
+ZONE_PATTERNS = [
+    # Zone 1: Start of street (often dimmer)
+    (['very_dark', 'dark', 'dim', 'adequate'], [0.3, 0.4, 0.2, 0.1]),
+    # Zone 2: Middle-dark (mixed lighting)
+    (['dark', 'dim', 'adequate', 'good'], [0.2, 0.4, 0.3, 0.1]),
+    # Zone 3: Middle-bright (main lighting)
+    (['dim', 'adequate', 'good', 'bright'], [0.1, 0.3, 0.4, 0.2]),
+    # Zone 4: End of street (often brighter)
+    (['adequate', 'good', 'bright', 'very_bright'], [0.1, 0.3, 0.4, 0.2])
+]
+
+INTERVAL_METERS = 10
+
+# Segments per vectorized work unit; bounds memory when streaming and balances workers
+SHARD_SEGMENTS = 64
+
+# Columns written by the vectorized generator
+COLUMN_DTYPES = {
+    "lat": np.float64,
+    "lon": np.float64,
+    "lux": np.float32,
+    "segment_id": np.int32,
+    "street_id": np.int32,
+    "barangay_id": np.int32,
+    "point_index": np.int32
+}
+
 def generate_realistic_lux_pattern(segment_length, point_index, total_points):
     """Generate realistic illumination pattern along a street segment"""
     
-    # Base illumination levels (realistic street lighting) - Updated to 0-1000 range
-    base_levels = {
-        'very_dark': (1, 50),        # Very dark areas (0-200 range)
-        'dark': (50, 150),           # Dark areas (0-200 range)
-        'dim': (150, 300),           # Dim lighting (200-400 range)
-        'adequate': (300, 500),      # Adequate lighting (200-400 range)
-        'good': (500, 700),          # Good lighting (400-600 range)
-        'bright': (700, 850),        # Bright areas (600-800 range)
-        'very_bright': (850, 1000)   # Very bright areas (800-1000 range)
-    }
-    
     # Create realistic patterns along the street
     # Simulate different lighting zones
     zone_length = segment_length / 4  # Divide into 4 zones
     
-    if point_index * 10 < zone_length:
-        # Zone 1: Start of street (often dimmer)
-        pattern = random.choices(
-            ['very_dark', 'dark', 'dim', 'adequate'],
-            weights=[0.3, 0.4, 0.2, 0.1]
-        )[0]
-    elif point_index * 10 < zone_length * 2:
-        # Zone 2: Middle-dark (mixed lighting)
-        pattern = random.choices(
-            ['dark', 'dim', 'adequate', 'good'],
-            weights=[0.2, 0.4, 0.3, 0.1]
-        )[0]
-    elif point_index * 10 < zone_length * 3:
-        # Zone 3: Middle-bright (main lighting)
-        pattern = random.choices(
-            ['dim', 'adequate', 'good', 'bright'],
-            weights=[0.1, 0.3, 0.4, 0.2]
-        )[0]
+    if point_index * INTERVAL_METERS < zone_length:
+        zone = 0
+    elif point_index * INTERVAL_METERS < zone_length * 2:
+        zone = 1
+    elif point_index * INTERVAL_METERS < zone_length * 3:
+        zone = 2
     else:
-        # Zone 4: End of street (often brighter)
-        pattern = random.choices(
-            ['adequate', 'good', 'bright', 'very_bright'],
-            weights=[0.1, 0.3, 0.4, 0.2]
-        )[0]
+        zone = 3
+    levels, weights = ZONE_PATTERNS[zone]
+    pattern = random.choices(levels, weights=weights)[0]
     
     # Add some randomness and smooth transitions
-    base_min, base_max = base_levels[pattern]
+    base_min, base_max = BASE_LEVELS[pattern]
     
     # Add gradual transitions between zones
     transition_factor = 1.0
@@ -95,8 +107,8 @@ def generate_realistic_lux_pattern(segment_length, point_index, total_points):
     
     return round(lux, 2)
 
-def generate_illumination_points_along_segment(segment_coords, street_id, barangay_id, segment_length):
-    """Generate illumination data points along a street segment"""
+def generate_illumination_points_along_segment(segment_coords, street_id, barangay_id, segment_length, part_edges=None):
+    """Generate illumination data points along a street segment (part_edges: precomputed edge lengths per line)"""
     data_points = []
     
     if not segment_coords or len(segment_coords) < 2:
@@ -105,35 +117,40 @@ def generate_illumination_points_along_segment(segment_coords, street_id, barang
     # Handle MultiLineString (multiple line segments)
     if isinstance(segment_coords[0][0], list):
         # MultiLineString: process each line segment
-        for line_segment in segment_coords:
+        for k, line_segment in enumerate(segment_coords):
             data_points.extend(generate_points_for_line_segment(
-                line_segment, street_id, barangay_id, segment_length
+                line_segment, street_id, barangay_id, segment_length,
+                part_edges[k] if part_edges else None
             ))
     else:
         # Single LineString
         data_points.extend(generate_points_for_line_segment(
-            segment_coords, street_id, barangay_id, segment_length
+            segment_coords, street_id, barangay_id, segment_length,
+            part_edges[0] if part_edges else None
         ))
     
     return data_points
 
-def generate_points_for_line_segment(coords, street_id, barangay_id, segment_length):
+def generate_points_for_line_segment(coords, street_id, barangay_id, segment_length, edge_distances=None):
     """Generate points for a single line segment"""
     data_points = []
     point_index = 0
     
+    # Callers normally pass the edges measured for all segments at once (edge_lengths)
+    if edge_distances is None:
+        edge_distances = edge_lengths([coords])[0][0]
+    
     for i in range(len(coords) - 1):
         lat1, lon1 = coords[i][1], coords[i][0]  # Convert from [lon, lat] to [lat, lon]
         lat2, lon2 = coords[i + 1][1], coords[i + 1][0]
         
-        # Calculate total distance of this segment
-        segment_distance = calculate_distance(lat1, lon1, lat2, lon2)
+        segment_distance = float(edge_distances[i])
         
         if segment_distance == 0:
             continue
             
         # Calculate number of points needed for this segment (every 10 meters)
-        num_points = int(segment_distance / 10)
+        num_points = int(segment_distance / INTERVAL_METERS)
         
         # Generate points along this segment
         for j in range(num_points + 1):  # +1 to include the end point
@@ -158,7 +175,10 @@ def generate_points_for_line_segment(coords, street_id, barangay_id, segment_len
     return data_points
 
 def load_street_segments():
-    """Load street segments data from JSON file"""
+    """Load street segments from the segment store, or from the JSON file when there is none"""
+    store = get_segment_store()
+    if store is not None:
+        return store.to_segments()
     try:
         with open('street_segments.json', 'r', encoding='utf-8') as f:
             return json.load(f)
@@ -168,6 +188,9 @@ def load_street_segments():
 
 def load_barangays():
     """Load barangays data to filter by allowed barangays"""
+    store = get_segment_store()
+    if store is not None:
+        return store.to_barangays()
     try:
         with open('barangays.json', 'r', encoding='utf-8') as f:
             return json.load(f)
@@ -190,99 +213,308 @@ ALLOWED_BARANGAYS = [
     'San Jose'
 ]
 
-def generate_illumination_data():
-    """Generate illumination data for all street segments"""
-    try:
-        print("🔄 Loading street segments and barangays data...")
-        
-        # Load street segments and barangays
-        street_segments = load_street_segments()
-        barangays = load_barangays()
-        
-        if not street_segments:
-            print("❌ No street segments data found. Please run fetch_street_segments.py first.")
-            return False
-        
-        if not barangays:
-            print("❌ No barangays data found. Please run fetch_barangays.py first.")
-            return False
-        
+def select_segments(all_barangays=False):
+    """Load street segments that have geometry (only the allowed barangays unless all_barangays), or None on error"""
+    print("🔄 Loading street segments and barangays data...")
+    
+    # Load street segments and barangays
+    street_segments = load_street_segments()
+    barangays = load_barangays()
+    
+    if not street_segments:
+        print("❌ No street segments data found. Please run fetch_street_segments.py first.")
+        return None
+    
+    if not barangays:
+        print("❌ No barangays data found. Please run fetch_barangays.py first.")
+        return None
+    
+    print(f"📊 Found {len(street_segments)} street segments")
+    if all_barangays:
+        print(f"📊 Processing all {len(barangays)} barangays")
+        filtered_segments = street_segments
+    else:
         # Get allowed barangay IDs
         allowed_barangay_ids = [b['id'] for b in barangays if b['name'] in ALLOWED_BARANGAYS]
-        print(f"📊 Found {len(street_segments)} street segments")
         print(f"📊 Processing only {len(ALLOWED_BARANGAYS)} allowed barangays: {', '.join(ALLOWED_BARANGAYS)}")
         print(f"📊 Allowed barangay IDs: {allowed_barangay_ids}")
         
         # Filter street segments to only allowed barangays
         filtered_segments = [seg for seg in street_segments if seg.get('barangay_id') in allowed_barangay_ids]
         print(f"📊 Filtered to {len(filtered_segments)} segments in allowed barangays")
+    
+    # Drop segments without geometry
+    segments_with_geometry = []
+    for segment in filtered_segments:
+        geometry = segment.get('segment_geom')
+        if not geometry or not geometry.get('coordinates'):
+            print(f"⚠️  Skipping segment {segment.get('id')} - no geometry data")
+            continue
+        segments_with_geometry.append(segment)
+    
+    return street_segments, segments_with_geometry
+
+class LuxStats:
+    """Running lux distribution of the points written so far"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+    
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+    
+    def report(self):
+        if self.count:
+            print(f"\n📈 Lux Distribution:")
+            print(f"   - Min: {self.min:.1f} lux")
+            print(f"   - Max: {self.max:.1f} lux")
+            print(f"   - Average: {self.total / self.count:.1f} lux")
+        else:
+            print(f"\n⚠️  No illumination data points were generated!")
+
+def generate_illumination_data(output_file="illumination_data.json"):
+    """Generate illumination data for all street segments, writing points as they are produced"""
+    try:
+        selected = select_segments()
+        if selected is None:
+            return False
+        street_segments, segments_with_geometry = selected
         
-        all_illumination_data = []
+        lux_stats = LuxStats()
         
-        for segment in filtered_segments:
-            street_id = segment.get('original_street_id')
-            barangay_id = segment.get('barangay_id')
-            geometry = segment.get('segment_geom')
-            
-            if not geometry or not geometry.get('coordinates'):
-                print(f"⚠️  Skipping segment {segment.get('id')} - no geometry data")
-                continue
-            
-            # Calculate segment length for realistic patterns
-            coords = geometry['coordinates']
-            if isinstance(coords[0][0], list):
-                # MultiLineString
-                total_length = 0
-                for line in coords:
-                    for i in range(len(line) - 1):
-                        lat1, lon1 = line[i][1], line[i][0]
-                        lat2, lon2 = line[i + 1][1], line[i + 1][0]
-                        total_length += calculate_distance(lat1, lon1, lat2, lon2)
-            else:
-                # LineString
-                total_length = 0
-                for i in range(len(coords) - 1):
-                    lat1, lon1 = coords[i][1], coords[i][0]
-                    lat2, lon2 = coords[i + 1][1], coords[i + 1][0]
-                    total_length += calculate_distance(lat1, lon1, lat2, lon2)
-            
-            # Generate illumination points along this segment
-            segment_illumination = generate_illumination_points_along_segment(
-                geometry['coordinates'],
-                street_id,
-                barangay_id,
-                total_length
-            )
-            
-            all_illumination_data.extend(segment_illumination)
-            print(f"   Generated {len(segment_illumination)} points for segment {segment.get('id')}")
+        # Measure all segments in one pass
+        segment_edges = edge_lengths([seg['segment_geom']['coordinates'] for seg in segments_with_geometry])
         
-        # Save to JSON file
-        output_data = {
-            "illumination_data": all_illumination_data,
-            "metadata": {
-                "total_points": len(all_illumination_data),
+        with IlluminationWriter(output_file) as writer:
+            for segment, part_edges in zip(segments_with_geometry, segment_edges):
+                # Segment length for realistic patterns
+                total_length = float(sum(edges.sum() for edges in part_edges))
+                street_id = segment.get('original_street_id')
+                barangay_id = segment.get('barangay_id')
+                geometry = segment.get('segment_geom')
+                
+                # Generate illumination points along this segment
+                segment_illumination = generate_illumination_points_along_segment(
+                    geometry['coordinates'],
+                    street_id,
+                    barangay_id,
+                    total_length,
+                    part_edges
+                )
+                
+                writer.write_many(segment_illumination)
+                lux_stats.add([point['lux'] for point in segment_illumination])
+                print(f"   Generated {len(segment_illumination)} points for segment {segment.get('id')}")
+            
+            writer.close({
                 "total_segments": len(street_segments),
-                "interval_meters": 10,
+                "interval_meters": INTERVAL_METERS,
                 "generated_at": "2024-01-01T00:00:00Z"
-            }
+            })
+        
+        print(f"💾 Generated {lux_stats.count} illumination data points")
+        print(f"📊 Average points per segment: {lux_stats.count / len(segments_with_geometry):.1f}")
+        
+        # Show lux distribution
+        lux_stats.report()
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error generating illumination data: {e}")
+        return False
+
+def generate_points_vectorized(segments, seed, spacing=INTERVAL_METERS):
+    """
+    Interpolate points every `spacing` meters along all segments and draw their lux
+    with the same zone model as generate_realistic_lux_pattern, using array operations.
+    Every segment draws from its own generator seeded with (seed, segment id), so a
+    segment's points do not depend on which other segments are generated with it.
+    Returns a dict of equal-length column arrays.
+    """
+    coords, part_of_vertex, geometry_of_part, part_sizes = stack_lines(
+        [seg['segment_geom']['coordinates'] for seg in segments]
+    )
+    empty = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMN_DTYPES.items()}
+    if len(coords) < 2:
+        return empty
+    
+    # Edges between consecutive vertices of the same line, skipping zero-length ones
+    distances = haversine(coords[:-1, 1], coords[:-1, 0], coords[1:, 1], coords[1:, 0])
+    valid = (part_of_vertex[:-1] == part_of_vertex[1:]) & (distances > 0)
+    edge_start = np.flatnonzero(valid)
+    if not len(edge_start):
+        return empty
+    edge_distance = distances[edge_start]
+    edge_part = part_of_vertex[edge_start]
+    edge_geometry = geometry_of_part[edge_part]
+    
+    # Each edge gets int(distance / spacing) + 1 points, including both ends
+    num_points = (edge_distance / spacing).astype(np.int64)
+    counts = num_points + 1
+    edge_of_point = np.repeat(np.arange(len(edge_start)), counts)
+    first_point = np.cumsum(counts) - counts
+    j = np.arange(len(edge_of_point)) - first_point[edge_of_point]
+    n = num_points[edge_of_point]
+    fraction = np.where(n > 0, j / np.maximum(n, 1), 0.0)
+    
+    start = edge_start[edge_of_point]
+    lon = coords[start, 0] + (coords[start + 1, 0] - coords[start, 0]) * fraction
+    lat = coords[start, 1] + (coords[start + 1, 1] - coords[start, 1]) * fraction
+    
+    # Index of each point within its line part, which drives the zone
+    point_part = edge_part[edge_of_point]
+    part_first_point = np.full(len(part_sizes), len(point_part), dtype=np.int64)
+    np.minimum.at(part_first_point, point_part, np.arange(len(point_part)))
+    point_index = np.arange(len(point_part)) - part_first_point[point_part]
+    
+    # Segment length for realistic patterns
+    segment_length = np.bincount(edge_geometry, weights=edge_distance, minlength=len(segments))
+    zone_length = segment_length[edge_geometry[edge_of_point]] / 4
+    along = point_index * spacing
+    zone = (along >= zone_length).astype(np.int8) + (along >= zone_length * 2) + (along >= zone_length * 3)
+    
+    # Three uniform draws per point (level, value, transition) from each segment's own generator
+    point_geometry = edge_geometry[edge_of_point]
+    counts_per_segment = np.bincount(point_geometry, minlength=len(segments))
+    draws = np.concatenate([
+        np.random.default_rng([seed, seg['id']]).random((3, count))
+        for seg, count in zip(segments, counts_per_segment.tolist())
+    ], axis=1)
+    
+    # Draw each point's level from its zone's weights
+    level_names = list(BASE_LEVELS)
+    zone_levels = np.array([[level_names.index(name) for name in levels] for levels, _ in ZONE_PATTERNS])
+    zone_cumulative = np.cumsum([weights for _, weights in ZONE_PATTERNS], axis=1)
+    choice = (draws[0][:, None] >= zone_cumulative[zone]).sum(axis=1)
+    level = zone_levels[zone, np.minimum(choice, zone_levels.shape[1] - 1)]
+    
+    bounds = np.array([BASE_LEVELS[name] for name in level_names], dtype=float)
+    lux = bounds[level, 0] + (bounds[level, 1] - bounds[level, 0]) * draws[1]
+    
+    # Smooth transitions between points, except at the ends of an edge
+    transition = (point_index > 0) & (point_index < n - 1)
+    lux = np.where(transition, lux * (0.8 + draws[2] * 0.4), lux)
+    
+    # Ensure realistic bounds (0-1000 range)
+    lux = np.round(np.clip(lux, 1, 1000), 2)
+    
+    segment_ids = np.array([seg['id'] for seg in segments])
+    street_ids = np.array([seg.get('original_street_id') or 0 for seg in segments])
+    barangay_ids = np.array([seg.get('barangay_id') or 0 for seg in segments])
+    return {
+        "lat": np.round(lat, 6),
+        "lon": np.round(lon, 6),
+        "lux": lux.astype(COLUMN_DTYPES["lux"]),
+        "segment_id": segment_ids[point_geometry].astype(COLUMN_DTYPES["segment_id"]),
+        "street_id": street_ids[point_geometry].astype(COLUMN_DTYPES["street_id"]),
+        "barangay_id": barangay_ids[point_geometry].astype(COLUMN_DTYPES["barangay_id"]),
+        "point_index": point_index.astype(COLUMN_DTYPES["point_index"])
+    }
+
+def generate_shard(shard_index, segments, seed, spacing):
+    """Process pool task: generate the columns for one contiguous shard of segments"""
+    return shard_index, generate_points_vectorized(segments, seed, spacing)
+
+def iter_columns(segments, seed, spacing=INTERVAL_METERS, workers=1):
+    """
+    Generate columns for all segments in shards of at most SHARD_SEGMENTS segments,
+    spread across `workers` processes, and yield them in segment order.
+    Each segment is seeded on its own, so the output is the same for any worker count.
+    """
+    # a few shards per worker keeps them balanced and progress visible
+    num_shards = max(workers * 4 if workers > 1 else 1, -(-len(segments) // SHARD_SEGMENTS))
+    num_shards = max(1, min(len(segments), num_shards))
+    bounds = np.linspace(0, len(segments), num_shards + 1).astype(int)
+    shards = [segments[bounds[k]:bounds[k + 1]] for k in range(num_shards)]
+    
+    done_segments = 0
+    
+    def progress(shard_index, columns):
+        nonlocal done_segments
+        done_segments += len(shards[shard_index])
+        print(f"   Shard {shard_index + 1}/{num_shards}: {len(columns['lux'])} points "
+              f"({done_segments}/{len(segments)} segments done)")
+    
+    if workers <= 1:
+        for k, shard in enumerate(shards):
+            columns = generate_points_vectorized(shard, seed, spacing)
+            progress(k, columns)
+            yield columns
+        return
+    
+    # yield shards in order; ones that finish early wait in `finished`
+    finished = {}
+    next_shard = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(generate_shard, k, shard, seed, spacing) for k, shard in enumerate(shards)]
+        for future in as_completed(futures):
+            shard_index, columns = future.result()
+            progress(shard_index, columns)
+            finished[shard_index] = columns
+            while next_shard in finished:
+                yield finished.pop(next_shard)
+                next_shard += 1
+
+def generate_illumination_data_vectorized(seed=None, spacing=INTERVAL_METERS, output_file="illumination_data.npz",
+                                          workers=1, all_barangays=False):
+    """
+    Generate illumination data with seeded NumPy RNGs.
+    Saves columns to an .npz file, or streams points to a .json/.ndjson file shard by shard.
+    """
+    try:
+        selected = select_segments(all_barangays)
+        if selected is None:
+            return False
+        street_segments, segments_with_geometry = selected
+        
+        # without a seed pick one, so every run can be reproduced from its metadata
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+        
+        metadata = {
+            "total_segments": len(street_segments),
+            "interval_meters": spacing,
+            "seed": seed,
+            "all_barangays": all_barangays,
+            "generated_at": datetime.now().isoformat()
         }
         
-        with open("illumination_data.json", "w", encoding="utf-8") as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        lux_stats = LuxStats()
+        started = time.perf_counter()
+        shard_columns = iter_columns(segments_with_geometry, seed, spacing, workers)
+        
+        if str(output_file).endswith(".npz"):
+            shards = []
+            for columns in shard_columns:
+                lux_stats.add(columns["lux"])
+                shards.append(columns)
+            columns = {name: np.concatenate([shard[name] for shard in shards]) for name in COLUMN_DTYPES}
+            metadata = {"total_points": lux_stats.count, **metadata}
+            np.savez(output_file, metadata=np.array(json.dumps(metadata)), **columns)
+        else:
+            with IlluminationWriter(output_file) as writer:
+                for columns in shard_columns:
+                    lux_stats.add(columns["lux"])
+                    writer.write_columns(columns)
+                writer.close(metadata)
         
-        print(f"💾 Generated {len(all_illumination_data)} illumination data points")
-        print(f"📊 Average points per segment: {len(all_illumination_data) / len(filtered_segments):.1f}")
+        elapsed = time.perf_counter() - started
+        print(f"⏱️  Generated in {elapsed:.2f}s with {workers} worker(s) ({lux_stats.count / max(elapsed, 1e-9):,.0f} points/s)")
+        print(f"💾 Generated {lux_stats.count} illumination data points")
+        print(f"📊 Average points per segment: {lux_stats.count / max(len(segments_with_geometry), 1):.1f}")
         
         # Show lux distribution
-        if all_illumination_data:
-            lux_values = [point['lux'] for point in all_illumination_data]
-            print(f"\n📈 Lux Distribution:")
-            print(f"   - Min: {min(lux_values):.1f} lux")
-            print(f"   - Max: {max(lux_values):.1f} lux")
-            print(f"   - Average: {sum(lux_values)/len(lux_values):.1f} lux")
-        else:
-            print(f"\n⚠️  No illumination data points were generated!")
+        lux_stats.report()
         
         return True
         
@@ -292,11 +524,41 @@ def generate_illumination_data():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Generate synthetic illumination data along street segments")
+    parser.add_argument("--mode", choices=["legacy", "vectorized"], default="legacy",
+                        help="legacy: illumination_data.json (one dict per point); "
+                             "vectorized: array-based and seeded per segment, for large datasets")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible data")
+    parser.add_argument("--spacing", type=float, default=INTERVAL_METERS,
+                        help="meters between points (vectorized mode)")
+    parser.add_argument("--output", default=None,
+                        help="output file: .json or .ndjson (streamed), or .npz columns in vectorized mode "
+                             "(default illumination_data.json, illumination_data.npz in vectorized mode)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to generate with (vectorized mode, 0 = all CPU cores)")
+    parser.add_argument("--all-barangays", action="store_true",
+                        help="generate for the whole city instead of only ALLOWED_BARANGAYS (vectorized mode)")
+    args = parser.parse_args()
+    
     print("🚀 Starting illumination data generation...")
     
-    if generate_illumination_data():
+    if args.mode == "vectorized":
+        workers = args.workers or os.cpu_count() or 1
+        output_file = args.output or "illumination_data.npz"
+        succeeded = generate_illumination_data_vectorized(args.seed, args.spacing, output_file,
+                                                          workers, args.all_barangays)
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+        output_file = args.output or "illumination_data.json"
+        if output_file.endswith(".npz"):
+            print("❌ .npz output needs --mode vectorized")
+            return False
+        succeeded = generate_illumination_data(output_file)
+    
+    if succeeded:
         print("🎉 Illumination data generation completed successfully!")
-        print("📁 Data saved to illumination_data.json")
+        print(f"📁 Data saved to {output_file}")
     else:
         print("❌ Illumination data generation failed!")
         return False
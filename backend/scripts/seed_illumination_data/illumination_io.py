@@ -0,0 +1,177 @@
+# illumination_io.py
+# Streaming writer and reader for illumination data files.
+#
+# Two formats:
+# - json:   {"illumination_data": [...], "metadata": {...}} as read by illumination_editor.html.
+#           Points are written one per line as they are produced; metadata goes last.
+# - ndjson: one point per line, followed by a final {"metadata": {...}} line.
+# - npz:    read only; the vectorized generator's columns (arrays are loaded,
+#           point dicts are built a chunk at a time).
+#
+# For json and ndjson neither the writer nor the reader holds more than one chunk in memory.
+import json
+
+READ_CHUNK_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+
+
+def format_for_path(path):
+    """Pick the format from the file extension"""
+    return "ndjson" if str(path).endswith((".ndjson", ".jsonl")) else "json"
+
+
+class IlluminationWriter:
+    """Incrementally writes illumination points to a json or ndjson file"""
+
+    def __init__(self, path, format=None):
+        self.path = path
+        self.format = format or format_for_path(path)
+        self.total_points = 0
+        self._file = open(path, "w", encoding="utf-8")
+        if self.format == "json":
+            self._file.write('{\n  "illumination_data": [')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._file:
+            return
+        if exc_type is None:
+            self.close()
+        else:
+            # leave the unfinished file unterminated rather than looking complete
+            self._file.close()
+            self._file = None
+
+    def _write_line(self, line):
+        if self.format == "json":
+            self._file.write(("\n    " if self.total_points == 0 else ",\n    ") + line)
+        else:
+            self._file.write(line + "\n")
+        self.total_points += 1
+
+    def write(self, point):
+        """Write one point dict"""
+        self._write_line(json.dumps(point, ensure_ascii=False))
+
+    def write_many(self, points):
+        """Write an iterable of point dicts"""
+        for point in points:
+            self.write(point)
+
+    def write_columns(self, columns):
+        """
+        Write points from the column arrays of the vectorized generator
+        (lat, lon, lux, street_id, barangay_id, point_index) in the same schema as write().
+        """
+        rows = zip(columns["street_id"].tolist(), columns["barangay_id"].tolist(),
+                   columns["point_index"].tolist(), columns["lat"].tolist(), columns["lon"].tolist(),
+                   columns["lux"].astype(float).round(2).tolist())
+        for street_id, barangay_id, point_index, lat, lon, lux in rows:
+            self._write_line(
+                f'{{"id": "{street_id}_{barangay_id}_{point_index}", "lat": {lat!r}, "lon": {lon!r}, '
+                f'"lux": {lux!r}, "street_id": {street_id}, "barangay_id": {barangay_id}}}'
+            )
+
+    def close(self, metadata=None):
+        """Finish the file; metadata defaults to {"total_points": ...}"""
+        metadata = {"total_points": self.total_points, **(metadata or {})}
+        if self.format == "json":
+            self._file.write('\n  ],\n  "metadata": ')
+            self._file.write(json.dumps(metadata, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+            self._file.write("\n}\n")
+        else:
+            self._file.write(json.dumps({"metadata": metadata}, ensure_ascii=False) + "\n")
+        self._file.close()
+        self._file = None
+
+
+def _iter_ndjson(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        if "metadata" in record and "lux" not in record:
+            continue
+        yield record
+
+
+def _iter_json_array(f, buffer):
+    """Yield the elements of a JSON array whose '[' has just been consumed from buffer"""
+    pos = 0
+    while True:
+        # skip separators, reading more when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                break
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("Unexpected end of file inside illumination_data")
+            buffer, pos = chunk, 0
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            point, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # the element continues in the next chunk
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield point
+        pos = end
+
+
+def _iter_json(f):
+    buffer = ""
+    # find the start of the points array: a bare list or the "illumination_data" key
+    while True:
+        chunk = f.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        buffer += chunk
+        stripped = buffer.lstrip()
+        if stripped.startswith("["):
+            yield from _iter_json_array(f, stripped[1:])
+            return
+        key = buffer.find('"illumination_data"')
+        if key >= 0:
+            bracket = buffer.find("[", key)
+            if bracket >= 0:
+                yield from _iter_json_array(f, buffer[bracket + 1:])
+                return
+
+
+def _iter_npz(path, chunk_size=READ_CHUNK_SIZE):
+    """Points from the vectorized generator's .npz columns, converted a chunk at a time"""
+    import numpy as np
+
+    with np.load(path) as columns:
+        names = ("street_id", "barangay_id", "point_index", "lat", "lon", "lux")
+        data = {name: columns[name] for name in names}
+    for start in range(0, len(data["lux"]), chunk_size):
+        chunk = {name: data[name][start:start + chunk_size] for name in names}
+        rows = zip(chunk["street_id"].tolist(), chunk["barangay_id"].tolist(), chunk["point_index"].tolist(),
+                   chunk["lat"].tolist(), chunk["lon"].tolist(), chunk["lux"].astype(float).round(2).tolist())
+        for street_id, barangay_id, point_index, lat, lon, lux in rows:
+            yield {"id": f"{street_id}_{barangay_id}_{point_index}", "lat": lat, "lon": lon, "lux": lux,
+                   "street_id": street_id, "barangay_id": barangay_id}
+
+
+def iter_illumination_points(path):
+    """Yield illumination point dicts from a json, ndjson or .npz file without loading it whole"""
+    if str(path).endswith(".npz"):
+        yield from _iter_npz(path)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        if format_for_path(path) == "ndjson":
+            yield from _iter_ndjson(f)
+        else:
+            yield from _iter_json(f)
@@ -0,0 +1,219 @@
+# load_illumination_data.py
+# Bulk loads generated illumination data (illumination_data.json, .ndjson or
+# .npz) into the illumination_points table (sql/illumination_points.sql).
+# Points are streamed from the file and upserted in chunks, a few chunks at a
+# time, with retry and backoff. Rows are keyed by (dataset, ordinal): the
+# dataset name (--dataset, the file name by default) and the point's position
+# in the file. The generator's ids repeat across segment parts, so they are
+# stored but are not unique. Every row carries the load_id of the load that
+# wrote it; once a load completes, rows of the dataset from other loads (a
+# longer earlier file) are deleted, so the dataset mirrors the file.
+# Progress is checkpointed to <input>.load.json as the last loaded ordinal,
+# so an interrupted load resumes where it stopped.
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from postgrest import ReturnMethod
+from supabase import create_client
+from dotenv import load_dotenv
+from illumination_io import iter_illumination_points
+
+# Load environment variables
+load_dotenv()
+
+# Initialize Supabase client
+url = os.environ.get("SUPABASE_URL")
+key = os.environ.get("SUPABASE_KEY")
+supabase = create_client(url, key)
+
+TABLE = "illumination_points"
+REPORT_INTERVAL_SECONDS = 5
+
+
+def to_row(dataset, ordinal, load_id, point):
+    """illumination_points row for the ordinal-th point of a dataset"""
+    return {
+        "dataset": dataset,
+        "ordinal": ordinal,
+        "point_id": point["id"],
+        "lat": point["lat"],
+        "lon": point["lon"],
+        "lux": point["lux"],
+        "street_id": point.get("street_id"),
+        "barangay_id": point.get("barangay_id"),
+        "load_id": load_id
+    }
+
+
+def iter_chunks(points, chunk_size, dataset, load_id, resume_after=-1):
+    """Group the points after ordinal resume_after into (chunk index, rows) lists"""
+    chunk = []
+    index = 0
+    for ordinal, point in enumerate(points):
+        if ordinal <= resume_after:
+            continue
+        chunk.append(to_row(dataset, ordinal, load_id, point))
+        if len(chunk) == chunk_size:
+            yield index, chunk
+            chunk = []
+            index += 1
+    if chunk:
+        yield index, chunk
+
+
+class Checkpoint:
+    """
+    Load progress for one input file: every point up to ordinal loaded_through is in the database.
+    Chunks finish out of order, so the mark only advances over a contiguous run of finished chunks.
+    """
+
+    def __init__(self, input_file, dataset, restart=False):
+        self.path = f"{input_file}.load.json"
+        stat = os.stat(input_file)
+        self.source = {"input": os.path.abspath(input_file), "size": stat.st_size,
+                       "mtime": stat.st_mtime, "dataset": dataset}
+        self.load_id = uuid.uuid4().hex
+        self.loaded_through = -1
+        self.rows = 0
+        self._completed_chunks = -1
+        self._finished = {}
+
+        if not restart and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("source") == self.source and "loaded_through" in saved:
+                self.load_id = saved["load_id"]
+                self.loaded_through = saved["loaded_through"]
+                self.rows = saved["rows"]
+            else:
+                print("⚠️  Input file or dataset changed since the last load, starting over")
+
+    def finish(self, index, rows, last_ordinal):
+        """Record a loaded chunk and persist the mark if it moved"""
+        self._finished[index] = (rows, last_ordinal)
+        moved = False
+        while self._completed_chunks + 1 in self._finished:
+            self._completed_chunks += 1
+            rows, self.loaded_through = self._finished.pop(self._completed_chunks)
+            self.rows += rows
+            moved = True
+        if moved:
+            self.save()
+
+    def save(self, done=False):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "load_id": self.load_id, "loaded_through": self.loaded_through,
+                       "rows": self.rows, "done": done}, f)
+        os.replace(tmp, self.path)
+
+
+def upsert_chunk(rows, max_retries):
+    """Upsert one chunk, retrying with exponential backoff and jitter"""
+    for attempt in range(max_retries + 1):
+        try:
+            supabase.table(TABLE).upsert(rows, on_conflict="dataset,ordinal", returning=ReturnMethod.minimal).execute()
+            return
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = min(60, 2 ** attempt) * (0.5 + random.random())
+            print(f"⚠️  Chunk upsert failed ({e}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def delete_stale_rows(dataset, load_id):
+    """Remove the dataset's rows written by other loads, i.e. points past the end of this file"""
+    response = supabase.table(TABLE).delete(count="exact", returning=ReturnMethod.minimal) \
+        .eq("dataset", dataset).neq("load_id", load_id).execute()
+    return response.count or 0
+
+
+def load_illumination_data(input_file, chunk_size, concurrency, max_retries, restart=False, dataset=None):
+    """Stream input_file into the database; returns True when every chunk is loaded"""
+    dataset = dataset or os.path.splitext(os.path.basename(input_file))[0]
+    checkpoint = Checkpoint(input_file, dataset, restart)
+    if checkpoint.loaded_through >= 0:
+        print(f"⏩ Resuming dataset '{dataset}' after point {checkpoint.loaded_through} "
+              f"({checkpoint.rows} rows already loaded)")
+
+    started = time.perf_counter()
+    last_report = started
+    loaded_rows = 0
+    failed = None
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def collect(done):
+            nonlocal loaded_rows, failed
+            for future in done:
+                index, count, last_ordinal = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    failed = failed or f"chunk {index}: {e}"
+                    continue
+                loaded_rows += count
+                checkpoint.finish(index, count, last_ordinal)
+
+        chunks = iter_chunks(iter_illumination_points(input_file), chunk_size, dataset, checkpoint.load_id,
+                             checkpoint.loaded_through)
+        for index, rows in chunks:
+            # bounded: never read further ahead than `concurrency` chunks
+            while len(in_flight) >= concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            if failed:
+                break
+            in_flight[pool.submit(upsert_chunk, rows, max_retries)] = (index, len(rows), rows[-1]["ordinal"])
+
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL_SECONDS:
+                print(f"   {checkpoint.rows} rows loaded ({loaded_rows / (now - started):,.0f} rows/s)")
+                last_report = now
+
+        collect(wait(in_flight).done)
+
+    elapsed = time.perf_counter() - started
+    print(f"📊 Loaded {loaded_rows} rows in {elapsed:.1f}s ({loaded_rows / max(elapsed, 1e-9):,.0f} rows/s), "
+          f"{checkpoint.rows} rows in total")
+
+    if failed:
+        print(f"❌ Stopped after {max_retries} retries on {failed}")
+        print(f"💾 Progress saved to {checkpoint.path}, run again to resume")
+        return False
+
+    stale = delete_stale_rows(dataset, checkpoint.load_id)
+    if stale:
+        print(f"🧹 Removed {stale} row(s) of dataset '{dataset}' that are no longer in the file")
+    checkpoint.save(done=True)
+    return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Bulk load generated illumination data into Supabase")
+    parser.add_argument("--input", default="illumination_data.json", help="json, ndjson or npz file from the generator")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="rows per upsert")
+    parser.add_argument("--concurrency", type=int, default=4, help="upserts in flight")
+    parser.add_argument("--max-retries", type=int, default=5, help="retries per chunk before stopping")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and load from the start")
+    parser.add_argument("--dataset", default=None, help="dataset name the rows are stored under (default: file name)")
+    args = parser.parse_args()
+
+    print(f"🚀 Starting illumination data load from {args.input}...")
+
+    if load_illumination_data(args.input, args.chunk_size, args.concurrency, args.max_retries, args.restart, args.dataset):
+        print("🎉 Illumination data load completed successfully!")
+    else:
+        print("❌ Illumination data load failed!")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    main()
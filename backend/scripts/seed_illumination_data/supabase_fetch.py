@@ -0,0 +1,148 @@
+# supabase_fetch.py
+# Shared fetch layer for the seed fetch scripts.
+#
+# - fetch_table(): pages through a table by id range, several ranges at once,
+#   and checks the row count so nothing is silently cut off at the PostgREST
+#   row cap (max-rows, 1000 by default).
+# - sync_table(): keeps a local JSON cache up to date. After the first full
+#   fetch only rows with updated_at after the stored watermark (less a safety
+#   margin) are pulled and merged in; rows deleted upstream are dropped using
+#   a cheap id listing.
+#   Needs sql/reference_data_sync.sql, otherwise it does a full fetch.
+import os
+import json
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_SIZE = 1000
+CONCURRENCY = 4
+# updated_at is now() at transaction start, so a transaction that commits after
+# a sync can carry an older timestamp than the watermark; re-fetch this far back
+# (merging by id makes the overlap harmless)
+WATERMARK_MARGIN = timedelta(minutes=10)
+
+
+def _id_bounds(client, table, filters):
+    """(min id, max id, row count) of the rows matching filters, or None when there are none"""
+    def query(columns, **kwargs):
+        builder = client.table(table).select(columns, **kwargs)
+        for apply in filters:
+            builder = apply(builder)
+        return builder
+
+    first = query("id", count="exact").order("id").limit(1).execute()
+    if not first.data:
+        return None
+    last = query("id").order("id", desc=True).limit(1).execute()
+    return first.data[0]["id"], last.data[0]["id"], first.count
+
+
+def _count_through(client, table, filters, max_id):
+    """Number of rows matching filters with id <= max_id"""
+    builder = client.table(table).select("id", count="exact").lte("id", max_id)
+    for apply in filters:
+        builder = apply(builder)
+    return builder.limit(1).execute().count
+
+
+def _fetch_range(client, table, columns, filters, low, high, page_size):
+    """All rows with low <= id < high, continuing after the last id if a page comes back full"""
+    rows = []
+    while True:
+        builder = client.table(table).select(columns).gte("id", low).lt("id", high)
+        for apply in filters:
+            builder = apply(builder)
+        page = builder.order("id").limit(page_size).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        low = page[-1]["id"] + 1
+
+
+def fetch_table(client, table, columns="*", filters=(), page_size=PAGE_SIZE, concurrency=CONCURRENCY):
+    """
+    Fetch every row of a table (matching optional filters) ordered by id.
+    The id range is split into about one range per page_size rows, fetched
+    concurrently; page_size must not exceed the server's max-rows.
+    filters are functions applied to each query builder, e.g. lambda q: q.gte("updated_at", ts).
+    """
+    bounds = _id_bounds(client, table, filters)
+    if bounds is None:
+        return []
+    min_id, max_id, expected = bounds
+
+    # about one page per range; ranges that turn out denser continue by keyset in _fetch_range
+    num_ranges = max(1, -(-expected // page_size)) if expected else 1
+    span = max(page_size, -(-(max_id - min_id + 1) // num_ranges))
+    ranges = [(low, min(low + span, max_id + 1)) for low in range(min_id, max_id + 1, span)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pages = pool.map(lambda r: _fetch_range(client, table, columns, filters, r[0], r[1], page_size), ranges)
+        rows = [row for page in pages for row in page]
+
+    # fewer rows than counted means either rows were deleted while fetching or pages were cut
+    # off at max-rows; new rows get ids above max_id, so a recount up to it tells the two apart
+    if expected is not None and len(rows) < expected:
+        remaining = _count_through(client, table, filters, max_id)
+        if remaining is None or len(rows) < remaining:
+            raise RuntimeError(f"Fetched {len(rows)} of {expected} {table} rows - "
+                               f"is page_size ({page_size}) larger than the server's max-rows?")
+        print(f"⚠️  {expected - len(rows)} {table} row(s) were deleted while fetching")
+    print(f"   Fetched {len(rows)} {table} rows in {len(ranges)} id range(s)")
+    return rows
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(path, data, indent=2):
+    """Write through a temporary file so an interrupted run never leaves a partial cache"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def sync_table(client, table, cache_file, full=False, watermark_column="updated_at",
+               page_size=PAGE_SIZE, concurrency=CONCURRENCY):
+    """
+    Bring cache_file (a JSON list of rows) up to date with the table and return the rows.
+    The watermark is kept next to the cache in <cache_file>.sync.json.
+    """
+    state_file = f"{cache_file}.sync.json"
+    state = _load_json(state_file, {})
+    cached = _load_json(cache_file, None)
+    watermark = state.get("watermark")
+
+    rows = None
+    if not full and cached is not None and watermark:
+        try:
+            since = (_parse_timestamp(watermark) - WATERMARK_MARGIN).isoformat()
+            changed = fetch_table(client, table, filters=[lambda q: q.gte(watermark_column, since)],
+                                  page_size=page_size, concurrency=concurrency)
+            live_ids = {row["id"] for row in fetch_table(client, table, columns="id",
+                                                         page_size=page_size, concurrency=concurrency)}
+            deleted = {row["id"] for row in cached} - live_ids
+            merged = {row["id"]: row for row in cached if row["id"] not in deleted}
+            merged.update((row["id"], row) for row in changed)
+            rows = sorted(merged.values(), key=lambda row: row["id"])
+            print(f"🔄 Incremental sync of {table}: {len(changed)} changed since {since}, {len(deleted)} deleted")
+        except Exception as e:
+            print(f"⚠️  Incremental sync of {table} failed ({e}), doing a full fetch")
+
+    if rows is None:
+        rows = fetch_table(client, table, page_size=page_size, concurrency=concurrency)
+
+    _save_json(cache_file, rows)
+    # next sync starts WATERMARK_MARGIN before the newest change seen (--full re-downloads everything)
+    stamps = [row[watermark_column] for row in rows if row.get(watermark_column)]
+    newest = max(stamps, key=_parse_timestamp) if stamps else None
+    _save_json(state_file, {"table": table, "watermark": newest, "rows": len(rows)})
+    return rows
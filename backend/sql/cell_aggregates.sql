@@ -0,0 +1,116 @@
+-- cell_aggregates.sql
+-- Per-geohash-cell illumination aggregates kept by the API
+-- (app/services/cell_aggregates.py). Every worker sends the changes it
+-- accumulated since its last flush; merge_cell_aggregates adds them to the
+-- stored totals, so workers never overwrite each other.
+-- The same readings are kept at several precisions (one per map zoom band,
+-- CELL_PYRAMID_LEVELS); scripts/seed_illumination_data/build_cell_pyramid.py
+-- rebuilds them from sensor_data into cell_aggregates_rebuild, and
+-- finish_cell_aggregates_rebuild swaps the rebuilt precisions in in one
+-- transaction. While a rebuild runs (a row in aggregate_rebuilds), the
+-- workers' merges go to both tables, so none are lost by the swap.
+
+create table if not exists public.cell_aggregates (
+    precision smallint not null,
+    cell bigint not null,
+    geohash text not null,
+    lat double precision not null,
+    lon double precision not null,
+    latest_lux real not null,
+    latest_at timestamptz not null,
+    reading_count bigint not null default 0,
+    lux_sum double precision not null default 0,
+    min_lux real not null,
+    max_lux real not null,
+    updated_at timestamptz not null default now(),
+    primary key (precision, cell)
+);
+
+create table if not exists public.cell_aggregates_rebuild (like public.cell_aggregates including all);
+
+create table if not exists public.aggregate_rebuilds (
+    target text primary key,
+    started_at timestamptz not null default now()
+);
+
+-- p_cells: [{cell, geohash, lat, lon, latest_lux, latest_at, reading_count, lux_sum, min_lux, max_lux}, ...]
+create or replace function public.merge_cell_aggregates_into(p_table regclass, p_precision smallint, p_cells jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    execute format($merge$
+        insert into %s as a
+            (precision, cell, geohash, lat, lon, latest_lux, latest_at, reading_count, lux_sum, min_lux, max_lux)
+        select $1, c.cell, c.geohash, c.lat, c.lon, c.latest_lux, c.latest_at, c.reading_count, c.lux_sum,
+               c.min_lux, c.max_lux
+        from jsonb_to_recordset($2) as c(
+            cell bigint, geohash text, lat double precision, lon double precision, latest_lux real,
+            latest_at timestamptz, reading_count bigint, lux_sum double precision, min_lux real, max_lux real
+        )
+        on conflict (precision, cell) do update
+            set reading_count = a.reading_count + excluded.reading_count,
+                lux_sum = a.lux_sum + excluded.lux_sum,
+                min_lux = least(a.min_lux, excluded.min_lux),
+                max_lux = greatest(a.max_lux, excluded.max_lux),
+                latest_lux = case when excluded.latest_at >= a.latest_at then excluded.latest_lux else a.latest_lux end,
+                latest_at = greatest(a.latest_at, excluded.latest_at),
+                updated_at = now()
+    $merge$, p_table) using p_precision, p_cells;
+end;
+$$;
+
+create or replace function public.merge_cell_aggregates(p_precision smallint, p_cells jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    perform public.merge_cell_aggregates_into('public.cell_aggregates', p_precision, p_cells);
+    if exists (select 1 from public.aggregate_rebuilds where target = 'cell_aggregates') then
+        perform public.merge_cell_aggregates_into('public.cell_aggregates_rebuild', p_precision, p_cells);
+    end if;
+end;
+$$;
+
+create or replace function public.begin_cell_aggregates_rebuild()
+returns void
+language sql
+as $$
+    truncate public.cell_aggregates_rebuild;
+    insert into public.aggregate_rebuilds (target) values ('cell_aggregates')
+        on conflict (target) do update set started_at = now();
+$$;
+
+create or replace function public.stage_cell_aggregates(p_precision smallint, p_cells jsonb)
+returns void
+language sql
+as $$
+    select public.merge_cell_aggregates_into('public.cell_aggregates_rebuild', p_precision, p_cells);
+$$;
+
+-- Replace the given precisions of cell_aggregates with the rebuilt cells; returns the number swapped in
+create or replace function public.finish_cell_aggregates_rebuild(p_precisions smallint[])
+returns bigint
+language plpgsql
+as $$
+declare
+    swapped bigint;
+begin
+    lock table public.cell_aggregates, public.cell_aggregates_rebuild in exclusive mode;
+    delete from public.cell_aggregates where precision = any(p_precisions);
+    insert into public.cell_aggregates
+        select * from public.cell_aggregates_rebuild where precision = any(p_precisions);
+    get diagnostics swapped = row_count;
+    truncate public.cell_aggregates_rebuild;
+    delete from public.aggregate_rebuilds where target = 'cell_aggregates';
+    return swapped;
+end;
+$$;
+
+create or replace function public.cancel_cell_aggregates_rebuild()
+returns void
+language sql
+as $$
+    delete from public.aggregate_rebuilds where target = 'cell_aggregates';
+    truncate public.cell_aggregates_rebuild;
+$$;
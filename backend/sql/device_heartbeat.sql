@@ -0,0 +1,30 @@
+-- device_heartbeat.sql
+-- Single round-trip upsert used by POST /api/v1/device-online.
+-- New devices are inserted with installed_at = last_seen and data_points_collected = 0.
+-- Existing devices only get status, last_seen and (when given) battery_level updated,
+-- so installed_at and data_points_collected keep their values.
+-- Returns the resulting row as JSON plus "created": true when the row was inserted.
+
+create or replace function public.device_heartbeat(
+    p_device_id integer,
+    p_name text,
+    p_status text,
+    p_last_seen timestamp,
+    p_battery_level integer default null
+)
+returns jsonb
+language sql
+as $$
+    with upserted as (
+        insert into public.sensor_devices as d
+            (device_id, name, status, last_seen, installed_at, battery_level, data_points_collected)
+        values
+            (p_device_id, p_name, p_status, p_last_seen, p_last_seen, p_battery_level, 0)
+        on conflict (device_id) do update
+            set status = excluded.status,
+                last_seen = excluded.last_seen,
+                battery_level = coalesce(excluded.battery_level, d.battery_level)
+        returning d.*, (d.xmax = 0) as created
+    )
+    select to_jsonb(upserted) from upserted;
+$$;
@@ -0,0 +1,27 @@
+-- illumination_points.sql
+-- Generated illumination points loaded by
+-- scripts/seed_illumination_data/load_illumination_data.py.
+-- Rows are keyed by (dataset, ordinal): the dataset a file is loaded as and
+-- the point's position in that file, so reloading a file upserts instead of
+-- duplicating. load_id marks the load that wrote a row; after a complete load
+-- the dataset's rows from other loads are deleted. point_id is the
+-- generator's "<street_id>_<barangay_id>_<index>" id; the index restarts for
+-- every segment part, so it is kept for reference only and is not unique.
+
+create table if not exists public.illumination_points (
+    dataset text not null,
+    ordinal bigint not null,
+    point_id text not null,
+    lat double precision not null,
+    lon double precision not null,
+    lux real not null,
+    street_id integer,
+    barangay_id integer,
+    load_id text not null,
+    loaded_at timestamptz not null default now(),
+    primary key (dataset, ordinal)
+);
+
+create index if not exists illumination_points_barangay_id_idx on public.illumination_points (barangay_id);
+create index if not exists illumination_points_street_id_idx on public.illumination_points (street_id);
+create index if not exists illumination_points_dataset_load_id_idx on public.illumination_points (dataset, load_id);
@@ -0,0 +1,55 @@
+-- lux_sketches.sql
+-- Per-night lux quantile sketches kept by the API (app/services/lux_sketches.py)
+-- for the whole city (dimension 'city', key 'all'), each barangay (key = name)
+-- and each street segment (key = street_segments.id).
+-- Every worker upserts its own row per (dimension, key, night); queries merge
+-- the rows of all instances over the requested nights. Instance ids change on
+-- restart, so the leader merges the rows of old nights into one row per
+-- (dimension, key, night) with instance_id 'compacted' (compact_lux_sketches).
+-- sketch is a base64 DDSketch (see DDSketch.to_bytes for the layout).
+
+create table if not exists public.lux_sketches (
+    dimension text not null,
+    key text not null,
+    night date not null,
+    instance_id text not null,
+    sketch text not null,
+    reading_count bigint not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (dimension, key, night, instance_id)
+);
+
+create index if not exists lux_sketches_night_idx on public.lux_sketches (night);
+
+-- Swap merged sketches in for the rows they were merged from, in one transaction.
+-- Fails (and changes nothing) if a source row was updated or removed after it was read.
+create or replace function public.compact_lux_sketches(p_compacted jsonb, p_sources jsonb)
+returns void
+language plpgsql
+as $$
+declare
+    removed bigint;
+begin
+    delete from public.lux_sketches l
+    using jsonb_to_recordset(p_sources) as s(
+        dimension text, key text, night date, instance_id text, updated_at timestamptz
+    )
+    where l.dimension = s.dimension and l.key = s.key and l.night = s.night
+      and l.instance_id = s.instance_id and l.updated_at = s.updated_at;
+    get diagnostics removed = row_count;
+    if removed <> jsonb_array_length(p_sources) then
+        raise exception 'lux_sketches changed while compacting (% of % rows matched)',
+            removed, jsonb_array_length(p_sources);
+    end if;
+
+    insert into public.lux_sketches as l (dimension, key, night, instance_id, sketch, reading_count, updated_at)
+    select c.dimension, c.key, c.night, 'compacted', c.sketch, c.reading_count, now()
+    from jsonb_to_recordset(p_compacted) as c(
+        dimension text, key text, night date, sketch text, reading_count bigint
+    )
+    on conflict (dimension, key, night, instance_id) do update
+        set sketch = excluded.sketch,
+            reading_count = excluded.reading_count,
+            updated_at = excluded.updated_at;
+end;
+$$;
@@ -0,0 +1,38 @@
+-- reference_data_sync.sql
+-- updated_at watermarks for the reference tables, so the seed fetch scripts
+-- (scripts/seed_illumination_data/supabase_fetch.py) can pull only rows
+-- changed since their last sync. Without this they fall back to a full fetch.
+--
+-- now() is the transaction start time, so a row can commit with an updated_at
+-- older than a sync that already ran; the scripts re-fetch a safety margin
+-- (WATERMARK_MARGIN) before their watermark to pick such rows up.
+
+create or replace function public.touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+alter table public.barangays add column if not exists updated_at timestamptz not null default now();
+alter table public.streets add column if not exists updated_at timestamptz not null default now();
+alter table public.street_segments add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists barangays_touch_updated_at on public.barangays;
+create trigger barangays_touch_updated_at before update on public.barangays
+    for each row execute function public.touch_updated_at();
+
+drop trigger if exists streets_touch_updated_at on public.streets;
+create trigger streets_touch_updated_at before update on public.streets
+    for each row execute function public.touch_updated_at();
+
+drop trigger if exists street_segments_touch_updated_at on public.street_segments;
+create trigger street_segments_touch_updated_at before update on public.street_segments
+    for each row execute function public.touch_updated_at();
+
+create index if not exists barangays_updated_at_idx on public.barangays (updated_at);
+create index if not exists streets_updated_at_idx on public.streets (updated_at);
+create index if not exists street_segments_updated_at_idx on public.street_segments (updated_at);
@@ -0,0 +1,40 @@
+-- scheduler_lease.sql
+-- Lease rows used for leader election between API replicas on different hosts
+-- (LEADER_ELECTION_BACKEND=lease). Only the holder of a lease runs the task it names.
+
+create table if not exists public.scheduler_leases (
+    name text primary key,
+    holder text not null,
+    expires_at timestamptz not null
+);
+
+-- Take the lease if it is free or expired, or renew it if p_holder already holds it.
+-- Returns the holder after the attempt.
+create or replace function public.acquire_scheduler_lease(
+    p_name text,
+    p_holder text,
+    p_ttl_seconds double precision
+)
+returns text
+language sql
+as $$
+    insert into public.scheduler_leases as l (name, holder, expires_at)
+    values (p_name, p_holder, now() + make_interval(secs => p_ttl_seconds))
+    on conflict (name) do update
+        set holder = excluded.holder,
+            expires_at = excluded.expires_at
+        where l.holder = excluded.holder or l.expires_at < now();
+
+    select holder from public.scheduler_leases where name = p_name;
+$$;
+
+-- Give the lease up immediately so another replica can take over.
+create or replace function public.release_scheduler_lease(
+    p_name text,
+    p_holder text
+)
+returns void
+language sql
+as $$
+    delete from public.scheduler_leases where name = p_name and holder = p_holder;
+$$;
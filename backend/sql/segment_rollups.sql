@@ -0,0 +1,124 @@
+-- segment_rollups.sql
+-- Per-street-segment illumination statistics kept by the API
+-- (app/services/segment_rollups.py), keyed by street_segments.id with the
+-- segment's original_street_id. Workers send the changes since their last
+-- flush; merge_segment_rollups adds them to the stored totals.
+-- covered_bits has one bit per COVERAGE_BIN_METERS of the segment (bin 0
+-- first), set when the bin has a reading. Rebuild from sensor_data with
+-- scripts/seed_illumination_data/build_segment_rollups.py: it fills
+-- segment_rollups_rebuild, and finish_segment_rollups_rebuild swaps it in in
+-- one transaction. While a rebuild runs (a row in aggregate_rebuilds), the
+-- workers' merges go to both tables, so none are lost by the swap.
+
+create table if not exists public.segment_rollups (
+    segment_id integer primary key,
+    street_id integer,
+    barangay_id integer,
+    reading_count bigint not null default 0,
+    lux_sum double precision not null default 0,
+    min_lux real,
+    under_10_count bigint not null default 0,
+    under_20_count bigint not null default 0,
+    coverage_bins integer not null,
+    covered_bits varbit not null,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists segment_rollups_street_id_idx on public.segment_rollups (street_id);
+
+create table if not exists public.segment_rollups_rebuild (like public.segment_rollups including all);
+
+create table if not exists public.aggregate_rebuilds (
+    target text primary key,
+    started_at timestamptz not null default now()
+);
+
+-- p_rollups: [{segment_id, street_id, barangay_id, coverage_bins, reading_count, lux_sum, min_lux,
+--              under_10_count, under_20_count, covered_bits}, ...]
+create or replace function public.merge_segment_rollups_into(p_table regclass, p_rollups jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    execute format($merge$
+        insert into %s as r
+            (segment_id, street_id, barangay_id, coverage_bins, reading_count, lux_sum, min_lux,
+             under_10_count, under_20_count, covered_bits)
+        select d.segment_id, d.street_id, d.barangay_id, d.coverage_bins, d.reading_count, d.lux_sum, d.min_lux,
+               d.under_10_count, d.under_20_count, d.covered_bits::varbit
+        from jsonb_to_recordset($1) as d(
+            segment_id integer, street_id integer, barangay_id integer, coverage_bins integer,
+            reading_count bigint, lux_sum double precision, min_lux real,
+            under_10_count bigint, under_20_count bigint, covered_bits text
+        )
+        on conflict (segment_id) do update
+            set street_id = excluded.street_id,
+                barangay_id = excluded.barangay_id,
+                reading_count = r.reading_count + excluded.reading_count,
+                lux_sum = r.lux_sum + excluded.lux_sum,
+                min_lux = least(r.min_lux, excluded.min_lux),
+                under_10_count = r.under_10_count + excluded.under_10_count,
+                under_20_count = r.under_20_count + excluded.under_20_count,
+                -- a rebuilt segment with a new length starts its coverage over
+                coverage_bins = excluded.coverage_bins,
+                covered_bits = case when r.coverage_bins = excluded.coverage_bins
+                                    then r.covered_bits | excluded.covered_bits
+                                    else excluded.covered_bits end,
+                updated_at = now()
+    $merge$, p_table) using p_rollups;
+end;
+$$;
+
+create or replace function public.merge_segment_rollups(p_rollups jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    perform public.merge_segment_rollups_into('public.segment_rollups', p_rollups);
+    if exists (select 1 from public.aggregate_rebuilds where target = 'segment_rollups') then
+        perform public.merge_segment_rollups_into('public.segment_rollups_rebuild', p_rollups);
+    end if;
+end;
+$$;
+
+create or replace function public.begin_segment_rollups_rebuild()
+returns void
+language sql
+as $$
+    truncate public.segment_rollups_rebuild;
+    insert into public.aggregate_rebuilds (target) values ('segment_rollups')
+        on conflict (target) do update set started_at = now();
+$$;
+
+create or replace function public.stage_segment_rollups(p_rollups jsonb)
+returns void
+language sql
+as $$
+    select public.merge_segment_rollups_into('public.segment_rollups_rebuild', p_rollups);
+$$;
+
+-- Replace segment_rollups with the rebuilt rows; returns the number of rows swapped in
+create or replace function public.finish_segment_rollups_rebuild()
+returns bigint
+language plpgsql
+as $$
+declare
+    swapped bigint;
+begin
+    lock table public.segment_rollups, public.segment_rollups_rebuild in exclusive mode;
+    delete from public.segment_rollups;
+    insert into public.segment_rollups select * from public.segment_rollups_rebuild;
+    get diagnostics swapped = row_count;
+    truncate public.segment_rollups_rebuild;
+    delete from public.aggregate_rebuilds where target = 'segment_rollups';
+    return swapped;
+end;
+$$;
+
+create or replace function public.cancel_segment_rollups_rebuild()
+returns void
+language sql
+as $$
+    delete from public.aggregate_rebuilds where target = 'segment_rollups';
+    truncate public.segment_rollups_rebuild;
+$$;
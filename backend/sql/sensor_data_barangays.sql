@@ -0,0 +1,17 @@
+-- sensor_data_barangays.sql
+-- Support for scripts/seed_illumination_data/backfill_barangays.py, which
+-- assigns barangays from their boundary polygons to readings stored without one.
+
+create index if not exists sensor_data_missing_barangay_idx
+    on public.sensor_data (id) where barangay is null or barangay = '';
+
+-- p_rows: [{id, barangay}, ...]
+create or replace function public.assign_sensor_data_barangays(p_rows jsonb)
+returns void
+language sql
+as $$
+    update public.sensor_data as s
+        set barangay = r.barangay
+    from jsonb_to_recordset(p_rows) as r(id bigint, barangay text)
+    where s.id = r.id;
+$$;
@@ -0,0 +1,12 @@
+-- sensor_data_snapping.sql
+-- Columns filled at ingest time by the road snapper (app/geo/snapping.py).
+-- Apply this, then set INGEST_STORE_SNAP_COLUMNS=true to store them.
+
+alter table public.sensor_data
+    add column if not exists snapped_lat double precision,
+    add column if not exists snapped_lon double precision,
+    add column if not exists snap_distance_m real,
+    add column if not exists segment_id integer,
+    add column if not exists segment_offset_m real;
+
+create index if not exists sensor_data_segment_id_idx on public.sensor_data (segment_id);
@@ -0,0 +1,82 @@
+# bench_barangay_index.py
+# Compares barangay assignment with a per-point loop over the boundary
+# polygons against the batched app/geo/barangay_index.py lookup, on the
+# generated full-city illumination points plus random points over the city
+# extent (some of them outside every barangay).
+# Run from the backend folder: python test/benchmark/bench_barangay_index.py
+import sys
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.geo.barangay_index import BarangayIndex
+
+DATA_DIR = BACKEND_DIR / "scripts" / "seed_illumination_data"
+BARANGAYS_FILE = DATA_DIR / "barangays.json"
+POINTS_FILE = DATA_DIR / "illumination_data.json"
+RANDOM_POINTS = 200000
+LOOP_SAMPLE = 5000
+REPEATS = 3
+
+
+def best_of(fn):
+    """Best wall time of REPEATS runs, and the last result"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def loop_assign(polygons, lats, lons):
+    """First polygon containing each point, testing every polygon in turn"""
+    positions = []
+    for lat, lon in zip(lats, lons):
+        point = shapely.Point(lon, lat)
+        positions.append(next((i for i, polygon in enumerate(polygons) if polygon.intersects(point)), -1))
+    return np.array(positions)
+
+
+def main():
+    with open(BARANGAYS_FILE, "r", encoding="utf-8") as f:
+        barangays = json.load(f)
+    with open(POINTS_FILE, "r", encoding="utf-8") as f:
+        points = json.load(f)["illumination_data"]
+
+    build_start = time.perf_counter()
+    index = BarangayIndex.from_barangays(barangays)
+    build_time = time.perf_counter() - build_start
+
+    rng = np.random.default_rng(0)
+    min_lon, min_lat, max_lon, max_lat = index.bounds
+    lats = np.concatenate(([p["lat"] for p in points], rng.uniform(min_lat, max_lat, RANDOM_POINTS)))
+    lons = np.concatenate(([p["lon"] for p in points], rng.uniform(min_lon, max_lon, RANDOM_POINTS)))
+
+    print("LIWANAG Barangay Assignment Benchmark")
+    print(f"Barangays: {len(index)}, points: {len(lats)} ({len(points)} generated + {RANDOM_POINTS} random)")
+    print("=" * 64)
+
+    polygons = [shapely.geometry.shape(b["boundary"]) for b in barangays if b.get("boundary")]
+    loop_time, loop = best_of(lambda: loop_assign(polygons, lats[:LOOP_SAMPLE], lons[:LOOP_SAMPLE]))
+    index_time, positions = best_of(lambda: index.assign(lats, lons))
+    loop_rate = LOOP_SAMPLE / loop_time
+    index_rate = len(lats) / index_time
+    print(f"{'index build':<36} {build_time * 1000:>8.1f} ms")
+    print(f"{'per-point polygon loop':<36} {loop_rate:>12,.0f} points/s")
+    print(f"{'BarangayIndex.assign batch':<36} {index_rate:>12,.0f} points/s   x{index_rate / loop_rate:.1f}")
+
+    mismatches = int(np.sum(loop != positions[:LOOP_SAMPLE]))
+    print("-" * 64)
+    print(f"Mismatches vs polygon loop on {LOOP_SAMPLE} points: {mismatches}")
+    print(f"Assigned: {int(np.sum(positions >= 0))} of {len(lats)}")
+
+
+if __name__ == "__main__":
+    main()
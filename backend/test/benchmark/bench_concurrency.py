@@ -0,0 +1,66 @@
+# bench_concurrency.py
+# Measures how request latency grows with the number of in-flight requests.
+# Start the API first (uvicorn app.main:app), then run this script.
+# With blocking database calls on the event loop, latency grows roughly
+# linearly with concurrency; with the database thread pool it should stay flat
+# until the pool (DB_MAX_WORKERS) is saturated.
+import time
+import statistics
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://localhost:8000"
+ENDPOINT = f"{BASE_URL}/api/v1/devices"
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+REQUESTS_PER_WORKER = 10
+
+
+def timed_request(session):
+    """Send one request and return its latency in milliseconds"""
+    start = time.perf_counter()
+    response = session.get(ENDPOINT)
+    response.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_worker(_):
+    """Send REQUESTS_PER_WORKER sequential requests over one connection"""
+    with requests.Session() as session:
+        return [timed_request(session) for _ in range(REQUESTS_PER_WORKER)]
+
+
+def run_level(concurrency):
+    """Run one benchmark level and return (latencies, wall time)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run_worker, range(concurrency)))
+    wall_time = time.perf_counter() - start
+    return [latency for worker in results for latency in worker], wall_time
+
+
+def main():
+    print("LIWANAG API Concurrency Benchmark")
+    print(f"Endpoint: {ENDPOINT}")
+    print("=" * 64)
+    print(f"{'in-flight':>9} | {'p50 ms':>8} | {'p95 ms':>8} | {'max ms':>8} | {'req/s':>8}")
+    print("-" * 64)
+
+    baseline = None
+    for concurrency in CONCURRENCY_LEVELS:
+        try:
+            latencies, wall_time = run_level(concurrency)
+        except Exception as e:
+            print(f"❌ Benchmark failed at concurrency {concurrency}: {e}")
+            return
+
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        throughput = len(latencies) / wall_time
+        baseline = baseline or p50
+        print(f"{concurrency:>9} | {p50:>8.1f} | {p95:>8.1f} | {latencies[-1]:>8.1f} | {throughput:>8.1f}"
+              f"   (p50 x{p50 / baseline:.1f} vs 1 in-flight)")
+
+
+if __name__ == "__main__":
+    main()
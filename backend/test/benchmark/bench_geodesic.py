@@ -0,0 +1,94 @@
+# bench_geodesic.py
+# Compares segment length computation with the old per-pair math.haversine loop
+# (as previously used in generate_illumination_data.py) against the vectorised
+# app/geo/geodesic.py functions on the full street_segments.json.
+# Run from the backend folder: python test/benchmark/bench_geodesic.py
+import sys
+import json
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.geo.geodesic import line_length, line_lengths, edge_lengths
+
+SEGMENTS_FILE = BACKEND_DIR / "scripts" / "seed_illumination_data" / "street_segments.json"
+REPEATS = 5
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Per-pair haversine, the previous implementation"""
+    R = 6371000
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def scalar_length(coords):
+    """Segment length with nested Python loops over vertex pairs"""
+    lines = coords if isinstance(coords[0][0], list) else [coords]
+    total = 0
+    for line in lines:
+        for i in range(len(line) - 1):
+            total += calculate_distance(line[i][1], line[i][0], line[i + 1][1], line[i + 1][0])
+    return total
+
+
+def scalar_edges(coords):
+    """Edge lengths of every line, as generate_points_for_line_segment used to compute them"""
+    lines = coords if isinstance(coords[0][0], list) else [coords]
+    return [[calculate_distance(line[i][1], line[i][0], line[i + 1][1], line[i + 1][0])
+             for i in range(len(line) - 1)] for line in lines]
+
+
+def best_of(fn):
+    """Best wall time of REPEATS runs, and the last result"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    with open(SEGMENTS_FILE, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    geometries = [s["segment_geom"]["coordinates"] for s in segments
+                  if s.get("segment_geom") and s["segment_geom"].get("coordinates")]
+    vertices = sum(len(p) for g in geometries for p in (g if isinstance(g[0][0], list) else [g]))
+
+    print("LIWANAG Geodesic Benchmark")
+    print(f"Segments: {len(geometries)}, vertices: {vertices}")
+    print("=" * 64)
+
+    scalar_time, scalar = best_of(lambda: [scalar_length(g) for g in geometries])
+    per_segment_time, per_segment = best_of(lambda: [line_length(g) for g in geometries])
+    batch_time, batch = best_of(lambda: line_lengths(geometries))
+    print(f"{'total lengths, per-pair math':<36} {scalar_time * 1000:>8.1f} ms")
+    print(f"{'total lengths, line_length':<36} {per_segment_time * 1000:>8.1f} ms   x{scalar_time / per_segment_time:.1f}")
+    print(f"{'total lengths, line_lengths batch':<36} {batch_time * 1000:>8.1f} ms   x{scalar_time / batch_time:.1f}")
+
+    edges_scalar_time, _ = best_of(lambda: [scalar_edges(g) for g in geometries])
+    edges_vector_time, _ = best_of(lambda: edge_lengths(geometries))
+    print(f"{'edge lengths, per-pair math':<36} {edges_scalar_time * 1000:>8.1f} ms")
+    print(f"{'edge lengths, edge_lengths batch':<36} {edges_vector_time * 1000:>8.1f} ms   x{edges_scalar_time / edges_vector_time:.1f}")
+
+    error = np.max(np.abs(np.asarray(scalar) - batch))
+    print("-" * 64)
+    print(f"Max difference vs per-pair math: {error:.2e} m "
+          f"(line_length {np.max(np.abs(np.asarray(scalar) - per_segment)):.2e} m)")
+    print(f"Total street length: {batch.sum() / 1000:.1f} km")
+
+
+if __name__ == "__main__":
+    main()
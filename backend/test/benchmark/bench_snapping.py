@@ -0,0 +1,98 @@
+# bench_snapping.py
+# Compares single-reading street snapping through the STRtree
+# (RoadSnapper.snap without a cell index) against the precomputed geohash cell
+# index (app/geo/geohash_index.py) at a few precisions, on the generated
+# illumination points jittered by a few meters plus random points over the city.
+# Run from the backend folder: python test/benchmark/bench_snapping.py
+import os
+import sys
+import json
+import time
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.geo.snapping import RoadSnapper
+from app.geo.geohash_index import rasterize_segments, write_geohash_index, GeohashSegmentIndex
+
+DATA_DIR = BACKEND_DIR / "scripts" / "seed_illumination_data"
+SEGMENTS_FILE = DATA_DIR / "street_segments.json"
+POINTS_FILE = DATA_DIR / "illumination_data.json"
+MAX_DISTANCE_M = 30.0
+PRECISIONS = (7, 8, 9)
+JITTER_DEGREES = 1e-4
+RANDOM_POINTS = 2000
+REPEATS = 5
+
+
+def best_of(fn):
+    """Best wall time of REPEATS runs, and the last result"""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def snap_all(snapper, lats, lons):
+    """One snap() call per point, as the single-reading endpoint does"""
+    return [snapper.snap(lat, lon) for lat, lon in zip(lats, lons)]
+
+
+def mismatches(expected, actual):
+    """
+    Points snapped to a different distance, or snapped by only one of the two.
+    Equidistant candidates (shared segment endpoints, streets that bend back
+    on themselves) may resolve either way, so positions are not compared.
+    """
+    return sum(1 for a, b in zip(expected, actual)
+               if (a is None) != (b is None) or (a is not None and abs(a.distance_m - b.distance_m) > 0.01))
+
+
+def main():
+    with open(SEGMENTS_FILE, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    with open(POINTS_FILE, "r", encoding="utf-8") as f:
+        points = json.load(f)["illumination_data"]
+
+    rng = np.random.default_rng(0)
+    lats = np.array([p["lat"] for p in points]) + rng.normal(0, JITTER_DEGREES, len(points))
+    lons = np.array([p["lon"] for p in points]) + rng.normal(0, JITTER_DEGREES, len(points))
+    lats = np.concatenate((lats, rng.uniform(lats.min(), lats.max(), RANDOM_POINTS))).tolist()
+    lons = np.concatenate((lons, rng.uniform(lons.min(), lons.max(), RANDOM_POINTS))).tolist()
+
+    print("LIWANAG Single-Point Snapping Benchmark")
+    print(f"Segments: {len(segments)}, points: {len(lats)} ({len(points)} jittered + {RANDOM_POINTS} random)")
+    print("=" * 72)
+
+    tree_snapper = RoadSnapper.from_segments(segments, max_distance_m=MAX_DISTANCE_M)
+    tree_time, expected = best_of(lambda: snap_all(tree_snapper, lats, lons))
+    tree_rate = len(lats) / tree_time
+    print(f"{'STRtree snap()':<32} {tree_time / len(lats) * 1e6:>7.1f} us/point {tree_rate:>10,.0f} points/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for precision in PRECISIONS:
+            snapper = RoadSnapper.from_segments(segments, max_distance_m=MAX_DISTANCE_M)
+            cells = rasterize_segments(snapper, precision, MAX_DISTANCE_M)
+            path = os.path.join(tmp, f"cells_{precision}.lwgh")
+            write_geohash_index(cells, precision, MAX_DISTANCE_M, path)
+            snapper.attach_cell_index(GeohashSegmentIndex(path))
+
+            index_time, actual = best_of(lambda: snap_all(snapper, lats, lons))
+            index_rate = len(lats) / index_time
+            label = f"cell index p{precision} ({os.path.getsize(path) / 1024:,.0f} KB)"
+            print(f"{label:<32} {index_time / len(lats) * 1e6:>7.1f} us/point {index_rate:>10,.0f} points/s"
+                  f"   x{index_rate / tree_rate:.2f}   mismatches {mismatches(expected, actual)}")
+            snapper.cell_index.close()
+
+    print("-" * 72)
+    print(f"Snapped within {MAX_DISTANCE_M:.0f}m: {sum(r is not None for r in expected)} of {len(lats)}")
+
+
+if __name__ == "__main__":
+    main()
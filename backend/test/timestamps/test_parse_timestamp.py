@@ -0,0 +1,61 @@
+# test_parse_timestamp.py
+# Checks the backend's timestamp convention: every datetime is naive local
+# time (what datetime.now() returns), so device readings with an offset,
+# Supabase timestamptz values and naive device clocks all compare correctly.
+# Runs offline in a fixed time zone.
+# Run from the backend folder: python test/timestamps/test_parse_timestamp.py
+import os
+import sys
+import time
+from datetime import datetime, date
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(BACKEND_DIR))
+
+# the Supabase client is created on import but never called here
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "offline")
+os.environ["TZ"] = "Asia/Manila"
+time.tzset()
+
+from app.services.device_registry import parse_timestamp, to_timestamptz
+from app.services.lux_sketches import night_of
+
+LOCAL_EVENING = datetime(2026, 1, 1, 20, 0)
+
+CASES = [
+    ("device offset is converted to local", parse_timestamp("2026-01-01T20:00:00+08:00"), LOCAL_EVENING),
+    ("UTC 'Z' is converted to local", parse_timestamp("2026-01-01T12:00:00Z"), LOCAL_EVENING),
+    ("Supabase +00:00 is converted to local", parse_timestamp("2026-01-01T12:00:00+00:00"), LOCAL_EVENING),
+    ("naive device time is kept", parse_timestamp("2026-01-01T20:00:00"), LOCAL_EVENING),
+    ("datetime values follow the same rule", parse_timestamp(datetime.fromisoformat("2026-01-01T12:00:00+00:00")), LOCAL_EVENING),
+    ("timestamptz round trip", parse_timestamp(to_timestamptz(LOCAL_EVENING)), LOCAL_EVENING),
+    ("1am local after a UTC reading belongs to the previous night",
+     night_of(parse_timestamp("2026-01-01T17:00:00Z")), date(2026, 1, 1)),
+    ("naive and offset readings of one night agree",
+     night_of(parse_timestamp("2026-01-02T01:00:00")), night_of(parse_timestamp("2026-01-01T17:00:00Z"))),
+]
+
+print("Testing timestamp convention (TZ=Asia/Manila)")
+print("=" * 45)
+
+failures = 0
+for name, actual, expected in CASES:
+    if actual == expected:
+        print(f"✅ {name}")
+    else:
+        failures += 1
+        print(f"❌ {name}: got {actual!r}, expected {expected!r}")
+
+# parsed values must compare with datetime.now() without mixing naive and aware
+try:
+    parse_timestamp("2026-01-01T12:00:00Z") < datetime.now()
+    print("✅ parsed values compare with datetime.now()")
+except TypeError as e:
+    failures += 1
+    print(f"❌ parsed values compare with datetime.now(): {e}")
+
+print()
+print(f"{len(CASES) + 1 - failures}/{len(CASES) + 1} passed")
+sys.exit(1 if failures else 0)